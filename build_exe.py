@@ -49,7 +49,18 @@ def build_exe():
 
         # 检查其他必要文件是否存在
         required_files = ["main.py", "config.json", "data_path.py", "ssh_manager.py", "file_editor.py", "ui.py",
-                          "side_selector.py"]
+                          "side_selector.py", "transfer_manager.py",
+                          "timeout_tuner.py", "transport_profiles.py",
+                          "session_manager.py", "conf_transaction.py",
+                          "dual_side_writer.py", "replicator.py",
+                          "bulk_transfer.py", "snapshot_store.py",
+                          "output_framing.py", "conf_document.py",
+                          "remote_search.py", "conf_manifest.py",
+                          "offline_journal.py", "path_discovery.py",
+                          "fleet_engine.py", "fleet_window.py",
+                          "param_flatten.py", "fleet_diff.py",
+                          "rollout_scheduler.py", "fleet_query.py",
+                          "reachability.py", "side_consistency.py"]
         missing_files = []
         for file in required_files:
             if not os.path.exists(file):
@@ -79,6 +90,10 @@ def build_exe():
             "--hidden-import=time",
             "--hidden-import=base64",
             "--hidden-import=hashlib",
+            "--hidden-import=tarfile",
+            "--hidden-import=lzma",
+            "--hidden-import=multiprocessing",
+            "--hidden-import=concurrent.futures",
         ]
 
         # 添加图标参数（如果图标存在）
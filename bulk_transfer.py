@@ -0,0 +1,227 @@
+import hashlib
+import io
+import logging
+import os
+import tarfile
+import time
+import conf_transaction
+from data_path import FILE_PATHS, MOUNT_CONFIG
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 上传时随包携带的校验清单（远端 sha256sum -c 校验后删除）
+MANIFEST_NAME = '.car_tinker_manifest.sha256'
+# 按文件列表下载时每个tar命令最多携带的路径数
+DOWNLOAD_BATCH_SIZE = 200
+
+
+def local_name_for(remote_dir):
+    """远端目录在本地的子目录名：取 runtime_service 下的模块名（如 planning_exec）"""
+    parts = remote_dir.rstrip('/').split('/')
+    if 'runtime_service' in parts:
+        index = parts.index('runtime_service')
+        if index + 1 < len(parts):
+            return parts[index + 1]
+    return parts[-1]
+
+
+class _ChannelWriter(io.RawIOBase):
+    """将tarfile的流式输出直接写入远端命令的stdin"""
+
+    def __init__(self, stdin):
+        self.stdin = stdin
+        self.written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.stdin.write(bytes(data))
+        self.written += len(data)
+        return len(data)
+
+
+def _root_owned(info):
+    """远端以root解包会沿用tar头中的属主，上传时清掉本地uid/gid，解出的文件归root所有"""
+    info.uid = info.gid = 0
+    info.uname = info.gname = ''
+    return info
+
+
+class BulkTransfer:
+    """
+    整目录tar流式传输：
+    - 下载：远端 tar 输出到一个通道，本地边接收边解包
+    - 上传：本地边打包边写入通道，远端解包到同级暂存目录，校验后整体换入
+    """
+
+    def __init__(self, session, compress=True):
+        self.session = session
+        self.compress = compress
+
+    def _tar_flag(self):
+        return 'z' if self.compress else ''
+
+    # ========= 下载 =========
+    def _extract_stream(self, command, target_dir):
+        """执行远端tar命令并边收边解包到 target_dir，返回 (文件数, 退出码, 错误输出)"""
+        count = 0
+        with self.session.side_command_stream(command) as (_, stdout, stderr):
+            mode = 'r|gz' if self.compress else 'r|'
+            root = os.path.realpath(target_dir)
+            # 支持解包过滤器的Python上使用 'data' 过滤（拒绝链接越界、绝对路径和特殊文件）
+            extract_options = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+            with tarfile.open(fileobj=stdout, mode=mode) as tar:
+                for member in tar:
+                    if not (member.isfile() or member.isdir()):
+                        continue
+                    # 防止路径穿越（按路径组件比较，../<目标目录>_x 这类同名前缀的兄弟目录也会被拒绝）
+                    member_path = os.path.realpath(os.path.join(target_dir, member.name))
+                    if os.path.commonpath([member_path, root]) != root:
+                        logger.warning(f"跳过异常路径: {member.name}")
+                        continue
+                    tar.extract(member, target_dir, **extract_options)
+                    if member.isfile():
+                        count += 1
+            exit_status = stdout.channel.recv_exit_status()
+            error = stderr.read().decode('utf-8', errors='replace')
+        return count, exit_status, error
+
+    def download_dir(self, remote_dir, local_dir):
+        """返回 (success, message)"""
+        try:
+            target_dir = os.path.join(local_dir, local_name_for(remote_dir))
+            os.makedirs(target_dir, exist_ok=True)
+            command = f"tar -C '{remote_dir}' -c{self._tar_flag()}f - ."
+            start = time.monotonic()
+
+            count, exit_status, error = self._extract_stream(command, target_dir)
+
+            if exit_status != 0:
+                return False, f"远端打包失败({remote_dir}): {error.strip()}"
+
+            elapsed = time.monotonic() - start
+            logger.info(f"✓ 目录下载完成: {remote_dir} -> {target_dir}，{count} 个文件，耗时 {elapsed:.2f}s")
+            return True, f"{remote_dir}: {count} 个文件（{elapsed:.2f}s）"
+
+        except Exception as e:
+            error_msg = f"目录下载失败({remote_dir}): {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def download_files(self, remote_dir, rel_paths, local_dir):
+        """
+        只下载目录中的指定文件（相对路径），仍走一个tar流，返回 (success, message)
+        路径较多时分批，避免命令行过长
+        """
+        try:
+            target_dir = os.path.join(local_dir, local_name_for(remote_dir))
+            os.makedirs(target_dir, exist_ok=True)
+            total = 0
+            for start in range(0, len(rel_paths), DOWNLOAD_BATCH_SIZE):
+                batch = rel_paths[start:start + DOWNLOAD_BATCH_SIZE]
+                names = ' '.join("'./" + path.replace("'", "'\\''") + "'" for path in batch)
+                command = f"tar -C '{remote_dir}' -c{self._tar_flag()}f - {names}"
+                count, exit_status, error = self._extract_stream(command, target_dir)
+                if exit_status != 0:
+                    return False, f"远端打包失败({remote_dir}): {error.strip()}"
+                total += count
+            return True, f"{remote_dir}: {total} 个文件"
+
+        except Exception as e:
+            error_msg = f"文件下载失败({remote_dir}): {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def download_all(self, local_dir, remote_dirs=None):
+        """下载全部标定目录，返回 (success, [message])"""
+        results = [self.download_dir(remote_dir, local_dir)
+                   for remote_dir in remote_dirs or FILE_PATHS['conf_directories']]
+        return all(success for success, _ in results), [message for _, message in results]
+
+    # ========= 上传 =========
+    def _build_manifest(self, local_dir):
+        lines = []
+        for root, _, files in os.walk(local_dir):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, local_dir).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    lines.append(f"{hashlib.sha256(f.read()).hexdigest()}  ./{rel_path}")
+        return "".join(line + "\n" for line in lines).encode('utf-8'), len(lines)
+
+    def upload_dir(self, local_dir, remote_dir):
+        """
+        将本地目录整体推送到远端目录（原子换入）：
+        解包到同级暂存目录 -> sha256sum -c 校验 -> 原目录改名备份 -> 暂存目录改名到位 -> sync
+        """
+        try:
+            if not os.path.isdir(local_dir):
+                return False, f"本地目录不存在: {local_dir}"
+
+            tx_id = conf_transaction.new_transaction_id()
+            staging = f"{remote_dir.rstrip('/')}.tx-{tx_id}"
+            backup = f"{remote_dir.rstrip('/')}.bak-{tx_id}"
+            mount_command = MOUNT_CONFIG.get('mount_command', "mount -o remount,rw /opt/usr/app/1/gea")
+            manifest, count = self._build_manifest(local_dir)
+
+            script = "\n".join([
+                f"{mount_command} || exit 1",
+                f"rm -rf '{staging}' && mkdir -p '{staging}' || exit 2",
+                f"tar -x{self._tar_flag()}f - -C '{staging}' || {{ rm -rf '{staging}'; exit 2; }}",
+                # 空目录的清单为空，sha256sum -c 会因没有校验行而失败，跳过校验
+                f"(cd '{staging}' && {{ [ ! -s '{MANIFEST_NAME}' ] || sha256sum -c '{MANIFEST_NAME}' > /dev/null; }}) || "
+                f"{{ rm -rf '{staging}'; echo '{conf_transaction.TX_VERIFY_FAILED}'; exit 3; }}",
+                f"rm -f '{staging}/{MANIFEST_NAME}'",
+                # 暂存目录沿用原目录的权限和属主，换入后与原来一致
+                f"if [ -d '{remote_dir}' ]; then chown \"$(stat -c '%u:%g' '{remote_dir}')\" '{staging}' && "
+                f"chmod \"$(stat -c '%a' '{remote_dir}')\" '{staging}' || {{ rm -rf '{staging}'; exit 2; }}; fi",
+                f"if [ -d '{remote_dir}' ]; then mv '{remote_dir}' '{backup}' || {{ rm -rf '{staging}'; exit 4; }}; fi",
+                f"mv '{staging}' '{remote_dir}' || {{ [ -d '{backup}' ] && mv '{backup}' '{remote_dir}'; "
+                f"rm -rf '{staging}'; sync; echo '{conf_transaction.TX_ROLLED_BACK}'; exit 4; }}",
+                "sync",
+                f"rm -rf '{backup}'",
+                f"echo '{conf_transaction.TX_COMMITTED}'",
+            ])
+
+            start = time.monotonic()
+            with self.session.side_command_stream(script) as (stdin, stdout, stderr):
+                writer = _ChannelWriter(stdin)
+                mode = 'w|gz' if self.compress else 'w|'
+                with tarfile.open(fileobj=writer, mode=mode) as tar:
+                    info = tarfile.TarInfo(f"./{MANIFEST_NAME}")
+                    info.size = len(manifest)
+                    info.mtime = int(time.time())
+                    tar.addfile(info, io.BytesIO(manifest))
+                    for name in sorted(os.listdir(local_dir)):
+                        tar.add(os.path.join(local_dir, name), arcname=f"./{name}", filter=_root_owned)
+                stdin.channel.shutdown_write()
+                output = stdout.read().decode('utf-8', errors='replace')
+                error = stderr.read().decode('utf-8', errors='replace')
+                exit_status = stdout.channel.recv_exit_status()
+
+            elapsed = time.monotonic() - start
+            if exit_status == 0 and conf_transaction.TX_COMMITTED in output:
+                logger.info(f"✓ 目录上传完成: {local_dir} -> {remote_dir}，{count} 个文件，耗时 {elapsed:.2f}s")
+                return True, f"{remote_dir}: {count} 个文件（{elapsed:.2f}s）"
+            if conf_transaction.TX_VERIFY_FAILED in output:
+                return False, f"远端校验失败，目录未修改: {remote_dir}"
+            return False, f"目录上传失败({remote_dir}，退出码 {exit_status}): {(output + error).strip()}"
+
+        except Exception as e:
+            error_msg = f"目录上传失败({remote_dir}): {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def upload_all(self, local_dir, remote_dirs=None):
+        """按子目录名将本地目录推送到对应的远端标定目录，返回 (success, [message])"""
+        results = []
+        for remote_dir in remote_dirs or FILE_PATHS['conf_directories']:
+            source = os.path.join(local_dir, local_name_for(remote_dir))
+            if os.path.isdir(source):
+                results.append(self.upload_dir(source, remote_dir))
+        if not results:
+            return False, ["本地目录中没有可上传的子目录（planning_exec/control_exec）"]
+        return all(success for success, _ in results), [message for _, message in results]
@@ -0,0 +1,76 @@
+import hashlib
+import json
+
+
+class ConfDocument:
+    """
+    标定文件的一个内容版本，贯穿 读取 -> 编辑 -> 校验 -> 写入：
+    - data 为原始字节，读写两端直接使用，不再来回编码
+    - text / sha256 / tree 均在首次访问时计算并缓存，同一版本内容只解码、哈希、解析一次
+    - 内容变化时生成新的文档对象（with_text），旧版本的缓存不受影响
+    """
+
+    def __init__(self, data, path=None, text=None, sha256=None):
+        self.data = data
+        self.path = path
+        self._text = text
+        self._sha256 = sha256
+        self._tree = None
+        self._parse_error = None
+        self._parsed = False
+
+    @classmethod
+    def from_text(cls, text, path=None):
+        return cls(text.encode('utf-8'), path, text=text)
+
+    @classmethod
+    def coerce(cls, content, path=None):
+        """将 str / bytes / ConfDocument 统一为 ConfDocument"""
+        if isinstance(content, cls):
+            return content
+        if isinstance(content, str):
+            return cls.from_text(content, path)
+        return cls(bytes(content), path)
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.data.decode('utf-8')
+        return self._text
+
+    @property
+    def sha256(self):
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def _parse(self):
+        if not self._parsed:
+            try:
+                self._tree = json.loads(self.text)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                self._parse_error = e
+            self._parsed = True
+
+    @property
+    def tree(self):
+        """解析后的JSON对象（解析失败抛出原始异常）"""
+        self._parse()
+        if self._parse_error is not None:
+            raise self._parse_error
+        return self._tree
+
+    def validate(self):
+        """校验JSON格式，返回错误信息或None（结果随文档缓存）"""
+        self._parse()
+        return str(self._parse_error) if self._parse_error is not None else None
+
+    def with_text(self, text):
+        """编辑后的新版本；文本未变化时返回自身，沿用已有缓存"""
+        if self._text is not None and text == self._text:
+            return self
+        return ConfDocument.from_text(text, self.path)
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bulk_transfer import BulkTransfer, local_name_for
+from data_path import FILE_PATHS, get_cache_dir
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 远端清单输出分段标记
+_STAT_SECTION = '@@CAR_TINKER_STAT@@'
+_SHA_SECTION = '@@CAR_TINKER_SHA256@@'
+
+
+def _quote(text):
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+def build_manifest_command(directories):
+    """一次远端调用列出全部文件的 大小/修改时间 与 sha256（跳过隐藏的暂存文件）"""
+    targets = ' '.join(_quote(directory) for directory in directories)
+    find = f"find {targets} -type f ! -name '.*'"
+    return (
+        f"echo '{_STAT_SECTION}'; {find} -exec stat -c '%s %Y %n' {{}} + 2>/dev/null; "
+        f"echo '{_SHA_SECTION}'; {find} -exec sha256sum {{}} + 2>/dev/null"
+    )
+
+
+def parse_manifest_output(output):
+    """解析清单命令输出，返回 {远端路径: {'size', 'mtime', 'sha256'}}"""
+    stats, digests = {}, {}
+    section = None
+    for line in output.splitlines():
+        if line == _STAT_SECTION or line == _SHA_SECTION:
+            section = line
+            continue
+        if section == _STAT_SECTION:
+            parts = line.split(' ', 2)
+            if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+                stats[parts[2]] = (int(parts[0]), int(parts[1]))
+        elif section == _SHA_SECTION:
+            match = re.match(r'^([0-9a-f]{64}) [ *](.+)$', line)
+            if match:
+                digests[match.group(2)] = match.group(1)
+
+    manifest = {}
+    for path, digest in digests.items():
+        size, mtime = stats.get(path, (None, None))
+        manifest[path] = {'size': size, 'mtime': mtime, 'sha256': digest}
+    return manifest
+
+
+def diff_manifests(previous, current):
+    """比较两份清单，返回 (新增, 修改, 删除) 三个路径列表"""
+    added = sorted(path for path in current if path not in previous)
+    changed = sorted(path for path in current
+                     if path in previous and previous[path]['sha256'] != current[path]['sha256'])
+    removed = sorted(path for path in previous if path not in current)
+    return added, changed, removed
+
+
+class ManifestStore:
+    """每辆车每一面最近一次同步时的远端清单，持久化到缓存目录"""
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir or get_cache_dir('manifests')
+        self._lock = threading.Lock()
+
+    def _path(self, car_name, side):
+        safe_name = re.sub(r'[^\w.-]', '_', f"{car_name}_{side}")
+        return os.path.join(self.store_dir, f"{safe_name}.json")
+
+    def load(self, car_name, side):
+        """返回 (清单, 记录时间)，没有记录返回 ({}, None)"""
+        try:
+            path = self._path(car_name, side)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+                return record.get('files', {}), record.get('updated_at')
+        except Exception as e:
+            logger.warning(f"加载清单缓存失败: {e}")
+        return {}, None
+
+    def save(self, car_name, side, manifest):
+        with self._lock:
+            path = self._path(car_name, side)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'files': manifest, 'updated_at': time.time()}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+
+class ConfSync:
+    """
+    基于清单的增量同步（远端 -> 本地目录，目录结构与整目录下载一致）：
+    - 一次远端命令取回全部文件的 (大小, 修改时间, sha256)
+    - 与本地缓存的上次清单比较，只下载新增/修改或本地缺失的文件，远端已删除的文件本地同步删除
+    - 下载成功后才更新缓存清单，中断后再次同步会重新下载未完成的部分
+    """
+
+    def __init__(self, session, directories=None, store=None):
+        self.session = session
+        self.directories = directories or FILE_PATHS['conf_directories']
+        self.store = store or ManifestStore()
+
+    def fetch_manifest(self):
+        """取回远端清单，返回 (success, 清单 或 错误信息)"""
+        success, output = self.session.execute_side_command_persistent(
+            build_manifest_command(self.directories)
+        )
+        if not success:
+            return False, f"获取远端清单失败: {output}"
+        return True, parse_manifest_output(output)
+
+    def _split_path(self, remote_path):
+        """远端路径 -> (所属标定目录, 相对路径)"""
+        for directory in self.directories:
+            prefix = directory.rstrip('/') + '/'
+            if remote_path.startswith(prefix):
+                return directory, remote_path[len(prefix):]
+        return None, None
+
+    def _local_path(self, local_dir, remote_path):
+        directory, rel_path = self._split_path(remote_path)
+        if directory is None:
+            return None
+        return os.path.join(local_dir, local_name_for(directory), *rel_path.split('/'))
+
+    def plan(self, local_dir, manifest):
+        """计算需要下载与删除的文件，返回 (下载列表, 删除列表)"""
+        car_name = self.session.get_current_car_name()
+        side = self.session.get_current_side()
+        previous, _ = self.store.load(car_name, side)
+        added, changed, removed = diff_manifests(previous, manifest)
+
+        to_fetch = set(added) | set(changed)
+        for path, entry in manifest.items():
+            local_path = self._local_path(local_dir, path)
+            # 本地缺失或大小不符（被删除/修改过）的文件同样重新下载
+            if local_path and (not os.path.isfile(local_path) or os.path.getsize(local_path) != entry['size']):
+                to_fetch.add(path)
+        return sorted(to_fetch), removed
+
+    def sync(self, local_dir):
+        """返回 (success, 结果摘要)"""
+        try:
+            start = time.monotonic()
+            success, manifest = self.fetch_manifest()
+            if not success:
+                return False, manifest
+
+            to_fetch, removed = self.plan(local_dir, manifest)
+
+            by_directory = {}
+            for path in to_fetch:
+                directory, rel_path = self._split_path(path)
+                if directory:
+                    by_directory.setdefault(directory, []).append(rel_path)
+
+            bulk = BulkTransfer(self.session)
+            for directory, rel_paths in by_directory.items():
+                success, message = bulk.download_files(directory, rel_paths, local_dir)
+                if not success:
+                    return False, message
+
+            for path in removed:
+                local_path = self._local_path(local_dir, path)
+                if local_path and os.path.isfile(local_path):
+                    os.remove(local_path)
+
+            self.store.save(self.session.get_current_car_name(), self.session.get_current_side(), manifest)
+            elapsed = time.monotonic() - start
+            summary = (f"远端共 {len(manifest)} 个文件，下载 {len(to_fetch)} 个，"
+                       f"删除 {len(removed)} 个，耗时 {elapsed:.2f}s")
+            logger.info(f"✓ 增量同步完成: {summary}")
+            return True, summary
+
+        except Exception as e:
+            error_msg = f"增量同步失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
@@ -0,0 +1,149 @@
+import io
+import logging
+import tarfile
+import time
+import uuid
+from conf_document import ConfDocument
+from transfer_manager import CAS_CONFLICT
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 远端脚本输出标记
+TX_STAGED = 'TX_STAGED'
+TX_COMMITTED = 'TX_COMMITTED'
+TX_VERIFY_FAILED = 'TX_VERIFY_FAILED'
+TX_ROLLED_BACK = 'TX_ROLLED_BACK'
+TX_ABORTED = 'TX_ABORTED'
+
+
+def new_transaction_id():
+    """生成事务ID"""
+    return f"{int(time.time())}{uuid.uuid4().hex[:8]}"
+
+
+def _split_path(remote_path):
+    remote_dir, file_name = remote_path.rsplit('/', 1)
+    return remote_dir, file_name
+
+
+def staged_path(remote_path, tx_id):
+    """暂存文件与目标文件同目录，保证最终 mv 为同文件系统原子替换"""
+    remote_dir, file_name = _split_path(remote_path)
+    return f"{remote_dir}/.{file_name}.tx-{tx_id}"
+
+
+def backup_path(remote_path, tx_id):
+    remote_dir, file_name = _split_path(remote_path)
+    return f"{remote_dir}/.{file_name}.bak-{tx_id}"
+
+
+def stage_dir(tx_id):
+    return f"/tmp/car_tinker_tx_{tx_id}"
+
+
+def build_bundle(files):
+    """
+    将待提交文件打包为 tar.gz（成员名为 f0, f1 ...，避免路径转义问题）
+    files: {远端路径: 内容(str/bytes/ConfDocument)}
+    返回 (bundle_bytes, entries)，entries 为 [(成员名, 远端路径, sha256)]
+    """
+    entries = []
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for index, (remote_path, content) in enumerate(files.items()):
+            document = ConfDocument.coerce(content, remote_path)
+            data = document.data
+            member = f"f{index}"
+            info = tarfile.TarInfo(member)
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            entries.append((member, remote_path, document.sha256))
+    return buffer.getvalue(), entries
+
+
+def build_precondition_script(expected_sha256):
+    """
+    条件写入前提：expected_sha256 为 {远端路径: 期望sha256}，任一文件当前内容不一致则输出
+    CAS_CONFLICT 并退出，不暂存任何文件（先读空stdin，避免本地写入bundle时通道已关闭）
+    """
+    return "\n".join(
+        f"[ \"$(sha256sum '{path}' 2>/dev/null | cut -d' ' -f1)\" = '{digest}' ] || "
+        f"{{ cat > /dev/null; echo '{CAS_CONFLICT} {path}'; exit 5; }}"
+        for path, digest in expected_sha256.items()
+    )
+
+
+def build_stage_script(tx_id, entries):
+    """
+    阶段一（暂存）：从stdin接收bundle -> 解包 -> 复制到各目标目录的暂存文件 -> 逐个校验sha256
+    任一校验失败则清理全部暂存文件并输出 TX_VERIFY_FAILED
+    """
+    tmp_dir = stage_dir(tx_id)
+    lines = [
+        f"rm -rf '{tmp_dir}' && mkdir -p '{tmp_dir}' || exit 2",
+        f"cat > '{tmp_dir}/bundle.tgz' || exit 2",
+        f"tar -xzf '{tmp_dir}/bundle.tgz' -C '{tmp_dir}' || {{ rm -rf '{tmp_dir}'; exit 2; }}",
+        "cleanup_staged() {",
+    ]
+    lines += [f"  rm -f '{staged_path(path, tx_id)}'" for _, path, _ in entries]
+    lines += [f"  rm -rf '{tmp_dir}'", "}"]
+    for member, path, digest in entries:
+        target = staged_path(path, tx_id)
+        lines += [
+            f"cp '{tmp_dir}/{member}' '{target}' && chmod 644 '{target}' || "
+            f"{{ cleanup_staged; echo '{TX_VERIFY_FAILED} {path}'; exit 3; }}",
+            f"[ \"$(sha256sum '{target}' | cut -d' ' -f1)\" = '{digest}' ] || "
+            f"{{ cleanup_staged; echo '{TX_VERIFY_FAILED} {path}'; exit 3; }}",
+        ]
+    lines.append(f"echo '{TX_STAGED}'")
+    return "\n".join(lines)
+
+
+def build_swap_script(tx_id, entries):
+    """
+    阶段二（替换）：备份现有目标 -> 逐个 mv 暂存文件 -> 一次 sync
+    替换中途失败则用备份回滚已替换的文件（新建文件则删除）并输出 TX_ROLLED_BACK
+    """
+    tmp_dir = stage_dir(tx_id)
+    lines = ["rollback() {"]
+    for index, (_, path, _) in enumerate(entries):
+        lines += [
+            f"  if [ -n \"$SWAPPED_{index}\" ]; then",
+            f"    if [ -f '{backup_path(path, tx_id)}' ]; then mv -f '{backup_path(path, tx_id)}' '{path}'; "
+            f"else rm -f '{path}'; fi",
+            "  fi",
+            f"  rm -f '{staged_path(path, tx_id)}' '{backup_path(path, tx_id)}'",
+        ]
+    lines += [f"  rm -rf '{tmp_dir}'", "  sync", f"  echo '{TX_ROLLED_BACK}'", "  exit 4", "}"]
+
+    for _, path, _ in entries:
+        lines.append(
+            f"if [ -f '{path}' ]; then cp -p '{path}' '{backup_path(path, tx_id)}' || rollback; fi"
+        )
+    for index, (_, path, _) in enumerate(entries):
+        lines.append(f"mv -f '{staged_path(path, tx_id)}' '{path}' && SWAPPED_{index}=1 || rollback")
+
+    lines.append("sync")
+    lines += [f"rm -f '{backup_path(path, tx_id)}'" for _, path, _ in entries]
+    lines += [f"rm -rf '{tmp_dir}'", f"echo '{TX_COMMITTED}'"]
+    return "\n".join(lines)
+
+
+def build_abort_script(tx_id, entries):
+    """放弃已暂存的事务：删除暂存文件，目标文件保持不变"""
+    lines = [f"rm -f '{staged_path(path, tx_id)}'" for _, path, _ in entries]
+    lines += [f"rm -rf '{stage_dir(tx_id)}'", f"echo '{TX_ABORTED}'"]
+    return "\n".join(lines)
+
+
+def build_commit_script(tx_id, entries, mount_command):
+    """单次远端调用完成：挂载 -> 暂存校验 -> 原子替换 -> sync（失败回滚）"""
+    return "\n".join([
+        f"{mount_command} || exit 1",
+        build_stage_script(tx_id, entries),
+        build_swap_script(tx_id, entries),
+    ])
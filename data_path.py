@@ -15,7 +15,34 @@ SSH_CONFIG = {
     # 连接相关的通用超时配置
     'timeout': 10,
     'auth_timeout': 15,
-    'banner_timeout': 15
+    'banner_timeout': 15,
+    # 单个会话上同时打开的命令通道上限（sshd 默认 MaxSessions=10）
+    'max_concurrent_channels': 4,
+    # 多会话共享资源预算：同时打开的会话数、所有会话合计的命令通道数
+    'max_sessions': 8,
+    'max_total_channels': 16
+}
+
+# 自适应超时配置：按主机历史连接耗时/RTT推算超时，并限制上下限
+ADAPTIVE_TIMEOUT_CONFIG = {
+    'enabled': True,
+    # 历史记录文件（位于缓存目录）与每台主机保留的样本数
+    'history_file': 'host_latency.json',
+    'history_size': 20,
+    # 样本不足时使用 SSH_CONFIG 中的固定超时
+    'min_samples': 3,
+    # 连续超时达到该次数时清空该主机样本，回到上面的固定超时（超时本身不会放宽超时）
+    'reset_after_timeouts': 3,
+    # TCP连接超时 = RTT(p90) × 倍数；握手/认证超时 = 握手耗时(p90) × 倍数
+    'rtt_multiplier': 8.0,
+    'handshake_multiplier': 3.0,
+    # 上下限（秒）
+    'timeout_floor': 2.0,
+    'timeout_ceiling': 30.0,
+    'auth_floor': 5.0,
+    'auth_ceiling': 45.0,
+    'banner_floor': 5.0,
+    'banner_ceiling': 45.0,
 }
 
 # 文件路径配置
@@ -26,6 +53,11 @@ FILE_PATHS = {
     'adas_working_directory': '/opt/usr/app/1/gea/runtime_service/planning_exec/res/conf',
     'params_file': 'params.json',  # 保持为 params.json
     'adas_params_file': 'adas_params.json',
+    # 整目录批量传输/搜索涉及的标定目录
+    'conf_directories': [
+        '/opt/usr/app/1/gea/runtime_service/planning_exec/res/conf',
+        '/opt/usr/app/1/gea/runtime_service/control_exec/res/conf',
+    ],
     'config_file': 'config.json',
     'icon_file': 'ico/yumi.ico'
 }
@@ -44,6 +76,159 @@ MOUNT_CONFIG = {
     'mount_command': 'mount -o remount,rw /opt/usr/app/1/gea'
 }
 
+# 分块传输/断点续传配置
+TRANSFER_CONFIG = {
+    # 单块原始字节数（base64后约64KB，低于远端单条命令参数长度上限）
+    'chunk_size': 48 * 1024,
+    # 超过该大小的文件读取改走分块续传
+    'resumable_threshold': 256 * 1024,
+    # 远端分块暂存目录
+    'remote_tmp_dir': '/tmp',
+    # 本地传输进度记录文件（位于缓存目录）
+    'state_file': 'transfers.json',
+}
+
+# 传输调优档位：窗口大小、最大包长、重协商阈值、压缩
+TRANSPORT_PROFILES = {
+    # 局域网直连车机：低时延，默认窗口即可，不压缩
+    'lan_direct': {
+        'window_size': 2 * 1024 * 1024,
+        'max_packet_size': 32 * 1024,
+        'rekey_bytes': 2 ** 30,
+        'rekey_packets': 2 ** 29,
+        'compress': False,
+    },
+    # 经跳板机隧道：带宽时延积大，放大窗口和包长
+    'bastion_tunnel': {
+        'window_size': 8 * 1024 * 1024,
+        'max_packet_size': 128 * 1024,
+        'rekey_bytes': 2 ** 32,
+        'rekey_packets': 2 ** 30,
+        'compress': False,
+    },
+    # 蜂窝网络：带宽有限，开启压缩（JSON压缩率高），窗口适中
+    'cellular': {
+        'window_size': 4 * 1024 * 1024,
+        'max_packet_size': 64 * 1024,
+        'rekey_bytes': 2 ** 32,
+        'rekey_packets': 2 ** 30,
+        'compress': True,
+    },
+}
+
+# 传输调优配置
+TRANSPORT_CONFIG = {
+    # 未校准时的默认档位
+    'default_direct_profile': 'lan_direct',
+    'default_tunnel_profile': 'bastion_tunnel',
+    # 自动校准：每个档位的测试传输次数和每次字节数
+    'calibration_rounds': 3,
+    'calibration_bytes': 1024 * 1024,
+    # 每辆车最佳档位记录文件（位于缓存目录）
+    'profile_store_file': 'transport_profiles.json',
+}
+
+# 本地快照库配置（每次读写的内容按内容寻址、去重、压缩保存）
+SNAPSHOT_CONFIG = {
+    'enabled': True,
+    # 压缩算法：'zlib'（快）或 'lzma'（更小）
+    'compression': 'lzma',
+    # 每个文件最多保留的版本记录数
+    'max_versions': 500,
+    # 索引追加日志累计到该行数时合并重写 index.json
+    'index_compact_lines': 1000,
+}
+
+# 批量（车队）操作配置
+FLEET_CONFIG = {
+    # 同时处理的目标（车辆+面）数量
+    'max_workers': 8,
+    # 同一跳板机上同时进行的目标数量，避免跳板机登录/转发过载
+    'per_bastion': 3,
+    # 批量操作独立使用的会话与命令通道预算
+    'max_sessions': 64,
+    'max_total_channels': 32,
+    # 参数对比时解析展开JSON的进程数（0 表示按CPU核数自动选择）
+    'diff_processes': 0,
+}
+
+# 车型列表在线状态检测配置（TCP建连 + SSH横幅，不认证）
+REACHABILITY_CONFIG = {
+    # 同时探测的端点数量
+    'max_workers': 16,
+    # 单个端点的建连/读取横幅超时（秒）
+    'timeout': 3.0,
+    # 探测结果缓存有效期（秒）
+    'cache_ttl': 60,
+    # 自动重新检测间隔（秒，0 表示只在启动和切换直连时检测）
+    'rescan_interval': 120,
+    # 界面取结果的轮询间隔（毫秒）
+    'poll_interval_ms': 200,
+}
+
+# 分阶段发布配置
+ROLLOUT_CONFIG = {
+    # 灰度批次的目标数量（0 表示不设灰度批次）
+    'canary_count': 1,
+    # 灰度之后的批次，按剩余目标的累计百分比划分
+    'wave_percents': [10, 50, 100],
+    # 每个批次内同时写入的目标数量
+    'wave_concurrency': 4,
+    # 单个目标的最多尝试次数，重试间隔按 backoff_base * 2^(n-1) 秒增长，不超过 backoff_max
+    'max_attempts': 3,
+    'backoff_base': 2.0,
+    'backoff_max': 30.0,
+    # 批次内失败比例超过该值时暂停发布（灰度批次任何失败都暂停）
+    'halt_failure_rate': 0.2,
+}
+
+# 车队负载模拟配置（fleet_simulator.py，本机回环地址上的模拟车机）
+SIMULATOR_CONFIG = {
+    'vehicles': 20,
+    # 第 i 辆车的A/B面分别监听 a_host/b_host 的 base_port + i 端口
+    'base_port': 30022,
+    'a_host': '127.0.0.1',
+    'b_host': '127.0.0.2',
+    'password': 'sim',
+    # 每条命令/每次建连的时延（秒）和每个面的链路带宽（字节/秒，0 表示不限）
+    'latency': 0.05,
+    'bandwidth': 1024 * 1024,
+    # 命令失败比例、建连时直接断开的比例
+    'failure_rate': 0.0,
+    'drop_rate': 0.0,
+    # 标定文件内容版本数，以及B面与A面内容不同的车辆比例
+    'variants': 3,
+    'ab_drift': 0.1,
+    # 模拟标定文件大小（字节）
+    'file_size': 64 * 1024,
+    # 生成的车型配置文件（不覆盖 config.json）与压测使用的独立缓存目录
+    'config_file': 'sim_config.json',
+    'cache_dir': os.path.join('cache', 'simulator'),
+}
+
+# 标定文件位置发现配置
+PATH_DISCOVERY_CONFIG = {
+    # 在该目录下的各模块中查找 params.json / adas_params.json
+    'runtime_root': '/opt/usr/app/1/gea/runtime_service',
+    'max_depth': 5,
+    # 同一相对路径存在于多个模块时的优先顺序
+    'module_priority': ['planning_exec', 'control_exec'],
+    # 软件版本标识命令（输出变化即视为新版本），默认取 runtime_service 目录修改时间
+    'version_command': "stat -c '%Y' /opt/usr/app/1/gea/runtime_service",
+    'cache_file': 'path_discovery.json',
+    # 扫描失败后该时间（秒）内不再重复扫描，直接使用默认路径
+    'failure_ttl': 60,
+}
+
+# 离线编辑配置
+OFFLINE_CONFIG = {
+    # 离线保存的写回队列（追加写入，重连后按顺序写回）
+    'journal_file': 'offline_journal.jsonl',
+}
+
+# 本地缓存目录（传输进度、历史数据等）
+LOCAL_CACHE_DIR = 'cache'
+
 
 def get_full_file_path(working_directory):
     """获取完整文件路径 - 修复路径拼接问题"""
@@ -103,6 +288,24 @@ def get_config_path():
         return FILE_PATHS['config_file']
 
 
+def get_cache_dir(*sub_dirs):
+    """获取本地缓存目录 - 兼容exe打包环境，目录不存在时自动创建"""
+    try:
+        import sys
+        if getattr(sys, 'frozen', False):
+            base_dir = os.path.dirname(sys.executable)
+        else:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+
+        cache_dir = os.path.join(base_dir, LOCAL_CACHE_DIR, *sub_dirs)
+        os.makedirs(cache_dir, exist_ok=True)
+        return cache_dir
+
+    except Exception as e:
+        logger.error(f"获取缓存目录失败: {e}")
+        return os.path.join(LOCAL_CACHE_DIR, *sub_dirs)
+
+
 def get_icon_path():
     """获取图标文件路径"""
     try:
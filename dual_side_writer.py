@@ -0,0 +1,94 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class DualSideWriter:
+    """
+    A/B两面并行写入（两阶段提交）：
+    - 阶段一：两面并行上传并暂存、校验
+    - 阶段二：仅当两面都暂存成功时，两面并行原子替换；否则两面都放弃暂存
+    - 报告每一面各阶段耗时
+    """
+
+    def __init__(self, side_sessions):
+        # side_sessions: {'A': SSHManager, 'B': SSHManager}
+        self.side_sessions = side_sessions
+
+    def _timed(self, func, *args):
+        start = time.monotonic()
+        success, result = func(*args)
+        return success, result, round(time.monotonic() - start, 3)
+
+    def _run_parallel(self, tasks):
+        """tasks: {面: (函数, 参数...)}，并行执行，返回 {面: (success, result, 耗时)}"""
+        with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+            futures = {side: pool.submit(self._timed, *task) for side, task in tasks.items()}
+            return {side: future.result() for side, future in futures.items()}
+
+    def write(self, kind_contents, expected_sha256=None):
+        """
+        kind_contents: {'params'/'adas': 内容}，各面按自身路径解析
+        expected_sha256: {面: {'params'/'adas': 期望远端sha256}}，远端已被修改的面拒绝暂存（两面都不写入）
+        返回 (success, report)，report: {面: {'stage', 'apply', 'ok', 'message'}}
+        """
+        report = {side: {'stage': None, 'apply': None, 'ok': False, 'message': ''}
+                  for side in self.side_sessions}
+        try:
+            files_by_side = {
+                side: {session.resolve_conf_path(kind): content for kind, content in kind_contents.items()}
+                for side, session in self.side_sessions.items()
+            }
+
+            expected_sha256 = expected_sha256 or {}
+            expected_by_side = {
+                side: {session.resolve_conf_path(kind): digest
+                       for kind, digest in expected_sha256.get(side, {}).items()}
+                for side, session in self.side_sessions.items()
+            }
+
+            # 阶段一：并行暂存
+            staged = self._run_parallel({
+                side: (session.stage_conf_files, files_by_side[side], expected_by_side[side])
+                for side, session in self.side_sessions.items()
+            })
+            for side, (success, result, elapsed) in staged.items():
+                report[side]['stage'] = elapsed
+                report[side]['message'] = "暂存校验通过" if success else result
+
+            if not all(success for success, _, _ in staged.values()):
+                # 任一面失败：已暂存的面全部放弃，两面保持原状
+                for side, (success, tx_id, _) in staged.items():
+                    if success:
+                        self.side_sessions[side].discard_staged_conf_files(tx_id)
+                        report[side]['message'] = "另一面暂存失败，已放弃本面暂存"
+                logger.error(f"A/B两面写入中止: {report}")
+                return False, report
+
+            # 阶段二：并行替换
+            applied = self._run_parallel({
+                side: (self.side_sessions[side].apply_staged_conf_files, tx_id)
+                for side, (_, tx_id, _) in staged.items()
+            })
+            for side, (success, result, elapsed) in applied.items():
+                report[side]['apply'] = elapsed
+                report[side]['ok'] = success
+                report[side]['message'] = result
+
+            all_ok = all(item['ok'] for item in report.values())
+            if all_ok:
+                logger.info(f"✓ A/B两面写入成功: {report}")
+            else:
+                logger.error(f"A/B两面替换阶段失败，两面可能不一致: {report}")
+            return all_ok, report
+
+        except Exception as e:
+            error_msg = f"A/B两面写入失败: {str(e)}"
+            logger.error(error_msg)
+            for item in report.values():
+                item['message'] = item['message'] or error_msg
+            return False, report
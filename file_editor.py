@@ -3,12 +3,18 @@ from tkinter import ttk, scrolledtext, messagebox
 import json
 import logging
 import re
+import time
 from data_path import FILE_PATHS, get_full_file_path, get_icon_path
+from transfer_manager import CONFLICT_MESSAGE, NO_CHANGE_MESSAGE
+from conf_document import ConfDocument
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 历史版本操作类型显示名
+HISTORY_ACTION_LABELS = {'read': "读取", 'write': "写入", 'conflict': "离线冲突"}
+
 
 class FileEditorWindow:
     def __init__(
@@ -19,16 +25,21 @@ class FileEditorWindow:
             file_path_resolver=get_full_file_path,
             read_func=None,
             write_func=None,
+            dual_write_func=None,
             window_title="编辑 params.json",
-            file_label="params.json"
+            file_label="params.json",
+            offline=False
     ):
         self.parent = parent
         self.ssh_manager = ssh_manager
         self.file_path_resolver = file_path_resolver
         self.read_func = read_func or self.ssh_manager.read_params_file_persistent
         self.write_func = write_func or self.ssh_manager.write_params_file_persistent
-        self.window_title = window_title
+        self.dual_write_func = dual_write_func  # 同时写入A/B两面（可选）
+        self.offline = offline  # 离线编辑：读缓存、保存进写回队列
+        self.window_title = window_title + ("（离线）" if offline else "")
         self.file_label = file_label
+        self.document = None  # 最近一次加载/保存的文档版本（ConfDocument），未修改时保存直接跳过
         self.window = None
         self.text_widget = None
         self.search_frame = None
@@ -356,6 +367,19 @@ class FileEditorWindow:
                                     bg="lightgreen", width=12, height=2)
             save_button.pack(side=tk.LEFT, padx=5)
 
+            # 保存到A/B两面按钮
+            if self.dual_write_func:
+                dual_save_button = tk.Button(button_frame, text="保存到A/B两面",
+                                             command=self.save_file_both_sides,
+                                             bg="palegreen", width=12, height=2)
+                dual_save_button.pack(side=tk.LEFT, padx=5)
+
+            # 历史版本按钮
+            history_button = tk.Button(button_frame, text="历史版本",
+                                       command=self.show_history,
+                                       bg="lightgoldenrod", width=12, height=2)
+            history_button.pack(side=tk.LEFT, padx=5)
+
             # 计算器按钮
             calculator_button = tk.Button(button_frame, text="计算器",
                                           command=self.show_calculator,
@@ -642,7 +666,7 @@ class FileEditorWindow:
     def load_file_content(self):
         """加载文件内容 - 使用持久连接"""
         try:
-            if not self.ssh_manager.is_side_connected():
+            if not self.offline and not self.ssh_manager.is_side_connected():
                 messagebox.showerror("错误", "未连接到A/B面")
                 self.window.destroy()
                 return
@@ -656,8 +680,9 @@ class FileEditorWindow:
             success, content = self.read_func()
 
             if success:
+                self.document = content
                 self.text_widget.delete(1.0, tk.END)
-                self.text_widget.insert(tk.END, content)
+                self.text_widget.insert(tk.END, content.text)
                 self.update_line_numbers()
                 self.clear_highlights()
                 logger.info("文件内容加载成功")
@@ -670,16 +695,36 @@ class FileEditorWindow:
             logger.error(f"加载文件内容失败: {e}")
             messagebox.showerror("错误", f"加载文件内容失败:\n{str(e)}")
 
+    def current_document(self):
+        """编辑器当前内容对应的文档版本；与已加载版本相同时返回同一对象，沿用其哈希和解析结果"""
+        # 'end-1c' 不含Text控件自动追加的末尾换行，未编辑时内容与远端逐字节一致
+        text = self.text_widget.get(1.0, 'end-1c')
+        if self.document is None:
+            return ConfDocument.from_text(text)
+        return self.document.with_text(text)
+
     def save_file(self):
         """保存文件 - 使用持久连接"""
         try:
-            content = self.text_widget.get(1.0, tk.END)
+            document = self.current_document()
+
+            if document is self.document:
+                messagebox.showinfo("提示", NO_CHANGE_MESSAGE)
+                logger.info("内容未修改，跳过保存")
+                return
+
+            # 使用持久连接写入文件（远端自加载后被修改时拒绝覆盖）
+            success, message = self.write_func(document)
 
-            # 使用持久连接写入文件
-            success, message = self.write_func(content)
+            if not success and CONFLICT_MESSAGE in message:
+                if not messagebox.askyesno("远端文件已变化",
+                                           f"{message}\n\n是否仍然用当前内容覆盖远端文件？"):
+                    return
+                success, message = self.write_func(document, force=True)
 
             if success:
-                messagebox.showinfo("成功", "文件保存成功！")
+                self.document = document
+                messagebox.showinfo("成功", "文件保存成功！" if message == "文件保存成功" else message)
                 logger.info("文件保存成功")
             else:
                 messagebox.showerror("错误", message)
@@ -687,4 +732,98 @@ class FileEditorWindow:
 
         except Exception as e:
             logger.error(f"保存文件操作失败: {e}")
-            messagebox.showerror("错误", f"保存文件失败:\n{str(e)}")
\ No newline at end of file
+            messagebox.showerror("错误", f"保存文件失败:\n{str(e)}")
+
+    def save_file_both_sides(self):
+        """同时保存到A/B两面（两面都暂存校验通过后才一起生效）"""
+        try:
+            document = self.current_document()
+
+            if not messagebox.askyesno("确认", "将同时写入A面和B面，是否继续？"):
+                return
+
+            success, message = self.dual_write_func(document)
+
+            if not success and CONFLICT_MESSAGE in message:
+                if not messagebox.askyesno("远端文件已变化",
+                                           f"{message}\n\n是否仍然用当前内容覆盖A/B两面？"):
+                    return
+                success, message = self.dual_write_func(document, force=True)
+
+            if success:
+                self.document = document
+                messagebox.showinfo("成功", message)
+                logger.info("A/B两面保存成功")
+            else:
+                messagebox.showerror("错误", message)
+                logger.error(f"A/B两面保存失败: {message}")
+
+        except Exception as e:
+            logger.error(f"A/B两面保存操作失败: {e}")
+            messagebox.showerror("错误", f"A/B两面保存失败:\n{str(e)}")
+
+    def show_history(self):
+        """显示本地快照库中的历史版本，可载入任一版本到编辑器（无需连接车辆）"""
+        try:
+            primary_path = self.file_path_resolver(self.ssh_manager.get_current_working_directory())
+            versions = self.ssh_manager.list_file_history(primary_path)
+            if not versions:
+                messagebox.showinfo("历史版本", "本地没有该文件的历史版本")
+                return
+
+            history_window = tk.Toplevel(self.window)
+            history_window.title(f"{self.file_label} 历史版本")
+            history_window.geometry("640x360")
+            history_window.transient(self.window)
+            self.set_window_icon(history_window)
+
+            tree = ttk.Treeview(history_window, columns=("time", "action", "size", "sha256"),
+                                show="headings", height=12)
+            tree.heading("time", text="时间")
+            tree.heading("action", text="操作")
+            tree.heading("size", text="大小")
+            tree.heading("sha256", text="SHA256")
+            tree.column("time", width=160)
+            tree.column("action", width=60)
+            tree.column("size", width=80)
+            tree.column("sha256", width=300)
+            tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+            # 同一内容可能出现多次（改动后又改回），行id由Tk分配，另行记录对应的sha256
+            digests = {}
+            for version in versions:
+                digests[tree.insert("", "end", values=(
+                    time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(version['timestamp'])),
+                    HISTORY_ACTION_LABELS.get(version['action'], version['action']),
+                    version['size'],
+                    version['sha256'],
+                ))] = version['sha256']
+
+            def load_selected():
+                selected = tree.selection()
+                if not selected:
+                    messagebox.showwarning("警告", "请先选择一个版本", parent=history_window)
+                    return
+                digest = digests[selected[0]]
+                content = self.ssh_manager.get_file_history_version(primary_path, digest)
+                if content is None:
+                    messagebox.showerror("错误", "历史版本数据丢失", parent=history_window)
+                    return
+                self.text_widget.delete(1.0, tk.END)
+                self.text_widget.insert(tk.END, content)
+                self.update_line_numbers()
+                self.clear_highlights()
+                history_window.destroy()
+                logger.info(f"已载入历史版本: {digest}")
+
+            tree.bind("<Double-1>", lambda e: load_selected())
+            button_frame = tk.Frame(history_window)
+            button_frame.pack(pady=5)
+            tk.Button(button_frame, text="载入到编辑器", command=load_selected,
+                      bg="lightgreen", width=12).pack(side=tk.LEFT, padx=5)
+            tk.Button(button_frame, text="关闭", command=history_window.destroy,
+                      bg="lightcoral", width=12).pack(side=tk.LEFT, padx=5)
+
+        except Exception as e:
+            logger.error(f"显示历史版本失败: {e}")
+            messagebox.showerror("错误", f"显示历史版本失败:\n{str(e)}")
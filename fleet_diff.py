@@ -0,0 +1,100 @@
+import csv
+import logging
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from param_flatten import flatten_bytes
+from data_path import FLEET_CONFIG
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 键在某个目标中不存在时的占位
+MISSING = None
+
+# 对比过程中产出的事件：
+#   kind='fetched' 时 result 为 FleetResult（某个目标读取完成）
+#   kind='diff' 时 row 为 DiffRow（一个存在差异的键）
+DiffEvent = namedtuple('DiffEvent', ['kind', 'result', 'row'])
+# key: 键路径；values: 与 columns 对齐的取值（JSON文本或MISSING）
+DiffRow = namedtuple('DiffRow', ['key', 'values'])
+
+
+class FleetDiff:
+    """
+    车队参数对比：
+    - 通过 FleetEngine 去重读取各目标的文件（相同内容只下载一份），边读取边提交到进程池解析展开
+    - 内容相同（sha256相同）的文件只解析一次，对比在不同内容之间进行后再展开到各目标
+    - 键路径统一驻留（intern），数千个键、数百个目标时内存与比较开销都按不同内容数增长
+    """
+
+    def __init__(self, engine, processes=None):
+        self.engine = engine
+        self.processes = processes or FLEET_CONFIG.get('diff_processes') or max(1, (os.cpu_count() or 2) - 1)
+        self.columns = []  # 读取成功的目标 (车型, 面)，与 DiffRow.values 对齐
+
+    def run(self, targets, operation='read'):
+        """产出 DiffEvent：先逐个产出读取结果，最后产出全部差异行（按键路径排序）"""
+        self.columns = []
+        column_digests = []
+        pending = {}  # sha256 -> 解析任务
+        with ProcessPoolExecutor(max_workers=self.processes) as pool:
+            for result in self.engine.fetch(targets, operation):
+                if result.success:
+                    digest = result.data.sha256
+                    if digest not in pending:
+                        pending[digest] = pool.submit(flatten_bytes, result.data.data)
+                    self.columns.append((result.car_name, result.side))
+                    column_digests.append(digest)
+                yield DiffEvent('fetched', result, None)
+
+            flattened = {}
+            for digest, future in pending.items():
+                success, flat = future.result()
+                if not success:
+                    logger.warning(f"内容 {digest[:12]} {flat}")
+                    flat = {}
+                flattened[digest] = {sys.intern(key): value for key, value in flat.items()}
+
+        for row in self._diff(column_digests, flattened):
+            yield DiffEvent('diff', None, row)
+
+    @staticmethod
+    def _diff(column_digests, flattened):
+        """先在不同内容之间找出有差异的键，再展开为各目标的取值"""
+        digests = list(dict.fromkeys(column_digests))
+        if len(digests) < 2:
+            return
+        maps = [flattened[digest] for digest in digests]
+        keys = set()
+        for flat in maps:
+            keys.update(flat.keys())
+
+        for key in sorted(keys):
+            group_values = [flat.get(key, MISSING) for flat in maps]
+            first = group_values[0]
+            if all(value == first for value in group_values):
+                continue
+            by_digest = dict(zip(digests, group_values))
+            yield DiffRow(key, tuple(by_digest[digest] for digest in column_digests))
+
+
+def summarize_row(row, columns):
+    """差异行的取值分布文本，如 '3: 车A/A, 车B/A | <缺失>: 车C/A'"""
+    groups = {}
+    for value, (car_name, side) in zip(row.values, columns):
+        groups.setdefault(value, []).append(f"{car_name}/{side}")
+    parts = [f"{'<缺失>' if value is MISSING else value}: {', '.join(members)}"
+             for value, members in groups.items()]
+    return len(groups), " | ".join(parts)
+
+
+def export_matrix(path, columns, rows):
+    """导出差异矩阵CSV：行为键路径，列为各目标"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["键路径"] + [f"{car_name}/{side}" for car_name, side in columns])
+        for row in rows:
+            writer.writerow([row.key] + ['<缺失>' if value is MISSING else value for value in row.values])
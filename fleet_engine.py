@@ -0,0 +1,250 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from conf_document import ConfDocument
+from session_manager import SessionManager
+from snapshot_store import get_snapshot_store
+from data_path import FLEET_CONFIG
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 批量操作目标：车型 + 面
+FleetTarget = namedtuple('FleetTarget', ['car_name', 'side'])
+
+# 单个目标的执行结果；data 为读取类操作的返回内容（ConfDocument），其他操作为None
+FleetResult = namedtuple('FleetResult', [
+    'car_name',
+    'side',
+    'operation',
+    'success',
+    'message',
+    'elapsed',
+    'data',
+])
+
+# 操作名 -> (显示名, 执行函数(会话, 内容) -> (success, 结果))
+FLEET_OPERATIONS = {
+    'read': ("读取params", lambda session, _: session.read_params_file_persistent()),
+    'read_adas': ("读取adas", lambda session, _: session.read_adas_file_persistent()),
+    'write': ("写入params", lambda session, content: session.write_params_file_persistent(content)),
+    'write_adas': ("写入adas", lambda session, content: session.write_adas_file_persistent(content)),
+    'check': ("检查文件", lambda session, _: session.check_file_exists()),
+    'mount': ("挂载", lambda session, _: session.mount_filesystem()),
+}
+
+# 支持按sha256去重读取的操作 -> 标定文件类型
+FETCH_KINDS = {
+    'read': 'params',
+    'read_adas': 'adas',
+}
+
+
+def bastion_of(config, force_direct=False):
+    """目标所经过的跳板机（直连模式返回None，不受跳板机并发限制）"""
+    if force_direct or config.get('connection_type', 'tunnel') == 'direct':
+        return None
+    ssh_command = config.get('ssh_command', '').strip()
+    if ssh_command.startswith('ssh '):
+        ssh_command = ssh_command[4:].strip()
+    return ssh_command.rsplit('@', 1)[-1] or None
+
+
+class FleetEngine:
+    """
+    车队批量操作引擎：
+    - 有界线程池并发处理多个 车型+面，每个跳板机另有并发上限
+    - 使用独立的非交互会话（认证失败直接报错，不在后台线程弹窗），会话在多次操作间复用
+    - 结果按完成顺序逐条产出，附带耗时
+    """
+
+    def __init__(self, terminals, max_workers=None, per_bastion=None, force_direct=False):
+        self.terminals = terminals
+        self.max_workers = max_workers or FLEET_CONFIG.get('max_workers', 8)
+        self.per_bastion = per_bastion or FLEET_CONFIG.get('per_bastion', 3)
+        self.force_direct = force_direct
+        self.session_manager = SessionManager(
+            max_sessions=FLEET_CONFIG.get('max_sessions', 64),
+            max_total_channels=FLEET_CONFIG.get('max_total_channels', 32),
+            interactive=False,
+        )
+        self._bastion_slots = {}
+        self._bastion_lock = threading.Lock()
+
+    def _bastion_slot(self, bastion):
+        with self._bastion_lock:
+            if bastion not in self._bastion_slots:
+                self._bastion_slots[bastion] = threading.BoundedSemaphore(self.per_bastion)
+            return self._bastion_slots[bastion]
+
+    def connect(self, target):
+        """打开（或复用）目标的会话，返回 (success, SSHManager 或 错误信息)"""
+        config = self.terminals.get(target.car_name)
+        if not config:
+            return False, "找不到车型配置"
+        return self.session_manager.connect_side_session(
+            target.car_name, config, target.side, force_direct=self.force_direct
+        )
+
+    def run_on_session(self, target, action):
+        """
+        在目标会话上执行任意操作 action(会话) -> (success, 结果)，受跳板机并发限制
+        返回 (success, 结果, 耗时)
+        """
+        start = time.monotonic()
+        config = self.terminals.get(target.car_name, {})
+        bastion = bastion_of(config, self.force_direct)
+        slot = self._bastion_slot(bastion) if bastion else None
+        try:
+            if slot:
+                slot.acquire()
+            try:
+                success, session = self.connect(target)
+                if not success:
+                    return False, f"连接失败: {session}", time.monotonic() - start
+                success, result = action(session)
+                return success, result, time.monotonic() - start
+            finally:
+                if slot:
+                    slot.release()
+        except Exception as e:
+            logger.error(f"{target.car_name} {target.side}面 操作失败: {e}")
+            return False, str(e), time.monotonic() - start
+
+    def _run_one(self, target, operation, content):
+        _, func = FLEET_OPERATIONS[operation]
+        success, result, elapsed = self.run_on_session(target, lambda session: func(session, content))
+        if success and hasattr(result, 'sha256'):
+            # 读取类操作：结果为文档对象
+            return FleetResult(target.car_name, target.side, operation, True,
+                               f"{result.size} 字节 sha256={result.sha256[:12]}", elapsed, result)
+        return FleetResult(target.car_name, target.side, operation, success, str(result), elapsed, None)
+
+    def run(self, targets, operation, payload=None):
+        """
+        并发执行并按完成顺序产出 FleetResult
+        payload: 写入类操作的内容；为 dict 时按 FleetTarget 取各目标自己的内容
+        """
+        if operation not in FLEET_OPERATIONS:
+            raise ValueError(f"不支持的批量操作: {operation}")
+        if not targets:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets)))
+        futures = []
+        try:
+            for target in targets:
+                content = payload.get(target) if isinstance(payload, dict) else payload
+                futures.append(executor.submit(self._run_one, target, operation, content))
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # 调用方中途停止时取消尚未开始的目标
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _stat_one(self, target, kind):
+        def action(session):
+            success, result = session.stat_conf_file(kind)
+            return success, (session, *result) if success else result
+        return self.run_on_session(target, action)
+
+    def _download_one(self, member, digest):
+        target, _, file_path, _ = member
+        success, result, elapsed = self.run_on_session(
+            target, lambda session: session.read_conf_file_expecting(file_path, digest))
+        return member, success, result, elapsed
+
+    def fetch(self, targets, operation='read'):
+        """
+        读取类操作的去重版本，按完成顺序产出与 run() 相同的 FleetResult：
+        - 先并发查询各目标文件的 sha256（一次轻量命令）
+        - 每个不同内容只下载一份（本地快照库已有则不下载），其余sha256相同的目标直接共用
+        - 下载失败（或查询后被修改）的目标单独报告，同内容的其他目标改由下一个目标下载
+        """
+        kind = FETCH_KINDS.get(operation)
+        if kind is None:
+            raise ValueError(f"不支持的去重读取操作: {operation}")
+        if not targets:
+            return
+
+        store = get_snapshot_store()
+        groups = {}  # sha256 -> {'document', 'waiting': [成员], 'downloading'}
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets)))
+        pending = {}
+
+        def share(member, document, source):
+            target, session, file_path, elapsed = member
+            adopted = session.adopt_conf_document(file_path, document)
+            return FleetResult(target.car_name, target.side, operation, True,
+                               f"{adopted.size} 字节 sha256={adopted.sha256[:12]}（{source}）", elapsed, adopted)
+
+        def start_download(group, digest):
+            group['downloading'] = True
+            member = group['waiting'].pop(0)
+            pending[executor.submit(self._download_one, member, digest)] = ('download', digest)
+
+        try:
+            for target in targets:
+                pending[executor.submit(self._stat_one, target, kind)] = ('stat', target)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tag, key = pending.pop(future)
+                    if tag == 'stat':
+                        success, result, elapsed = future.result()
+                        if not success:
+                            yield FleetResult(key.car_name, key.side, operation, False, str(result), elapsed, None)
+                            continue
+                        session, file_path, _, digest = result
+                        member = (key, session, file_path, elapsed)
+                        group = groups.get(digest)
+                        if group is None:
+                            data = store.get_blob(digest)
+                            document = ConfDocument(data) if data is not None else None
+                            if document is not None and document.sha256 != digest:
+                                document = None
+                            group = groups[digest] = {'document': document, 'waiting': [], 'downloading': False}
+                            if document is not None:
+                                yield share(member, document, "本地快照已有")
+                                continue
+                        if group['document'] is not None:
+                            yield share(member, group['document'], "与其他目标相同，未重复下载")
+                            continue
+                        group['waiting'].append(member)
+                        if not group['downloading']:
+                            start_download(group, digest)
+                    else:
+                        group = groups[key]
+                        member, success, result, elapsed = future.result()
+                        target = member[0]
+                        group['downloading'] = False
+                        if not success:
+                            yield FleetResult(target.car_name, target.side, operation, False,
+                                              str(result), member[3] + elapsed, None)
+                            if group['waiting']:
+                                start_download(group, key)
+                            continue
+                        group['document'] = result
+                        yield FleetResult(target.car_name, target.side, operation, True,
+                                          f"{result.size} 字节 sha256={result.sha256[:12]}（已下载）",
+                                          member[3] + elapsed, result)
+                        for waiting in group['waiting']:
+                            yield share(waiting, result, "与其他目标相同，未重复下载")
+                        group['waiting'] = []
+
+            downloaded = sum(1 for group in groups.values() if group['document'] is not None)
+            logger.info(f"去重读取完成: {len(targets)} 个目标，{len(groups)} 种内容，成功取得 {downloaded} 种")
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def close(self):
+        """断开批量操作使用的全部会话"""
+        self.session_manager.close_all()
@@ -0,0 +1,245 @@
+import fnmatch
+import json
+import logging
+import operator
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
+from param_flatten import flatten
+from snapshot_store import get_snapshot_store
+from data_path import FILE_PATHS
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 索引中的一行：某车辆某面的一个标定文件（最新快照）
+IndexRow = namedtuple('IndexRow', ['vehicle', 'side', 'kind', 'path', 'sha256'])
+# 查询命中：matches 为 ((键路径, 取值JSON文本), ...)，缺失的键取值为 None
+QueryHit = namedtuple('QueryHit', ['vehicle', 'side', 'kind', 'path', 'matches'])
+
+_COMPARATORS = {
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+_CONDITION = re.compile(r'^\s*(?P<key>[^\s=!<>~]+)\s*(?P<op>==|!=|<=|>=|=|<|>|~)\s*(?P<value>.+?)\s*$')
+_UNARY = re.compile(r'^\s*(?P<key>\S+)\s+(?P<op>exists|missing)\s*$', re.IGNORECASE)
+
+
+def _kind_of(path):
+    name = path.rsplit('/', 1)[-1]
+    if name == FILE_PATHS['params_file']:
+        return 'params'
+    if name == FILE_PATHS['adas_params_file']:
+        return 'adas'
+    return None
+
+
+def _literal(text):
+    """查询中的取值：能按JSON解析则按JSON（数字/布尔/带引号字符串），否则按原样字符串"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_query(text):
+    """
+    解析查询：多个条件用 and 连接，如
+      aeb.ttc_threshold < 1.5 and lateral.*.kp != 0.8
+    支持 == != < <= > >= ~（包含） 以及 exists / missing；键路径中可用 * 通配
+    返回 [(键路径, 运算符, 取值)]，格式错误抛出 ValueError
+    """
+    conditions = []
+    for part in re.split(r'\s+and\s+|\s*&&\s*', text.strip(), flags=re.IGNORECASE):
+        if not part:
+            continue
+        match = _UNARY.match(part)
+        if match:
+            conditions.append((match.group('key'), match.group('op').lower(), None))
+            continue
+        match = _CONDITION.match(part)
+        if not match:
+            raise ValueError(f"无法解析查询条件: {part}")
+        conditions.append((match.group('key'), match.group('op'), _literal(match.group('value'))))
+    if not conditions:
+        raise ValueError("查询为空")
+    return conditions
+
+
+def _make_predicate(op, literal):
+    """取值（已解码）-> 是否满足条件；类型不可比较时视为不满足"""
+    if op == '~':
+        needle = str(literal).lower()
+        return lambda value, text: needle in text.lower()
+    compare = _COMPARATORS[op]
+    if _is_number(literal):
+        return lambda value, text: _is_number(value) and compare(value, literal)
+    return lambda value, text: type(value) is type(literal) and compare(value, literal)
+
+
+class _KeyColumn:
+    """一个键路径的列：不同取值表 + 每个取值对应的行号数组（倒排）"""
+    __slots__ = ('texts', 'values', 'postings', '_slots')
+
+    def __init__(self):
+        self.texts = []     # 取值的JSON文本
+        self.values = []    # 解码后的取值，用于比较
+        self.postings = []  # array('I')：具有该取值的行号
+        self._slots = {}
+
+    def add(self, text, row_ids):
+        slot = self._slots.get(text)
+        if slot is None:
+            slot = self._slots[text] = len(self.texts)
+            self.texts.append(text)
+            self.values.append(json.loads(text))
+            self.postings.append(array('I'))
+        self.postings[slot].extend(row_ids)
+
+
+class FleetQueryIndex:
+    """
+    本地参数查询索引（不访问网络）：
+    - 数据来源为快照库中每个 车辆|面|标定文件 的最新版本
+    - 相同内容（sha256）只展开一次；键路径驻留（intern），每个键保存不同取值表和行号数组
+    - 条件只在不同取值上求值，再合并行号，数百辆车、数千个键时查询为毫秒级
+    - 快照库最新版本有变化时自动重建
+    """
+
+    def __init__(self, store=None):
+        self.store = store or get_snapshot_store()
+        self.rows = []
+        self.columns = {}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _latest_rows(self):
+        rows = []
+        for vehicle, side, path in self.store.list_keys():
+            kind = _kind_of(path)
+            if kind is None:
+                continue
+            record = self.store.latest(vehicle, side, path, actions=('read', 'write'))
+            if record:
+                rows.append(IndexRow(vehicle, side, kind, path, record['sha256']))
+        rows.sort()
+        return rows
+
+    def refresh(self):
+        """快照库有变化时重建索引，返回是否重建"""
+        with self._lock:
+            rows = self._latest_rows()
+            signature = tuple(rows)
+            if signature == self._signature:
+                return False
+
+            start = time.monotonic()
+            groups = {}
+            for row_id, row in enumerate(rows):
+                groups.setdefault(row.sha256, []).append(row_id)
+
+            columns = {}
+            for digest, row_ids in groups.items():
+                data = self.store.get_blob(digest)
+                if data is None:
+                    continue
+                try:
+                    flat = flatten(json.loads(data.decode('utf-8')))
+                except Exception as e:
+                    logger.warning(f"快照 {digest[:12]} 解析失败，跳过: {e}")
+                    continue
+                for key, text in flat.items():
+                    key = sys.intern(key)
+                    column = columns.get(key)
+                    if column is None:
+                        column = columns[key] = _KeyColumn()
+                    column.add(text, row_ids)
+
+            self.rows, self.columns, self._signature = rows, columns, signature
+            logger.info(f"参数查询索引已重建: {len(rows)} 个文件，{len(groups)} 种内容，"
+                        f"{len(columns)} 个键，耗时 {time.monotonic() - start:.2f}s")
+            return True
+
+    def _keys_for(self, pattern):
+        if '*' in pattern or '?' in pattern:
+            return [key for key in self.columns if fnmatch.fnmatchcase(key, pattern)]
+        return [pattern] if pattern in self.columns else []
+
+    def _evaluate(self, key_pattern, op, literal, candidate_rows):
+        """单个条件：返回 {行号: [(键路径, 取值文本)]}"""
+        keys = self._keys_for(key_pattern)
+        matched = {}
+        if op in ('exists', 'missing'):
+            present = set()
+            for key in keys:
+                for slot, postings in enumerate(self.columns[key].postings):
+                    for row_id in postings:
+                        present.add(row_id)
+                        if op == 'exists':
+                            matched.setdefault(row_id, []).append((key, self.columns[key].texts[slot]))
+            if op == 'missing':
+                for row_id in candidate_rows - present:
+                    matched[row_id] = [(key_pattern, None)]
+            return matched
+
+        predicate = _make_predicate(op, literal)
+        for key in keys:
+            column = self.columns[key]
+            for value, text, postings in zip(column.values, column.texts, column.postings):
+                if predicate(value, text):
+                    for row_id in postings:
+                        matched.setdefault(row_id, []).append((key, text))
+        return matched
+
+    def query(self, text, kind=None):
+        """执行查询，返回 [QueryHit]（按车辆、面排序）；kind 为 'params'/'adas'/None"""
+        conditions = parse_query(text)
+        self.refresh()
+        with self._lock:
+            candidate_rows = {row_id for row_id, row in enumerate(self.rows) if kind is None or row.kind == kind}
+            result = None
+            for key_pattern, op, literal in conditions:
+                matched = self._evaluate(key_pattern, op, literal, candidate_rows)
+                if result is None:
+                    result = {row_id: matches for row_id, matches in matched.items() if row_id in candidate_rows}
+                else:
+                    result = {row_id: result[row_id] + matched[row_id] for row_id in result if row_id in matched}
+                if not result:
+                    break
+
+            hits = []
+            for row_id in sorted(result or {}):
+                row = self.rows[row_id]
+                hits.append(QueryHit(row.vehicle, row.side, row.kind, row.path, tuple(result[row_id])))
+            return hits
+
+    def stats(self):
+        """(文件数, 键数)"""
+        return len(self.rows), len(self.columns)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_fleet_query_index():
+    """进程内共享的查询索引"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FleetQueryIndex()
+        return _index
@@ -0,0 +1,442 @@
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import paramiko
+import data_path
+from data_path import FILE_PATHS, SIMULATOR_CONFIG
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 车机上的绝对路径根，模拟时映射到各面自己的沙箱目录
+_REMOTE_ROOTS = re.compile(r"(?<![\w./-])(/opt/usr/app|/tmp)(?=[/'\"\s;|&)]|$)")
+
+# 车机上会修改系统状态的命令，模拟时替换为空操作
+_SHELL_PRELUDE = "mount() { :; }\nsync() { :; }\n"
+
+
+class _Link:
+    """一辆车的链路：按带宽串行排队（同一面的多个通道共享），并附加固定时延"""
+
+    def __init__(self, latency, bandwidth):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._next_free = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """一次往返时延（±20%抖动）"""
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.8, 1.2))
+
+    def transfer(self, size):
+        """占用链路传输 size 字节，按带宽等待"""
+        if not self.bandwidth or not size:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next_free = max(now, self._next_free) + size / self.bandwidth
+            wait = self._next_free - now
+        time.sleep(wait)
+
+
+class _OutputRewriter:
+    """流式去掉输出中的沙箱路径前缀（跨数据块边界也能正确替换）"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix.encode('utf-8')
+        self._tail = b''
+
+    def feed(self, chunk):
+        data = (self._tail + chunk).replace(self.prefix, b'')
+        keep = len(self.prefix) - 1
+        if keep > 0 and len(data) > keep:
+            data, self._tail = data[:-keep], data[-keep:]
+        elif keep > 0:
+            data, self._tail = b'', data
+        return data
+
+    def flush(self):
+        data, self._tail = self._tail, b''
+        return data
+
+
+class _SideServer(paramiko.ServerInterface):
+    def __init__(self, side):
+        self.side = side
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if password == self.side.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.side.run_command, args=(channel, command.decode('utf-8', 'replace')),
+                         daemon=True).start()
+        return True
+
+
+class SimulatedSide:
+    """
+    一个模拟的车机面：回环地址上的SSH服务
+    - 命令交给本机 sh 执行，车机绝对路径映射到本面的沙箱目录，输出中的沙箱前缀再去掉
+    - mount/sync 为空操作；每条命令附加链路时延，输入输出按链路带宽限速
+    - 可按比例让命令失败（退出码1）或在建立连接时直接断开
+    """
+
+    def __init__(self, name, host, port, root_dir, host_key, password, link,
+                 failure_rate=0.0, drop_rate=0.0):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.root_dir = root_dir
+        self.host_key = host_key
+        self.password = password
+        self.link = link
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.commands = 0
+        self._sock = None
+
+    def remote_path(self, path):
+        """车机路径 -> 沙箱中的实际路径"""
+        return self.root_dir + path
+
+    def rewrite_command(self, command):
+        return _REMOTE_ROOTS.sub(lambda match: self.root_dir + match.group(1), command)
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen(64)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def stop(self):
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+
+    def _accept_loop(self):
+        while self._sock:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        try:
+            if random.random() < self.drop_rate:
+                client.close()
+                return
+            self.link.delay()
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.host_key)
+            transport.start_server(server=_SideServer(self))
+            # 命令在 exec 请求回调中处理；paramiko 只以弱引用登记通道，
+            # 这里必须持有已接受的通道直到关闭，否则通道会在 exec 请求到达前被回收
+            channels = []
+            while transport.is_active():
+                channel = transport.accept(timeout=1)
+                channels = [item for item in channels if not item.closed]
+                if channel is not None:
+                    channels.append(channel)
+        except Exception as e:
+            logger.debug(f"{self.name} 连接结束: {e}")
+
+    def run_command(self, channel, command):
+        self.commands += 1
+        try:
+            self.link.delay()
+            if random.random() < self.failure_rate:
+                channel.sendall_stderr(b"simulated failure\n")
+                channel.send_exit_status(1)
+                return
+
+            process = subprocess.Popen(['/bin/sh', '-c', _SHELL_PRELUDE + self.rewrite_command(command)],
+                                       cwd=self.root_dir, stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stdin_thread = threading.Thread(target=self._pump_stdin, args=(channel, process), daemon=True)
+            stdin_thread.start()
+            stderr_chunks = []
+            stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()),
+                                             daemon=True)
+            stderr_thread.start()
+
+            rewriter = _OutputRewriter(self.root_dir)
+            while True:
+                chunk = os.read(process.stdout.fileno(), 64 * 1024)
+                if not chunk:
+                    break
+                data = rewriter.feed(chunk)
+                self.link.transfer(len(data))
+                channel.sendall(data)
+            channel.sendall(rewriter.flush())
+
+            exit_status = process.wait()
+            stderr_thread.join()
+            error = b''.join(stderr_chunks).replace(self.root_dir.encode('utf-8'), b'')
+            if error:
+                channel.sendall_stderr(error)
+            channel.send_exit_status(exit_status)
+        except Exception as e:
+            logger.debug(f"{self.name} 命令执行中断: {e}")
+        finally:
+            channel.close()
+
+    def _pump_stdin(self, channel, process):
+        try:
+            while True:
+                data = channel.recv(64 * 1024)
+                if not data:
+                    break
+                self.link.transfer(len(data))
+                process.stdin.write(data)
+                process.stdin.flush()
+        except Exception:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except Exception:
+                pass
+
+
+def build_params(variant, size):
+    """生成一份模拟标定文件内容（variant 不同则部分参数不同，size 为大致字节数）"""
+    params = {
+        'aeb': {'ttc_threshold': round(1.2 + 0.1 * (variant % 5), 2), 'enable': True},
+        'lateral': {'gains': {'kp': [0.8, 1.0 + 0.05 * variant], 'ki': [0.01, 0.02]}},
+        'longitudinal': {'max_decel': -4.0, 'max_accel': 2.0},
+        'version': f"sim-{variant}",
+    }
+    base = len(json.dumps(params, ensure_ascii=False, indent=2))
+    # 先按单行估算行数，再按实际大小校正一次
+    rows = 64
+    for _ in range(2):
+        params['table'] = [{'x': float(i), 'y': float(i * variant % 7), 'v': 1.0} for i in range(rows)]
+        row_size = (len(json.dumps(params, ensure_ascii=False, indent=2)) - base) / rows
+        rows = max(1, int((size - base) / row_size))
+    params['table'] = [{'x': float(i), 'y': float(i * variant % 7), 'v': 1.0} for i in range(rows)]
+    return json.dumps(params, ensure_ascii=False, indent=2)
+
+
+class FleetSimulator:
+    """在本机回环地址上启动整支模拟车队，并生成对应的 config.json"""
+
+    def __init__(self, vehicles=None, base_port=None, a_host=None, b_host=None, latency=None,
+                 bandwidth=None, failure_rate=None, drop_rate=None, variants=None, ab_drift=None,
+                 file_size=None, root_dir=None):
+        settings = dict(SIMULATOR_CONFIG)
+        for key, value in (('vehicles', vehicles), ('base_port', base_port), ('a_host', a_host),
+                           ('b_host', b_host), ('latency', latency), ('bandwidth', bandwidth),
+                           ('failure_rate', failure_rate), ('drop_rate', drop_rate), ('variants', variants),
+                           ('ab_drift', ab_drift), ('file_size', file_size)):
+            if value is not None:
+                settings[key] = value
+        self.settings = settings
+        self.root_dir = root_dir or tempfile.mkdtemp(prefix='car_tinker_sim_')
+        self.host_key = None
+        self.sides = []
+        self.terminals = {}
+
+    def _seed(self, side, variant):
+        conf_dirs = set(FILE_PATHS['conf_directories'])
+        conf_dirs.add(FILE_PATHS['default_working_directory'])
+        for conf_dir in conf_dirs:
+            os.makedirs(side.remote_path(conf_dir), exist_ok=True)
+        os.makedirs(side.remote_path('/tmp'), exist_ok=True)
+        content = build_params(variant, self.settings['file_size'])
+        for file_path in (data_path.get_full_file_path(FILE_PATHS['default_working_directory']),
+                          data_path.get_full_adas_file_path()):
+            with open(side.remote_path(file_path), 'w', encoding='utf-8') as f:
+                f.write(content)
+
+    def start(self):
+        settings = self.settings
+        logger.info("生成模拟车机主机密钥...")
+        self.host_key = paramiko.RSAKey.generate(2048)
+        for index in range(settings['vehicles']):
+            car_name = f"SIM-{index:03d}"
+            port = settings['base_port'] + index
+            # 同一车型的大多数车辆内容相同，少数为其他版本
+            variant = 0 if random.random() < 0.8 else random.randint(1, max(1, settings['variants'] - 1))
+            for side_name, host in (('A', settings['a_host']), ('B', settings['b_host'])):
+                side_variant = variant
+                if side_name == 'B' and random.random() < settings['ab_drift']:
+                    side_variant = variant + 1
+                link = _Link(settings['latency'], settings['bandwidth'])
+                side_dir = os.path.join(self.root_dir, car_name, side_name)
+                side = SimulatedSide(f"{car_name}/{side_name}", host, port, side_dir, self.host_key,
+                                     settings['password'], link, settings['failure_rate'], settings['drop_rate'])
+                self._seed(side, side_variant)
+                side.start()
+                self.sides.append(side)
+            self.terminals[car_name] = {
+                'connection_type': 'direct',
+                'a_side': settings['a_host'],
+                'b_side': settings['b_host'],
+                'a_side_username': 'root',
+                'b_side_username': 'root',
+                'a_side_password': settings['password'],
+                'b_side_password': settings['password'],
+                'working_directory': FILE_PATHS['default_working_directory'],
+                'port': port,
+            }
+        logger.info(f"已启动 {settings['vehicles']} 辆模拟车（{len(self.sides)} 个面），沙箱目录: {self.root_dir}")
+        return self.terminals
+
+    def write_config(self, config_path):
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(self.terminals, f, ensure_ascii=False, indent=2)
+        logger.info(f"模拟车队配置已写入: {config_path}")
+
+    def stop(self):
+        for side in self.sides:
+            side.stop()
+
+
+def percentile(sorted_values, percent):
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_benchmark(terminals, operations, rounds=1, max_workers=None, per_bastion=None, file_size=None):
+    """
+    用 FleetEngine 对模拟车队执行批量操作，返回 {操作: 统计}
+    统计包括成功/失败数、总耗时、吞吐（目标/秒、字节/秒）和单目标耗时百分位
+    """
+    from fleet_engine import FleetEngine, FleetTarget
+
+    engine = FleetEngine(terminals, max_workers=max_workers, per_bastion=per_bastion)
+    targets = [FleetTarget(car_name, side) for car_name in terminals for side in ('A', 'B')]
+    payload = build_params(0, file_size or SIMULATOR_CONFIG['file_size'])
+    report = {}
+    try:
+        for operation in operations:
+            for round_index in range(rounds):
+                start = time.monotonic()
+                if operation == 'fetch':
+                    results = list(engine.fetch(targets, 'read'))
+                elif operation == 'write':
+                    content = payload.replace('"sim-0"', f'"sim-0-r{round_index}"')
+                    results = list(engine.run(targets, 'write', content))
+                else:
+                    results = list(engine.run(targets, operation))
+                wall = time.monotonic() - start
+
+                elapsed = sorted(result.elapsed for result in results)
+                succeeded = [result for result in results if result.success]
+                if operation == 'write':
+                    transferred = len(content.encode('utf-8')) * len(succeeded)
+                else:
+                    transferred = sum(result.data.size for result in succeeded if result.data is not None)
+                name = operation if rounds == 1 else f"{operation}#{round_index + 1}"
+                report[name] = {
+                    'targets': len(results),
+                    'succeeded': len(succeeded),
+                    'failed': len(results) - len(succeeded),
+                    'wall_seconds': round(wall, 3),
+                    'targets_per_second': round(len(results) / wall, 2) if wall else 0.0,
+                    'bytes_per_second': round(transferred / wall) if wall else 0,
+                    'p50': round(percentile(elapsed, 50), 3),
+                    'p90': round(percentile(elapsed, 90), 3),
+                    'p99': round(percentile(elapsed, 99), 3),
+                    'max': round(elapsed[-1], 3) if elapsed else 0.0,
+                    'errors': sorted({result.message for result in results if not result.success})[:5],
+                }
+                logger.info(f"{name}: {report[name]}")
+    finally:
+        engine.close()
+    return report
+
+
+def print_report(report):
+    header = f"{'操作':<12}{'成功/总数':>10}{'总耗时s':>10}{'目标/秒':>10}{'KB/秒':>10}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, stats in report.items():
+        print(f"{name:<12}{stats['succeeded']:>5}/{stats['targets']:<4}{stats['wall_seconds']:>10.2f}"
+              f"{stats['targets_per_second']:>10.2f}{stats['bytes_per_second'] / 1024:>10.1f}"
+              f"{stats['p50']:>8.2f}{stats['p90']:>8.2f}{stats['p99']:>8.2f}{stats['max']:>8.2f}")
+        for error in stats['errors']:
+            print(f"    失败示例: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="车队负载模拟：在本机启动模拟车机SSH服务并压测批量操作")
+    parser.add_argument('mode', choices=['serve', 'bench'],
+                        help="serve: 只启动模拟车队并生成配置；bench: 启动后执行批量操作并输出报告")
+    parser.add_argument('--vehicles', type=int)
+    parser.add_argument('--base-port', type=int)
+    parser.add_argument('--latency', type=float, help="每条命令/连接的时延（秒）")
+    parser.add_argument('--bandwidth', type=float, help="每个面的链路带宽（字节/秒，0 表示不限）")
+    parser.add_argument('--failure-rate', type=float, help="命令失败比例")
+    parser.add_argument('--drop-rate', type=float, help="连接被直接断开的比例")
+    parser.add_argument('--ab-drift', type=float, help="B面内容与A面不同的车辆比例")
+    parser.add_argument('--file-size', type=int, help="模拟标定文件大小（字节）")
+    parser.add_argument('--config-out', default=SIMULATOR_CONFIG['config_file'], help="生成的车型配置文件")
+    parser.add_argument('--operations', default='check,read,fetch,write',
+                        help="bench 执行的操作，逗号分隔（check/read/read_adas/fetch/write/mount）")
+    parser.add_argument('--rounds', type=int, default=1)
+    parser.add_argument('--workers', type=int, help="FleetEngine 并发目标数")
+    parser.add_argument('--report', help="将报告另存为JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists('/bin/sh'):
+        logger.error("模拟车机需要本机 /bin/sh（Linux/WSL）")
+        return 1
+
+    simulator = FleetSimulator(vehicles=args.vehicles, base_port=args.base_port, latency=args.latency,
+                               bandwidth=args.bandwidth, failure_rate=args.failure_rate,
+                               drop_rate=args.drop_rate, ab_drift=args.ab_drift, file_size=args.file_size)
+    terminals = simulator.start()
+    simulator.write_config(args.config_out)
+    try:
+        if args.mode == 'serve':
+            logger.info("模拟车队运行中，可将生成的配置作为 config.json 使用，Ctrl+C 退出")
+            while True:
+                time.sleep(1)
+
+        # 压测使用独立缓存目录，不污染正常使用的快照库和路径缓存
+        data_path.LOCAL_CACHE_DIR = SIMULATOR_CONFIG['cache_dir']
+        report = run_benchmark(terminals, [op.strip() for op in args.operations.split(',') if op.strip()],
+                               rounds=args.rounds, max_workers=args.workers,
+                               file_size=simulator.settings['file_size'])
+        print_report(report)
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump({'settings': simulator.settings, 'results': report}, f, ensure_ascii=False, indent=2)
+            logger.info(f"报告已保存: {args.report}")
+        return 0
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+import logging
+import os
+import re
+from fleet_engine import FleetEngine, FleetTarget, FLEET_OPERATIONS, FETCH_KINDS
+from fleet_diff import FleetDiff, summarize_row, export_matrix
+from rollout_scheduler import RolloutScheduler, RolloutState, plan_waves
+from conf_document import ConfDocument
+from data_path import get_icon_path
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class FleetWindow:
+    """车队批量操作窗口：选择车型和面，并发执行读取/写入/检查/挂载，结果逐条显示"""
+
+    def __init__(self, parent, terminals, force_direct=False):
+        self.parent = parent
+        self.terminals = terminals
+        self.engine = FleetEngine(terminals, force_direct=force_direct)
+        self.running = False
+        self.window = None
+        self.create_window()
+
+    def set_window_icon(self, window):
+        """设置窗口图标"""
+        try:
+            icon_path = get_icon_path()
+            if icon_path:
+                window.iconbitmap(icon_path)
+        except Exception as e:
+            logger.error(f"设置窗口图标失败: {e}")
+
+    def create_window(self):
+        """创建批量操作窗口"""
+        self.window = tk.Toplevel(self.parent)
+        self.window.title("批量操作")
+        self.window.geometry("900x560")
+        self.window.transient(self.parent)
+        self.set_window_icon(self.window)
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        left_frame = tk.Frame(self.window)
+        left_frame.pack(side=tk.LEFT, fill=tk.Y, padx=10, pady=10)
+
+        tk.Label(left_frame, text="车型（可多选）:").pack(anchor=tk.W)
+        self.car_listbox = tk.Listbox(left_frame, selectmode=tk.EXTENDED, width=28, height=18,
+                                      exportselection=False)
+        for car_name in sorted(self.terminals.keys()):
+            self.car_listbox.insert(tk.END, car_name)
+        self.car_listbox.pack(fill=tk.Y, expand=True)
+        tk.Button(left_frame, text="全选", command=lambda: self.car_listbox.select_set(0, tk.END)).pack(
+            fill=tk.X, pady=2)
+
+        side_frame = tk.Frame(left_frame)
+        side_frame.pack(pady=5)
+        self.side_a_var = tk.BooleanVar(value=True)
+        self.side_b_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(side_frame, text="A面", variable=self.side_a_var).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(side_frame, text="B面", variable=self.side_b_var).pack(side=tk.LEFT, padx=5)
+
+        operation_frame = tk.Frame(left_frame)
+        operation_frame.pack(pady=5, fill=tk.X)
+        tk.Label(operation_frame, text="操作:").pack(side=tk.LEFT)
+        self.operation_names = {label: name for name, (label, _) in FLEET_OPERATIONS.items()}
+        self.operation_var = tk.StringVar(value=FLEET_OPERATIONS['read'][0])
+        ttk.Combobox(operation_frame, textvariable=self.operation_var, values=list(self.operation_names.keys()),
+                     state="readonly", width=14).pack(side=tk.LEFT, padx=5)
+
+        self.run_button = tk.Button(left_frame, text="开始执行", bg="lightgreen", command=self.run_operation)
+        self.run_button.pack(fill=tk.X, pady=5)
+
+        diff_frame = tk.LabelFrame(left_frame, text="参数对比")
+        diff_frame.pack(fill=tk.X, pady=5)
+        self.diff_file_var = tk.StringVar(value='read')
+        tk.Radiobutton(diff_frame, text="params", variable=self.diff_file_var, value='read').pack(side=tk.LEFT)
+        tk.Radiobutton(diff_frame, text="adas", variable=self.diff_file_var, value='read_adas').pack(side=tk.LEFT)
+        self.diff_button = tk.Button(diff_frame, text="对比", bg="lightblue", command=self.run_diff)
+        self.diff_button.pack(side=tk.RIGHT, padx=5, pady=2)
+
+        rollout_frame = tk.LabelFrame(left_frame, text="分阶段发布（按所选写入操作）")
+        rollout_frame.pack(fill=tk.X, pady=5)
+        self.rollout_button = tk.Button(rollout_frame, text="发布", command=self.start_rollout)
+        self.rollout_button.pack(side=tk.LEFT, padx=2, pady=2)
+        self.resume_button = tk.Button(rollout_frame, text="继续", command=self.resume_rollout)
+        self.resume_button.pack(side=tk.LEFT, padx=2, pady=2)
+        self.halt_button = tk.Button(rollout_frame, text="暂停", state=tk.DISABLED, command=self.halt_rollout)
+        self.halt_button.pack(side=tk.LEFT, padx=2, pady=2)
+        self.scheduler = None
+
+        right_frame = tk.Frame(self.window)
+        right_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10), pady=10)
+
+        columns = ("car", "side", "operation", "result", "elapsed", "message")
+        self.result_tree = ttk.Treeview(right_frame, columns=columns, show="headings")
+        for column, text, width in (("car", "车型", 140), ("side", "面", 40), ("operation", "操作", 80),
+                                    ("result", "结果", 50), ("elapsed", "耗时", 60), ("message", "信息", 260)):
+            self.result_tree.heading(column, text=text)
+            self.result_tree.column(column, width=width)
+        self.result_tree.tag_configure("failed", foreground="red")
+        scrollbar = ttk.Scrollbar(right_frame, orient=tk.VERTICAL, command=self.result_tree.yview)
+        self.result_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.result_tree.pack(fill=tk.BOTH, expand=True)
+
+        self.info_var = tk.StringVar(value="选择车型、面和操作后开始执行")
+        tk.Label(right_frame, textvariable=self.info_var, anchor=tk.W).pack(fill=tk.X, pady=5)
+
+    def selected_targets(self):
+        cars = [self.car_listbox.get(index) for index in self.car_listbox.curselection()]
+        sides = [side for side, var in (("A", self.side_a_var), ("B", self.side_b_var)) if var.get()]
+        return [FleetTarget(car_name, side) for car_name in cars for side in sides]
+
+    def run_operation(self):
+        """执行批量操作，结果按完成顺序显示"""
+        if self.running:
+            return
+        try:
+            targets = self.selected_targets()
+            if not targets:
+                messagebox.showwarning("警告", "请选择车型和面", parent=self.window)
+                return
+            operation = self.operation_names[self.operation_var.get()]
+
+            payload = None
+            save_dir = None
+            if operation.startswith('write'):
+                file_path = filedialog.askopenfilename(parent=self.window, title="选择要写入的文件",
+                                                       filetypes=[("JSON", "*.json"), ("所有文件", "*.*")])
+                if not file_path:
+                    return
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    payload = f.read()
+                if not messagebox.askyesno("确认", f"将写入 {len(targets)} 个目标，是否继续？", parent=self.window):
+                    return
+            elif operation.startswith('read'):
+                save_dir = filedialog.askdirectory(parent=self.window, title="选择保存读取结果的目录（可取消，仅显示）")
+
+            self.running = True
+            self.run_button.config(state=tk.DISABLED)
+            self.result_tree.delete(*self.result_tree.get_children())
+            self.info_var.set(f"正在执行 {len(targets)} 个目标...")
+            self.window.update()
+
+            done, failed = 0, 0
+            if operation in FETCH_KINDS:
+                # 读取按sha256去重：相同内容只下载一份
+                results = self.engine.fetch(targets, operation)
+            else:
+                results = self.engine.run(targets, operation, payload)
+            for result in results:
+                done += 1
+                if not result.success:
+                    failed += 1
+                elif save_dir and result.data is not None:
+                    self.save_read_result(save_dir, result)
+                self.insert_result(result)
+                self.info_var.set(f"已完成 {done}/{len(targets)}，失败 {failed}")
+                self.window.update()
+
+            logger.info(f"批量操作完成: {operation}，{done} 个目标，失败 {failed}")
+
+        except Exception as e:
+            logger.error(f"批量操作失败: {e}")
+            messagebox.showerror("错误", f"批量操作失败:\n{str(e)}", parent=self.window)
+        finally:
+            self.running = False
+            if self.window and self.window.winfo_exists():
+                self.run_button.config(state=tk.NORMAL)
+
+    def insert_result(self, result):
+        self.result_tree.insert("", "end", values=(
+            result.car_name, result.side, FLEET_OPERATIONS[result.operation][0],
+            "成功" if result.success else "失败", f"{result.elapsed:.2f}s", result.message,
+        ), tags=() if result.success else ("failed",))
+
+    def run_diff(self):
+        """读取所选目标的文件并对比，读取进度在结果列表中显示，差异在新窗口中显示"""
+        if self.running:
+            return
+        try:
+            targets = self.selected_targets()
+            if len(targets) < 2:
+                messagebox.showwarning("警告", "请至少选择两个目标进行对比", parent=self.window)
+                return
+            operation = self.diff_file_var.get()
+
+            self.running = True
+            self.run_button.config(state=tk.DISABLED)
+            self.diff_button.config(state=tk.DISABLED)
+            self.result_tree.delete(*self.result_tree.get_children())
+            self.info_var.set(f"正在读取 {len(targets)} 个目标...")
+            self.window.update()
+
+            fleet_diff = FleetDiff(self.engine)
+            rows = []
+            done = 0
+            for event in fleet_diff.run(targets, operation):
+                if event.kind == 'fetched':
+                    done += 1
+                    self.insert_result(event.result)
+                    self.info_var.set(f"已读取 {done}/{len(targets)}")
+                    self.window.update()
+                else:
+                    rows.append(event.row)
+
+            columns = fleet_diff.columns
+            self.info_var.set(f"对比完成：{len(columns)} 个目标，{len(rows)} 个键存在差异")
+            logger.info(f"参数对比完成: {operation}，{len(columns)} 个目标，{len(rows)} 个差异键")
+            if len(columns) < 2:
+                messagebox.showwarning("警告", "读取成功的目标不足两个，无法对比", parent=self.window)
+                return
+            self.show_diff(FLEET_OPERATIONS[operation][0], columns, rows)
+
+        except Exception as e:
+            logger.error(f"参数对比失败: {e}")
+            messagebox.showerror("错误", f"参数对比失败:\n{str(e)}", parent=self.window)
+        finally:
+            self.running = False
+            if self.window and self.window.winfo_exists():
+                self.run_button.config(state=tk.NORMAL)
+                self.diff_button.config(state=tk.NORMAL)
+
+    def start_rollout(self):
+        """选择文件，按所选写入操作创建分阶段发布并执行"""
+        if self.running:
+            return
+        try:
+            targets = self.selected_targets()
+            if not targets:
+                messagebox.showwarning("警告", "请选择车型和面", parent=self.window)
+                return
+            operation = self.operation_names[self.operation_var.get()]
+            if not operation.startswith('write'):
+                messagebox.showwarning("警告", "分阶段发布请先在操作中选择写入params或写入adas", parent=self.window)
+                return
+            file_path = filedialog.askopenfilename(parent=self.window, title="选择要发布的文件",
+                                                   filetypes=[("JSON", "*.json"), ("所有文件", "*.*")])
+            if not file_path:
+                return
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            error = ConfDocument.from_text(content).validate()
+            if error:
+                messagebox.showerror("错误", f"文件内容无效，已取消发布:\n{error}", parent=self.window)
+                return
+
+            waves = plan_waves(targets)
+            wave_text = " → ".join(str(len(wave)) for wave in waves)
+            if not messagebox.askyesno("确认", f"将分 {len(waves)} 批写入 {len(targets)} 个目标（{wave_text}），"
+                                             f"第一批为灰度验证，是否继续？", parent=self.window):
+                return
+            self.execute_rollout(RolloutState.create(operation, content, targets))
+
+        except Exception as e:
+            logger.error(f"创建分阶段发布失败: {e}")
+            messagebox.showerror("错误", f"创建分阶段发布失败:\n{str(e)}", parent=self.window)
+
+    def resume_rollout(self):
+        """继续最近一次未完成的发布"""
+        if self.running:
+            return
+        try:
+            unfinished = RolloutState.list_unfinished()
+            if not unfinished:
+                messagebox.showinfo("提示", "没有未完成的发布", parent=self.window)
+                return
+            state = unfinished[0]
+            if not messagebox.askyesno("确认", f"继续发布？\n{state.describe()}", parent=self.window):
+                return
+            self.execute_rollout(state)
+        except Exception as e:
+            logger.error(f"继续发布失败: {e}")
+            messagebox.showerror("错误", f"继续发布失败:\n{str(e)}", parent=self.window)
+
+    def halt_rollout(self):
+        if self.scheduler:
+            self.scheduler.stop()
+            self.info_var.set("正在暂停，等待进行中的写入完成...")
+
+    def execute_rollout(self, state):
+        """执行发布，结果逐条显示；暂停按钮在执行期间可用"""
+        self.running = True
+        self.scheduler = RolloutScheduler(self.engine, state)
+        for button in (self.run_button, self.diff_button, self.rollout_button, self.resume_button):
+            button.config(state=tk.DISABLED)
+        self.halt_button.config(state=tk.NORMAL)
+        self.result_tree.delete(*self.result_tree.get_children())
+        operation = state.record['operation']
+        try:
+            for event in self.scheduler.run():
+                if event.kind == 'wave':
+                    self.info_var.set(f"正在发布第 {event.wave + 1}/{len(state.record['waves'])} 批...")
+                elif event.kind == 'target':
+                    self.result_tree.insert("", "end", values=(
+                        event.target.car_name, event.target.side,
+                        f"{FLEET_OPERATIONS[operation][0]}#{event.wave + 1}",
+                        "成功" if event.success else "失败", f"{event.attempts}次", event.message,
+                    ), tags=() if event.success else ("failed",))
+                elif event.kind == 'halted':
+                    self.info_var.set(f"发布已暂停（第 {event.wave + 1} 批）：{event.message}")
+                    messagebox.showwarning("发布暂停", f"{event.message}\n处理后可点击“继续”从当前批次继续",
+                                           parent=self.window)
+                else:
+                    self.info_var.set(f"发布完成：{event.message}")
+                self.window.update()
+        except Exception as e:
+            logger.error(f"分阶段发布失败: {e}")
+            messagebox.showerror("错误", f"分阶段发布失败:\n{str(e)}", parent=self.window)
+        finally:
+            self.running = False
+            self.scheduler = None
+            if self.window and self.window.winfo_exists():
+                for button in (self.run_button, self.diff_button, self.rollout_button, self.resume_button):
+                    button.config(state=tk.NORMAL)
+                self.halt_button.config(state=tk.DISABLED)
+
+    def show_diff(self, title, columns, rows):
+        """差异窗口：每行一个键，显示不同取值数和取值分布，可导出完整矩阵"""
+        diff_window = tk.Toplevel(self.window)
+        diff_window.title(f"参数对比 - {title}（{len(columns)} 个目标，{len(rows)} 个差异）")
+        diff_window.geometry("1000x520")
+        self.set_window_icon(diff_window)
+
+        tree_frame = tk.Frame(diff_window)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        tree = ttk.Treeview(tree_frame, columns=("key", "count", "values"), show="headings")
+        for column, text, width in (("key", "键路径", 300), ("count", "取值数", 60), ("values", "取值分布", 600)):
+            tree.heading(column, text=text)
+            tree.column(column, width=width)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+        for row in rows:
+            count, distribution = summarize_row(row, columns)
+            tree.insert("", "end", values=(row.key, count, distribution))
+
+        def export():
+            file_path = filedialog.asksaveasfilename(parent=diff_window, title="导出差异矩阵",
+                                                     defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+            if not file_path:
+                return
+            try:
+                export_matrix(file_path, columns, rows)
+                messagebox.showinfo("成功", f"已导出到:\n{file_path}", parent=diff_window)
+            except Exception as e:
+                logger.error(f"导出差异矩阵失败: {e}")
+                messagebox.showerror("错误", f"导出失败:\n{str(e)}", parent=diff_window)
+
+        tk.Button(diff_window, text="导出CSV", command=export).pack(anchor=tk.E, padx=10, pady=(0, 10))
+
+    @staticmethod
+    def save_read_result(save_dir, result):
+        """读取结果保存为 车型_面_文件名"""
+        file_name = result.data.path.rsplit('/', 1)[-1] if result.data.path else f"{result.operation}.json"
+        safe_name = re.sub(r'[^\w.-]', '_', f"{result.car_name}_{result.side}_{file_name}")
+        with open(os.path.join(save_dir, safe_name), 'wb') as f:
+            f.write(result.data.data)
+
+    def on_close(self):
+        if self.running:
+            messagebox.showwarning("警告", "批量操作进行中，请等待完成", parent=self.window)
+            return
+        self.engine.close()
+        self.window.destroy()
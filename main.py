@@ -2,7 +2,8 @@ import tkinter as tk
 import sys
 import os
 import logging
-from ssh_manager import SSHManager
+import multiprocessing
+from session_manager import SessionManager
 from file_editor import FileEditorWindow
 from ui import TerminalManagerUI
 from data_path import get_icon_path, create_default_config
@@ -37,17 +38,16 @@ def main():
             logger.warning("配置文件不存在，创建默认配置")
             create_default_config()
 
-        # 初始化SSH管理器
-        ssh_manager = SSHManager()
+        # 初始化会话管理器（可同时保持多个车辆/面的SSH会话）
+        session_manager = SessionManager()
 
         # 创建UI
-        app = TerminalManagerUI(root, ssh_manager, FileEditorWindow)
+        app = TerminalManagerUI(root, session_manager, FileEditorWindow)
 
         # 设置窗口关闭事件
         def on_closing():
             try:
-                if ssh_manager.is_connected():
-                    ssh_manager.disconnect()
+                session_manager.close_all()
                 root.destroy()
             except Exception as e:
                 logger.error(f"关闭窗口时出错: {e}")
@@ -70,4 +70,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包为exe后，参数对比使用的进程池子进程需经此入口启动
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
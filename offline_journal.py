@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from conf_document import ConfDocument
+from data_path import (
+    FILE_PATHS,
+    OFFLINE_CONFIG,
+    get_cache_dir,
+    get_full_file_path,
+    get_full_adas_file_path,
+)
+from snapshot_store import get_snapshot_store
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 写回结果状态
+JOURNAL_FLUSHED = 'flushed'
+JOURNAL_CONFLICT = 'conflict'
+
+
+class WriteJournal:
+    """
+    离线保存的写回队列：
+    - 每次离线保存追加一条记录（JSON行 + fsync），内容本身存入快照库数据块，不重复保存
+    - 记录携带保存时基于的远端sha256，写回时远端已不是该版本即判为冲突，不覆盖
+    - 写回完成/冲突时追加一条状态记录；进程重启后重放日志即可得到未完成的队列
+    """
+
+    def __init__(self, journal_path=None):
+        self.journal_path = journal_path or os.path.join(
+            get_cache_dir(), OFFLINE_CONFIG.get('journal_file', 'offline_journal.jsonl')
+        )
+        self._lock = threading.Lock()
+        self.entries = []  # 按保存顺序的队列记录
+        self.status = {}   # 记录ID -> (状态, 说明)
+        self._replay()
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 最后一行可能因断电写了一半，忽略
+                        logger.warning("离线队列中存在不完整记录，已忽略")
+                        continue
+                    if record.get('op') == 'queue':
+                        self.entries.append(record)
+                    elif record.get('op') == 'done':
+                        self.status[record['id']] = (record['status'], record.get('message', ''))
+        except Exception as e:
+            logger.error(f"加载离线队列失败: {e}")
+
+    def _append(self, record):
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def enqueue(self, vehicle, side, path, document, base_sha256, force=False):
+        """追加一次离线保存，返回记录"""
+        get_snapshot_store().put_blob(document.data, document.sha256)
+        record = {
+            'op': 'queue',
+            'id': uuid.uuid4().hex[:12],
+            'vehicle': vehicle,
+            'side': side,
+            'path': path,
+            'base_sha256': None if force else base_sha256,
+            'sha256': document.sha256,
+            'size': document.size,
+            'created_at': time.time(),
+        }
+        with self._lock:
+            self._append(record)
+            self.entries.append(record)
+        logger.info(f"已加入离线队列: {vehicle} {side}面 {path}")
+        return record
+
+    def mark(self, entry_id, status, message=''):
+        with self._lock:
+            self._append({'op': 'done', 'id': entry_id, 'status': status,
+                          'message': message, 'at': time.time()})
+            self.status[entry_id] = (status, message)
+
+    def pending(self, vehicle=None, side=None):
+        """未写回的记录（按保存顺序）"""
+        with self._lock:
+            return [dict(entry) for entry in self.entries
+                    if entry['id'] not in self.status
+                    and (vehicle is None or entry['vehicle'] == vehicle)
+                    and (side is None or entry['side'] == side)]
+
+    def latest_pending(self, vehicle, side, path):
+        pending = [entry for entry in self.pending(vehicle, side) if entry['path'] == path]
+        return pending[-1] if pending else None
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_write_journal():
+    """进程内共享的离线写回队列"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = WriteJournal()
+        return _journal
+
+
+class OfflineSession:
+    """
+    离线编辑会话：提供编辑器需要的读写接口，数据来自本地快照库
+    - 读取：优先取该文件尚未写回的最近一次离线保存，否则取最近一次读/写时缓存的内容
+    - 保存：校验JSON后加入写回队列，以当前所基于的版本作为冲突判断依据
+    """
+
+    def __init__(self, vehicle, side, working_directory=None):
+        self.vehicle = vehicle
+        self.side = side
+        self.working_directory = working_directory or FILE_PATHS['default_working_directory']
+        self.journal = get_write_journal()
+        self.store = get_snapshot_store()
+        self._base_hashes = {}  # 远端路径 -> 当前编辑所基于的sha256
+
+    # ========= 与 SSHManager 一致的查询接口 =========
+    def get_current_car_name(self):
+        return self.vehicle
+
+    def get_current_side(self):
+        return self.side
+
+    def get_current_working_directory(self):
+        return self.working_directory
+
+    def is_side_connected(self):
+        return False
+
+    def _resolve_cached_path(self, primary_path):
+        """离线时无法探测回退路径：优先默认路径，否则取同名文件中最近有记录的路径"""
+        if self.store.latest(self.vehicle, self.side, primary_path):
+            return primary_path
+        file_name = primary_path.rsplit('/', 1)[-1]
+        candidates = [
+            path for vehicle, side, path in self.store.list_keys()
+            if vehicle == self.vehicle and side == self.side and path.rsplit('/', 1)[-1] == file_name
+        ]
+        if not candidates:
+            return primary_path
+        return max(candidates, key=lambda path: self.store.latest(self.vehicle, self.side, path)['last_seen'])
+
+    def list_file_history(self, primary_path):
+        file_path = self._resolve_cached_path(primary_path)
+        return self.store.list_versions(self.vehicle, self.side, file_path)
+
+    def get_file_history_version(self, primary_path, digest=None):
+        file_path = self._resolve_cached_path(primary_path)
+        data = self.store.get_version(self.vehicle, self.side, file_path, digest)
+        return data.decode('utf-8') if data is not None else None
+
+    # ========= 读写 =========
+    def read_file(self, primary_path):
+        """返回 (success, ConfDocument 或 错误信息)"""
+        try:
+            file_path = self._resolve_cached_path(primary_path)
+            pending = self.journal.latest_pending(self.vehicle, self.side, file_path)
+            if pending:
+                digest, base_sha256 = pending['sha256'], pending['sha256']
+            else:
+                record = self.store.latest(self.vehicle, self.side, file_path, actions=('read', 'write'))
+                if not record:
+                    return False, f"本地没有 {self.vehicle} {self.side}面 的缓存: {file_path}"
+                digest, base_sha256 = record['sha256'], record['sha256']
+
+            data = self.store.get_blob(digest)
+            if data is None:
+                return False, f"缓存数据丢失: {file_path}"
+            self._base_hashes[file_path] = base_sha256
+            logger.info(f"离线载入: {file_path}（{'未写回的离线修改' if pending else '本地缓存'}）")
+            return True, ConfDocument(data, file_path, sha256=digest)
+
+        except Exception as e:
+            error_msg = f"离线读取失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def write_file(self, primary_path, content, force=False):
+        """加入写回队列，返回 (success, message)"""
+        try:
+            file_path = self._resolve_cached_path(primary_path)
+            document = ConfDocument.coerce(content, file_path)
+            parse_error = document.validate()
+            if parse_error:
+                return False, f"JSON格式错误: {parse_error}"
+
+            self.journal.enqueue(self.vehicle, self.side, file_path, document,
+                                 self._base_hashes.get(file_path), force=force)
+            # 同一文件后续的离线保存基于本次内容
+            self._base_hashes[file_path] = document.sha256
+            return True, "已保存到离线队列，重新连接该面后将自动写回"
+
+        except Exception as e:
+            error_msg = f"离线保存失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def read_params_file_persistent(self):
+        return self.read_file(get_full_file_path(self.working_directory))
+
+    def write_params_file_persistent(self, content, force=False):
+        return self.write_file(get_full_file_path(self.working_directory), content, force)
+
+    def read_adas_file_persistent(self):
+        return self.read_file(get_full_adas_file_path(self.working_directory))
+
+    def write_adas_file_persistent(self, content, force=False):
+        return self.write_file(get_full_adas_file_path(self.working_directory), content, force)
@@ -0,0 +1,56 @@
+import uuid
+
+# 远端输出分帧：
+#   <BEGIN标记> <字节数>\n<文件原始内容>\n<END标记>\n
+# 标记带随机串，登录横幅、警告等额外输出只会出现在帧外，
+# 提取时按长度头直接切片，不解析内容，任意文件类型都适用
+_MARKER_PREFIX = 'CAR_TINKER_FRAME'
+
+
+def new_frame_id():
+    """生成本次读取的随机帧标记"""
+    return uuid.uuid4().hex[:16]
+
+
+def begin_marker(frame_id):
+    return f"@@{_MARKER_PREFIX}_BEGIN_{frame_id}@@"
+
+
+def end_marker(frame_id):
+    return f"@@{_MARKER_PREFIX}_END_{frame_id}@@"
+
+
+def build_framed_cat(remote_path, frame_id):
+    """生成分帧读取文件的命令（长度头与内容出自同一次打开前的 wc -c）"""
+    return (
+        f"[ -f '{remote_path}' ] || {{ echo '{remote_path}: No such file' >&2; exit 1; }}; "
+        f"printf '%s %s\\n' '{begin_marker(frame_id)}' \"$(wc -c < '{remote_path}')\"; "
+        f"cat '{remote_path}'; "
+        f"printf '\\n%s\\n' '{end_marker(frame_id)}'"
+    )
+
+
+def extract_frame(output, frame_id):
+    """
+    从命令原始输出(bytes)中取出帧内内容：定位BEGIN标记 -> 读长度头 -> 切片 -> 校验END标记
+    帧不完整或长度不符时抛出 ValueError
+    """
+    begin = begin_marker(frame_id).encode('ascii')
+    end = b'\n' + end_marker(frame_id).encode('ascii')
+
+    start = output.find(begin)
+    if start == -1:
+        raise ValueError("输出中未找到分帧起始标记")
+    header_end = output.find(b'\n', start)
+    if header_end == -1:
+        raise ValueError("分帧长度头不完整")
+    try:
+        length = int(output[start + len(begin):header_end].strip())
+    except ValueError:
+        raise ValueError("分帧长度头格式错误")
+
+    payload_start = header_end + 1
+    payload_end = payload_start + length
+    if output[payload_end:payload_end + len(end)] != end:
+        raise ValueError(f"分帧数据不完整或长度不符（期望 {length} 字节）")
+    return output[payload_start:payload_end]
@@ -0,0 +1,31 @@
+import json
+
+# 只依赖标准库，供进程池中的子进程导入（不引入界面/SSH模块）
+
+
+def flatten(tree):
+    """
+    将JSON对象展开为 {键路径: 叶子值的JSON文本}
+    对象成员用 '.' 连接，数组元素用 [下标]；空对象/空数组作为叶子保留
+    """
+    flat = {}
+    stack = [('', tree)]
+    while stack:
+        prefix, node = stack.pop()
+        if isinstance(node, dict) and node:
+            for key, value in node.items():
+                stack.append((f"{prefix}.{key}" if prefix else str(key), value))
+        elif isinstance(node, list) and node:
+            for index, value in enumerate(node):
+                stack.append((f"{prefix}[{index}]", value))
+        else:
+            flat[prefix] = json.dumps(node, ensure_ascii=False, sort_keys=True)
+    return flat
+
+
+def flatten_bytes(data):
+    """子进程入口：解析并展开，返回 (success, 展开结果 或 错误信息)"""
+    try:
+        return True, flatten(json.loads(data.decode('utf-8')))
+    except Exception as e:
+        return False, f"解析失败: {e}"
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from data_path import FILE_PATHS, PATH_DISCOVERY_CONFIG, get_cache_dir
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_VERSION_SECTION = '@@CAR_TINKER_VERSION@@'
+
+
+def build_discovery_command():
+    """一次远端调用：在 runtime_service 各子目录中查找标定文件，并输出软件版本标识"""
+    root = PATH_DISCOVERY_CONFIG.get('runtime_root', '/opt/usr/app/1/gea/runtime_service')
+    depth = PATH_DISCOVERY_CONFIG.get('max_depth', 5)
+    names = [FILE_PATHS['params_file'], FILE_PATHS['adas_params_file']]
+    name_filter = ' -o '.join(f"-name '{name}'" for name in names)
+    version_command = PATH_DISCOVERY_CONFIG.get('version_command', f"stat -c '%Y' '{root}'")
+    return (
+        f"find '{root}' -maxdepth {depth} -type f \\( {name_filter} \\) 2>/dev/null; "
+        f"echo '{_VERSION_SECTION}'; {version_command} 2>/dev/null"
+    )
+
+
+def parse_discovery_output(output):
+    """返回 (软件版本标识, [文件路径])"""
+    paths, version_lines = [], []
+    in_version = False
+    for line in output.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line == _VERSION_SECTION:
+            in_version = True
+        elif in_version:
+            version_lines.append(line)
+        elif line.startswith('/'):
+            paths.append(line)
+    version_text = "\n".join(version_lines)
+    version = hashlib.sha256(version_text.encode('utf-8')).hexdigest()[:12] if version_text else 'unknown'
+    return version, sorted(paths)
+
+
+def _module_of(path):
+    """路径中 runtime_service 下的模块名和其后的相对路径，如 ('planning_exec', 'res/conf/params.json')"""
+    parts = path.split('/')
+    if 'runtime_service' in parts:
+        index = parts.index('runtime_service')
+        if index + 2 < len(parts):
+            return parts[index + 1], '/'.join(parts[index + 2:])
+    return None, None
+
+
+def choose_path(primary_path, discovered):
+    """
+    在发现结果中为默认路径选择实际路径：
+    - 默认路径存在则用默认路径
+    - 否则取相对路径相同的其他模块，planning_exec、control_exec 优先
+    - 都没有则落回默认路径（后续写入会创建）
+    """
+    if primary_path in discovered:
+        return primary_path
+    _, relative = _module_of(primary_path)
+    if relative is None:
+        return primary_path
+    preferred = PATH_DISCOVERY_CONFIG.get('module_priority', ['planning_exec', 'control_exec'])
+    candidates = [path for path in discovered if _module_of(path)[1] == relative]
+    if not candidates:
+        return primary_path
+    candidates.sort(key=lambda path: (preferred.index(_module_of(path)[0])
+                                      if _module_of(path)[0] in preferred else len(preferred), path))
+    return candidates[0]
+
+
+class PathDiscoveryCache:
+    """
+    标定文件实际位置的持久缓存：
+    - 按 车辆|面|软件版本 保存一次扫描的结果，并记录每个 车辆|面 当前使用的版本
+    - 之后的会话直接按缓存选择路径，不再逐个 test -f 探测
+    - 缓存路径读写失败（升级后目录变化）时重新扫描，新版本的结果另存一份
+    - 扫描失败只在内存中记录，failure_ttl 秒内不再重复扫描
+    """
+
+    def __init__(self, store_path=None):
+        self.store_path = store_path or os.path.join(
+            get_cache_dir(), PATH_DISCOVERY_CONFIG.get('cache_file', 'path_discovery.json')
+        )
+        self._lock = threading.Lock()
+        self.records = self._load()
+        self._failures = {}  # 车辆|面 -> 最近一次扫描失败时间
+
+    def _load(self):
+        try:
+            if os.path.exists(self.store_path):
+                with open(self.store_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.warning(f"加载路径发现缓存失败: {e}")
+        return {'current': {}, 'scans': {}}
+
+    def _save(self):
+        try:
+            tmp_path = self.store_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.records, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.store_path)
+        except Exception as e:
+            logger.warning(f"保存路径发现缓存失败: {e}")
+
+    def get(self, car_name, side):
+        """当前版本的已发现文件列表，没有记录返回None"""
+        with self._lock:
+            version = self.records['current'].get(f"{car_name}|{side}")
+            record = self.records['scans'].get(f"{car_name}|{side}|{version}") if version else None
+            return list(record['files']) if record else None
+
+    def put(self, car_name, side, version, files):
+        with self._lock:
+            self._failures.pop(f"{car_name}|{side}", None)
+            self.records['current'][f"{car_name}|{side}"] = version
+            self.records['scans'][f"{car_name}|{side}|{version}"] = {
+                'files': files,
+                'scanned_at': time.time(),
+            }
+            self._save()
+
+
+    def mark_failed(self, car_name, side):
+        with self._lock:
+            self._failures[f"{car_name}|{side}"] = time.monotonic()
+
+    def recently_failed(self, car_name, side):
+        with self._lock:
+            failed_at = self._failures.get(f"{car_name}|{side}")
+        ttl = PATH_DISCOVERY_CONFIG.get('failure_ttl', 60)
+        return failed_at is not None and time.monotonic() - failed_at < ttl
+
+
+def scan(session):
+    """在会话所连的面上执行一次扫描，返回 (success, (版本, [文件路径]) 或 错误信息)"""
+    success, output = session.execute_side_command_persistent(build_discovery_command())
+    if not success:
+        return False, f"扫描标定文件位置失败: {output}"
+    return True, parse_discovery_output(output)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_path_discovery_cache():
+    """进程内共享的路径发现缓存（多个会话写同一文件）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PathDiscoveryCache()
+        return _cache
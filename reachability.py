@@ -0,0 +1,149 @@
+import logging
+import queue
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fleet_engine import bastion_of
+from data_path import SSH_CONFIG, REACHABILITY_CONFIG
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 一个端点的探测结果：latency 为TCP建连耗时（毫秒），detail 为SSH横幅或失败原因
+ProbeResult = namedtuple('ProbeResult', ['reachable', 'latency', 'detail', 'checked_at'])
+
+
+def endpoints_of(config, force_direct=False):
+    """
+    车型需要探测的端点 {角色: (主机, 端口)}：
+    - 跳板机模式只探测跳板机（A/B面在跳板机之后，本机无法直接到达）
+    - 直连模式探测A/B面
+    """
+    port = config.get('port', SSH_CONFIG['default_port'])
+    bastion = bastion_of(config, force_direct)
+    if bastion:
+        return {'跳板机': (bastion, port)}
+    endpoints = {}
+    for side in ('A', 'B'):
+        ip = config.get(f'{side.lower()}_side')
+        if ip:
+            endpoints[f'{side}面'] = (ip, port)
+    return endpoints
+
+
+def probe(host, port, timeout=None):
+    """TCP建连并读取SSH横幅（不认证），返回 ProbeResult"""
+    timeout = timeout or REACHABILITY_CONFIG.get('timeout', 3.0)
+    start = time.monotonic()
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            latency = (time.monotonic() - start) * 1000
+            sock.settimeout(timeout)
+            banner = b''
+            while b'\n' not in banner and len(banner) < 256:
+                chunk = sock.recv(256)
+                if not chunk:
+                    break
+                banner += chunk
+        banner = banner.split(b'\n', 1)[0].decode('utf-8', errors='replace').strip()
+        if banner.startswith('SSH-'):
+            return ProbeResult(True, latency, banner, time.time())
+        return ProbeResult(False, latency, f"端口可达但无SSH横幅: {banner[:40]}", time.time())
+    except socket.timeout:
+        return ProbeResult(False, None, "超时", time.time())
+    except OSError as e:
+        return ProbeResult(False, None, str(e), time.time())
+
+
+class ReachabilityScanner:
+    """
+    后台可达性扫描：
+    - 有界线程池并发探测，多个车型共用的跳板机只探测一次
+    - 结果按 (主机, 端口) 缓存，缓存有效期内不重复探测
+    - 结果放入队列，由界面线程用 root.after 轮询取出，后台线程不接触Tk
+    """
+
+    def __init__(self, max_workers=None, cache_ttl=None):
+        self.max_workers = max_workers or REACHABILITY_CONFIG.get('max_workers', 16)
+        self.cache_ttl = cache_ttl if cache_ttl is not None else REACHABILITY_CONFIG.get('cache_ttl', 60)
+        self.results = queue.Queue()
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._scanning = threading.Event()
+
+    def is_scanning(self):
+        return self._scanning.is_set()
+
+    def cached(self, host, port):
+        with self._cache_lock:
+            result = self._cache.get((host, port))
+        if result and time.time() - result.checked_at < self.cache_ttl:
+            return result
+        return None
+
+    def start(self, terminals, force_direct=False, force=False):
+        """
+        开始一轮扫描（已有扫描进行中则忽略），返回是否启动
+        结果以 (车型, {角色: ProbeResult}) 放入 results 队列；车型的全部端点探测完才放入
+        """
+        if self._scanning.is_set():
+            return False
+        self._scanning.set()
+        targets = {name: endpoints_of(config, force_direct) for name, config in terminals.items()}
+        threading.Thread(target=self._scan, args=(targets, force), daemon=True).start()
+        return True
+
+    def _probe_cached(self, endpoint, force):
+        result = None if force else self.cached(*endpoint)
+        if result is None:
+            result = probe(*endpoint)
+            with self._cache_lock:
+                self._cache[endpoint] = result
+        return result
+
+    def _scan(self, targets, force):
+        try:
+            waiting = {}  # 端点 -> 依赖它的车型
+            for name, roles in targets.items():
+                if not roles:
+                    self.results.put((name, {}))
+                for endpoint in set(roles.values()):
+                    waiting.setdefault(endpoint, []).append(name)
+
+            probed = {}
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(waiting)))) as executor:
+                futures = {executor.submit(self._probe_cached, endpoint, force): endpoint for endpoint in waiting}
+                # 车型的全部端点都有结果即上报，不等待其他慢端点
+                for future in as_completed(futures):
+                    endpoint = futures[future]
+                    probed[endpoint] = future.result()
+                    for name in waiting[endpoint]:
+                        roles = targets[name]
+                        if all(other in probed for other in roles.values()):
+                            self.results.put((name, {role: probed[other] for role, other in roles.items()}))
+            logger.info(f"可达性扫描完成: {len(targets)} 个车型，{len(waiting)} 个端点")
+        except Exception as e:
+            logger.error(f"可达性扫描失败: {e}")
+        finally:
+            self._scanning.clear()
+
+
+def summarize(roles):
+    """界面显示用：(状态, 延迟文本, 是否全部可达)"""
+    if not roles:
+        return "无地址", "", False
+    reachable = [role for role, result in roles.items() if result.reachable]
+    if len(reachable) == len(roles):
+        status = "在线"
+    elif reachable:
+        status = "部分在线: " + ",".join(reachable)
+    else:
+        status = "离线"
+    latency = " / ".join(
+        f"{role} {result.latency:.0f}ms" if result.reachable else f"{role} -"
+        for role, result in roles.items()
+    )
+    return status, latency, len(reachable) == len(roles)
@@ -0,0 +1,58 @@
+import logging
+from data_path import FILE_PATHS
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 单条匹配回传的最大字符数（长行只回传开头，避免一行压缩JSON拖慢搜索）
+SNIPPET_MAX_CHARS = 300
+# 单次搜索最多返回的匹配数
+MAX_RESULTS = 2000
+
+
+def _quote(text):
+    """单引号包裹，用于远端shell参数"""
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+class RemoteSearch:
+    """
+    在车机上直接 grep 标定目录，只回传 文件/行号/片段：
+    - 结果从命令通道逐行读取、逐条产出，调用方可边收边显示
+    - 远端截断长行并限制条数，流量只与匹配数量有关，与目录大小无关
+    """
+
+    def __init__(self, session, directories=None):
+        self.session = session
+        self.directories = directories or FILE_PATHS['conf_directories']
+
+    def build_command(self, pattern, ignore_case=True, max_results=MAX_RESULTS):
+        flags = '-rnF' + ('i' if ignore_case else '')
+        directories = ' '.join(_quote(directory) for directory in self.directories)
+        return (
+            f"grep {flags} -e {_quote(pattern)} {directories} 2>/dev/null "
+            f"| cut -c1-{SNIPPET_MAX_CHARS + 256} | head -n {max_results}"
+        )
+
+    @staticmethod
+    def parse_line(line):
+        """解析 grep -n 输出 '路径:行号:内容'，无法解析返回None"""
+        parts = line.split(':', 2)
+        if len(parts) < 3 or not parts[1].isdigit():
+            return None
+        return parts[0], int(parts[1]), parts[2].strip()[:SNIPPET_MAX_CHARS]
+
+    def search(self, pattern, ignore_case=True, max_results=MAX_RESULTS):
+        """逐条产出 (文件路径, 行号, 匹配片段)；连接或命令失败时抛出异常"""
+        if not pattern:
+            return
+        command = self.build_command(pattern, ignore_case, max_results)
+        logger.info(f"远端搜索: {pattern}")
+        with self.session.side_command_stream(command) as (_, stdout, _):
+            for raw_line in stdout:
+                if isinstance(raw_line, bytes):
+                    raw_line = raw_line.decode('utf-8', errors='replace')
+                result = self.parse_line(raw_line.rstrip('\r\n'))
+                if result:
+                    yield result
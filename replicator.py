@@ -0,0 +1,94 @@
+import logging
+import queue
+import threading
+import time
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 流水线参数：每块大小与队列中最多缓存的块数（本地内存占用上限 = 两者乘积）
+REPLICATION_CHUNK_SIZE = 64 * 1024
+REPLICATION_QUEUE_DEPTH = 8
+
+_END = object()
+
+
+class FileReplicator:
+    """
+    远端到远端的文件复制（A面->B面、车辆->车辆）：
+    - 源端 cat 的输出通道与目标端写入通道之间用有界队列组成流水线，读写并行
+    - 本地只缓存少量数据块，不落盘、不经过编辑器
+    - 目标端按源端sha256校验后才原子替换
+    """
+
+    def __init__(self, source_session, target_session):
+        self.source_session = source_session
+        self.target_session = target_session
+
+    def replicate(self, source_path, target_path=None):
+        """返回 (success, message)"""
+        target_path = target_path or source_path
+        try:
+            size, digest = self.source_session.transfer_manager.stat_remote_file(source_path)
+            if size is None:
+                return False, f"源文件不存在: {source_path}"
+
+            chunks = queue.Queue(maxsize=REPLICATION_QUEUE_DEPTH)
+            reader_error = []
+            abort = threading.Event()
+
+            def put(item):
+                # 目标端失败时停止等待，避免读线程阻塞在满队列上
+                while not abort.is_set():
+                    try:
+                        chunks.put(item, timeout=0.5)
+                        return True
+                    except queue.Full:
+                        continue
+                return False
+
+            def read_source():
+                try:
+                    with self.source_session.side_command_stream(f"cat '{source_path}'") as (_, stdout, _):
+                        while True:
+                            data = stdout.read(REPLICATION_CHUNK_SIZE)
+                            if not data or not put(data):
+                                break
+                except Exception as e:
+                    reader_error.append(e)
+                finally:
+                    put(_END)
+
+            def stream_chunks():
+                received = 0
+                while True:
+                    item = chunks.get()
+                    if item is _END:
+                        break
+                    received += len(item)
+                    yield item
+                if reader_error:
+                    raise IOError(f"读取源文件失败: {reader_error[0]}")
+                if received != size:
+                    raise IOError(f"源文件数据不完整: {received}/{size}")
+
+            start = time.monotonic()
+            reader = threading.Thread(target=read_source, daemon=True)
+            reader.start()
+            try:
+                success, message = self.target_session.write_from_stream(target_path, stream_chunks(), digest)
+            finally:
+                abort.set()
+                reader.join(timeout=5)
+            elapsed = time.monotonic() - start
+
+            if success:
+                logger.info(f"✓ 复制完成: {source_path} -> {target_path}，{size} 字节，耗时 {elapsed:.2f}s")
+                return True, f"复制完成: {target_path}（{size} 字节，{elapsed:.2f}s，sha256 已校验）"
+            return False, message
+
+        except Exception as e:
+            error_msg = f"远端复制失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
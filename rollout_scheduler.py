@@ -0,0 +1,264 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from conf_document import ConfDocument
+from data_path import ROLLOUT_CONFIG, get_cache_dir
+from fleet_engine import FLEET_OPERATIONS, FleetTarget
+from snapshot_store import get_snapshot_store
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 发布整体状态
+ROLLOUT_RUNNING = 'running'
+ROLLOUT_HALTED = 'halted'
+ROLLOUT_COMPLETED = 'completed'
+
+# 单个目标状态
+TARGET_PENDING = 'pending'
+TARGET_DONE = 'done'
+TARGET_FAILED = 'failed'
+
+# 发布过程中产出的事件：
+#   kind='wave'   开始一个批次，wave 为批次序号（0 为灰度批次）
+#   kind='target' 一个目标完成，target/success/message/attempts 有效
+#   kind='halted' 批次失败率超过阈值，发布暂停
+#   kind='done'   全部批次完成
+RolloutEvent = namedtuple('RolloutEvent', ['kind', 'wave', 'target', 'success', 'message', 'attempts'])
+
+
+def _target_key(target):
+    return f"{target.car_name}|{target.side}"
+
+
+def _key_target(key):
+    car_name, side = key.rsplit('|', 1)
+    return FleetTarget(car_name, side)
+
+
+def plan_waves(targets, canary_count=None, wave_percents=None):
+    """
+    划分批次：先灰度批次（前 canary_count 个目标），其余按累计百分比分批
+    如 [10, 50, 100] 表示剩余目标依次发布到 10%、50%、100%
+    """
+    canary_count = ROLLOUT_CONFIG.get('canary_count', 1) if canary_count is None else canary_count
+    wave_percents = wave_percents or ROLLOUT_CONFIG.get('wave_percents', [10, 50, 100])
+    keys = [_target_key(target) for target in targets]
+    waves = [keys[:canary_count]] if canary_count else []
+    rest = keys[canary_count:]
+    start = 0
+    for percent in list(wave_percents) + [100]:
+        end = min(len(rest), math.ceil(len(rest) * percent / 100))
+        if end > start:
+            waves.append(rest[start:end])
+            start = end
+    return [wave for wave in waves if wave]
+
+
+class RolloutState:
+    """
+    一次发布的持久化状态（cache/rollouts/<ID>.json）：
+    - 发布内容存入快照库数据块，状态文件只记录sha256
+    - 每个目标完成后立即保存，进程中断后可从状态文件继续
+    """
+
+    def __init__(self, record, state_path):
+        self.record = record
+        self.state_path = state_path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, operation, content, targets, canary_count=None, wave_percents=None):
+        if operation not in ('write', 'write_adas'):
+            raise ValueError(f"分阶段发布只支持写入操作: {operation}")
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        digest = get_snapshot_store().put_blob(data)
+        rollout_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        record = {
+            'id': rollout_id,
+            'operation': operation,
+            'sha256': digest,
+            'status': ROLLOUT_RUNNING,
+            'created_at': time.time(),
+            'current_wave': 0,
+            'canary': bool(ROLLOUT_CONFIG.get('canary_count', 1) if canary_count is None else canary_count),
+            'waves': plan_waves(targets, canary_count, wave_percents),
+            'targets': {_target_key(target): {'status': TARGET_PENDING, 'attempts': 0, 'message': ''}
+                        for target in targets},
+        }
+        state = cls(record, os.path.join(get_cache_dir('rollouts'), f"{rollout_id}.json"))
+        state.save()
+        return state
+
+    @classmethod
+    def load(cls, state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), state_path)
+
+    @classmethod
+    def list_unfinished(cls):
+        """未完成（进行中被中断或已暂停）的发布，新的在前"""
+        rollouts_dir = get_cache_dir('rollouts')
+        states = []
+        for name in sorted(os.listdir(rollouts_dir), reverse=True):
+            if not name.endswith('.json'):
+                continue
+            try:
+                state = cls.load(os.path.join(rollouts_dir, name))
+                if state.record['status'] != ROLLOUT_COMPLETED:
+                    states.append(state)
+            except Exception as e:
+                logger.warning(f"加载发布状态 {name} 失败: {e}")
+        return states
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.record, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_path)
+
+    def content(self):
+        """发布内容（ConfDocument），快照库中缺失时抛出异常"""
+        data = get_snapshot_store().get_blob(self.record['sha256'])
+        if data is None or hashlib.sha256(data).hexdigest() != self.record['sha256']:
+            raise ValueError("本地快照库中找不到发布内容，无法继续")
+        return ConfDocument(data, sha256=self.record['sha256'])
+
+    def update_target(self, key, status, attempts, message):
+        with self._lock:
+            self.record['targets'][key].update({'status': status, 'attempts': attempts,
+                                                'message': message, 'at': time.time()})
+        self.save()
+
+    def set_status(self, status, current_wave=None):
+        with self._lock:
+            self.record['status'] = status
+            if current_wave is not None:
+                self.record['current_wave'] = current_wave
+        self.save()
+
+    def counts(self):
+        """(已完成, 失败, 总数)"""
+        statuses = [info['status'] for info in self.record['targets'].values()]
+        return statuses.count(TARGET_DONE), statuses.count(TARGET_FAILED), len(statuses)
+
+    def describe(self):
+        done, failed, total = self.counts()
+        label = FLEET_OPERATIONS[self.record['operation']][0]
+        created = time.strftime('%Y-%m-%d %H:%M', time.localtime(self.record['created_at']))
+        return (f"{created} {label} sha256={self.record['sha256'][:12]} "
+                f"批次 {self.record['current_wave'] + 1}/{len(self.record['waves'])}，"
+                f"完成 {done}/{total}，失败 {failed}")
+
+
+class RolloutScheduler:
+    """
+    分阶段发布：
+    - 按批次依次写入，灰度批次先行；批次内按并发上限同时写入（仍受跳板机并发限制）
+    - 单个目标失败按指数退避重试；内容未变化视为已完成，重复执行不会重复写入
+    - 批次内失败数超过阈值时停止提交该批次剩余目标并暂停发布；继续时从当前批次重新处理未完成的目标
+    """
+
+    def __init__(self, engine, state, concurrency=None, max_attempts=None,
+                 backoff_base=None, backoff_max=None, halt_failure_rate=None):
+        self.engine = engine
+        self.state = state
+        self.concurrency = concurrency or ROLLOUT_CONFIG.get('wave_concurrency', 4)
+        self.max_attempts = max_attempts or ROLLOUT_CONFIG.get('max_attempts', 3)
+        self.backoff_base = backoff_base or ROLLOUT_CONFIG.get('backoff_base', 2.0)
+        self.backoff_max = backoff_max or ROLLOUT_CONFIG.get('backoff_max', 30.0)
+        self.halt_failure_rate = (ROLLOUT_CONFIG.get('halt_failure_rate', 0.2)
+                                  if halt_failure_rate is None else halt_failure_rate)
+        self._stop = threading.Event()
+
+    def stop(self):
+        """请求暂停：正在写入的目标完成后不再提交新目标"""
+        self._stop.set()
+
+    def _write_with_retry(self, target, document):
+        _, func = FLEET_OPERATIONS[self.state.record['operation']]
+        message = ''
+        for attempt in range(1, self.max_attempts + 1):
+            success, message, _ = self.engine.run_on_session(target, lambda session: func(session, document))
+            if success:
+                return True, str(message), attempt
+            if attempt < self.max_attempts and not self._stop.is_set():
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+                logger.warning(f"{target.car_name} {target.side}面 写入失败（第{attempt}次），{delay:.0f}秒后重试: {message}")
+                self._stop.wait(delay)
+            else:
+                return False, str(message), attempt
+        return False, str(message), self.max_attempts
+
+    def _halt_limit(self, wave_size, is_canary):
+        # 灰度批次任何失败都暂停；其余批次失败数超过 比例*批次大小 时暂停
+        if is_canary:
+            return 0
+        return int(self.halt_failure_rate * wave_size)
+
+    def run(self):
+        """执行（或继续）发布，按完成顺序产出 RolloutEvent"""
+        record = self.state.record
+        document = self.state.content()
+        self._stop.clear()
+        self.state.set_status(ROLLOUT_RUNNING)
+
+        for wave_index in range(record['current_wave'], len(record['waves'])):
+            self.state.set_status(ROLLOUT_RUNNING, current_wave=wave_index)
+            keys = [key for key in record['waves'][wave_index]
+                    if record['targets'][key]['status'] != TARGET_DONE]
+            if not keys:
+                continue
+            yield RolloutEvent('wave', wave_index, None, None, None, None)
+
+            limit = self._halt_limit(len(record['waves'][wave_index]), record.get('canary') and wave_index == 0)
+            failed = 0
+            executor = ThreadPoolExecutor(max_workers=min(self.concurrency, len(keys)))
+            futures = {}
+            try:
+                for key in keys:
+                    target = _key_target(key)
+                    futures[executor.submit(self._write_with_retry, target, document)] = target
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    target = futures[future]
+                    success, message, attempts = future.result()
+                    self.state.update_target(_target_key(target), TARGET_DONE if success else TARGET_FAILED,
+                                             attempts, message)
+                    yield RolloutEvent('target', wave_index, target, success, message, attempts)
+                    if not success:
+                        failed += 1
+                        if failed > limit:
+                            self._stop.set()
+                    if self._stop.is_set():
+                        # 未开始的目标保持待处理状态，继续发布时重新提交
+                        for pending in futures:
+                            pending.cancel()
+            except GeneratorExit:
+                # 调用方中途放弃：等待进行中的写入结束后退出，状态保持可继续
+                self._stop.set()
+                raise
+            finally:
+                executor.shutdown(wait=True)
+
+            if self._stop.is_set():
+                self.state.set_status(ROLLOUT_HALTED)
+                reason = f"批次失败 {failed} 个，超过阈值" if failed > limit else "已手动暂停"
+                logger.warning(f"发布 {record['id']} 在第 {wave_index + 1} 批次暂停: {reason}")
+                yield RolloutEvent('halted', wave_index, None, False, reason, None)
+                return
+
+        self.state.set_status(ROLLOUT_COMPLETED, current_wave=len(record['waves']) - 1)
+        done, failed, total = self.state.counts()
+        logger.info(f"发布 {record['id']} 完成: {done}/{total} 成功，{failed} 失败")
+        yield RolloutEvent('done', None, None, failed == 0, f"{done}/{total} 成功，{failed} 失败", None)
@@ -0,0 +1,139 @@
+import logging
+import threading
+from collections import OrderedDict
+from ssh_manager import SSHManager
+from data_path import SSH_CONFIG
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class SessionManager:
+    """
+    多会话管理：同一进程内同时保持多个车辆/面的独立SSHManager会话
+    - 每个会话用句柄寻址（默认 车型名，指定面时为 车型名#面）
+    - 所有会话共享资源预算：会话数上限 + 合计命令通道上限
+    - 关闭某个会话不影响其他会话的连接
+    """
+
+    def __init__(self, max_sessions=None, max_total_channels=None, interactive=True):
+        self.max_sessions = max_sessions or SSH_CONFIG.get('max_sessions', 8)
+        self.interactive = interactive  # 为False时会话认证失败不弹出密码输入框
+        self.channel_budget = threading.BoundedSemaphore(
+            max_total_channels or SSH_CONFIG.get('max_total_channels', 16)
+        )
+        self._lock = threading.RLock()
+        self._sessions = OrderedDict()
+        self.active_handle = None
+
+    @staticmethod
+    def make_handle(car_name, side=None):
+        """生成会话句柄"""
+        return f"{car_name}#{side}" if side else str(car_name)
+
+    def open_session(self, handle):
+        """获取或创建会话，返回 (success, SSHManager 或 错误信息)"""
+        with self._lock:
+            session = self._sessions.get(handle)
+            if session:
+                return True, session
+
+            if len(self._sessions) >= self.max_sessions:
+                # 优先回收未连接的空闲会话
+                idle = [h for h, m in self._sessions.items()
+                        if not m.is_connected() and h != self.active_handle]
+                if not idle:
+                    error_msg = f"会话数已达上限({self.max_sessions})，请先断开其他车辆"
+                    logger.warning(error_msg)
+                    return False, error_msg
+                self._sessions.pop(idle[0])
+
+            session = SSHManager(channel_budget=self.channel_budget, interactive=self.interactive)
+            self._sessions[handle] = session
+            logger.info(f"创建会话: {handle}（当前会话数 {len(self._sessions)}）")
+            return True, session
+
+    def get_session(self, handle):
+        """按句柄获取会话，不存在返回None"""
+        with self._lock:
+            return self._sessions.get(handle)
+
+    def set_active(self, handle):
+        """设置界面当前操作的会话，None 表示不选中任何会话"""
+        with self._lock:
+            if handle is None or handle in self._sessions:
+                self.active_handle = handle
+
+    def get_active(self):
+        """获取当前会话，不存在返回None"""
+        with self._lock:
+            return self._sessions.get(self.active_handle)
+
+    def close_session(self, handle):
+        """断开并移除指定会话"""
+        with self._lock:
+            session = self._sessions.pop(handle, None)
+            if self.active_handle == handle:
+                self.active_handle = None
+        if session:
+            session.disconnect()
+            logger.info(f"会话已关闭: {handle}")
+
+    def connect_side_session(self, car_name, config, side, force_direct=False):
+        """
+        打开（或复用）车型指定面的独立会话（句柄 车型名#面），用于同时操作A/B两面
+        返回 (success, SSHManager 或 错误信息)
+        """
+        try:
+            success, session = self.open_session(self.make_handle(car_name, side))
+            if not success:
+                return False, session
+
+            snapshot = session.get_session_snapshot()
+            if snapshot.side_connected and snapshot.side == side:
+                return True, session
+
+            ip = config.get('a_side' if side == 'A' else 'b_side')
+            port = config.get('port', 22)
+            working_directory = config.get('working_directory')
+            session.select_transport_profile(config.get('transport_profile'))
+
+            if force_direct or config.get('connection_type', 'tunnel') == 'direct':
+                success, message = session.connect_headunit_direct(
+                    car_name, side, ip,
+                    config.get(f'{side.lower()}_side_username'),
+                    config.get(f'{side.lower()}_side_password'),
+                    port, working_directory
+                )
+            else:
+                if not snapshot.connected:
+                    success, message = session.connect_to_vehicle(
+                        car_name, config.get('ssh_command', ''), port, working_directory
+                    )
+                    if not success:
+                        return False, message
+                success, message = session.connect_to_side_tunnel(side, ip, port=port)
+
+            return (True, session) if success else (False, message)
+
+        except Exception as e:
+            error_msg = f"打开{car_name} {side}面会话失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def list_sessions(self):
+        """返回 [(句柄, 会话快照)]"""
+        with self._lock:
+            items = list(self._sessions.items())
+        return [(handle, session.get_session_snapshot()) for handle, session in items]
+
+    def close_all(self):
+        """关闭所有会话"""
+        with self._lock:
+            handles = list(self._sessions.keys())
+        for handle in handles:
+            try:
+                self.close_session(handle)
+            except Exception as e:
+                logger.error(f"关闭会话 {handle} 失败: {e}")
@@ -0,0 +1,104 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from param_flatten import flatten
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 检查结果状态
+CONSISTENT = 'same'
+INCONSISTENT = 'different'
+CHECK_FAILED = 'error'
+
+
+def diff_trees(tree_a, tree_b):
+    """键级差异：返回 [(键路径, A面取值, B面取值)]，一侧缺失的键取值为None"""
+    flat_a, flat_b = flatten(tree_a), flatten(tree_b)
+    return [(key, flat_a.get(key), flat_b.get(key))
+            for key in sorted(flat_a.keys() | flat_b.keys())
+            if flat_a.get(key) != flat_b.get(key)]
+
+
+class SideConsistencyChecker:
+    """
+    A/B两面标定文件一致性检查：
+    - 两面并行查询各文件sha256（不下载内容），哈希相同即判为一致
+    - 仅哈希不同的文件两面并行下载并做键级对比
+    - 报告每个阶段、每一面的耗时
+    """
+
+    def __init__(self, side_sessions):
+        # side_sessions: {'A': SSHManager, 'B': SSHManager}
+        self.side_sessions = side_sessions
+
+    def _timed(self, func, *args):
+        start = time.monotonic()
+        success, result = func(*args)
+        return success, result, round(time.monotonic() - start, 3)
+
+    def _run_parallel(self, tasks):
+        """tasks: {键: (函数, 参数...)}，并行执行，返回 {键: (success, result, 耗时)}"""
+        with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+            futures = {key: pool.submit(self._timed, *task) for key, task in tasks.items()}
+            return {key: future.result() for key, future in futures.items()}
+
+    def check(self, kinds=('params', 'adas')):
+        """
+        返回 (是否全部一致, report)
+        report: {文件类型: {'status', 'hashes': {面: sha256}, 'timings', 'diff', 'message'}}
+        timings: {'hash': {面: 秒}, 'read': {面: 秒}, 'diff': 秒}，未执行的阶段不出现
+        """
+        sides = list(self.side_sessions)
+        report = {kind: {'status': CHECK_FAILED, 'hashes': {}, 'timings': {}, 'diff': [], 'message': ''}
+                  for kind in kinds}
+
+        # 阶段一：两面所有文件的sha256一起并行查询
+        stats = self._run_parallel({
+            (kind, side): (self.side_sessions[side].stat_conf_file, kind)
+            for kind in kinds for side in sides
+        })
+
+        to_read = {}
+        for kind in kinds:
+            item = report[kind]
+            item['timings']['hash'] = {side: stats[(kind, side)][2] for side in sides}
+            errors = [f"{side}面: {stats[(kind, side)][1]}" for side in sides if not stats[(kind, side)][0]]
+            if errors:
+                item['message'] = "；".join(errors)
+                continue
+            item['hashes'] = {side: stats[(kind, side)][1][2] for side in sides}
+            if len(set(item['hashes'].values())) == 1:
+                item['status'] = CONSISTENT
+                item['message'] = "两面内容一致"
+            else:
+                for side in sides:
+                    file_path, _, digest = stats[(kind, side)][1]
+                    to_read[(kind, side)] = (self.side_sessions[side].read_conf_file_expecting, file_path, digest)
+
+        # 阶段二：只下载哈希不同的文件
+        if to_read:
+            documents = self._run_parallel(to_read)
+            for kind in {kind for kind, _ in to_read}:
+                item = report[kind]
+                item['timings']['read'] = {side: documents[(kind, side)][2] for side in sides}
+                errors = [f"{side}面: {documents[(kind, side)][1]}" for side in sides
+                          if not documents[(kind, side)][0]]
+                if errors:
+                    item['message'] = "；".join(errors)
+                    continue
+                start = time.monotonic()
+                try:
+                    trees = [documents[(kind, side)][1].tree for side in sides]
+                    item['diff'] = diff_trees(*trees)
+                    item['status'] = INCONSISTENT
+                    item['message'] = (f"{len(item['diff'])} 个键不同" if item['diff']
+                                       else "字节不同但键值一致（仅格式或顺序差异）")
+                except ValueError as e:
+                    item['message'] = f"内容不同，且无法解析为JSON: {e}"
+                item['timings']['diff'] = round(time.monotonic() - start, 3)
+
+        all_same = all(item['status'] == CONSISTENT for item in report.values())
+        logger.info("A/B一致性检查完成: " + ", ".join(f"{kind}={item['status']}" for kind, item in report.items()))
+        return all_same, report
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import lzma
+import os
+import threading
+import time
+import zlib
+from data_path import SNAPSHOT_CONFIG, get_cache_dir
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 数据块首字节标记压缩算法
+_CODECS = {
+    'zlib': (b'Z', lambda data: zlib.compress(data, 9), zlib.decompress),
+    'lzma': (b'X', lzma.compress, lzma.decompress),
+}
+_DECODERS = {marker: decode for marker, _, decode in _CODECS.values()}
+
+
+class SnapshotStore:
+    """
+    本地内容寻址快照库：
+    - objects/ 下按sha256保存压缩后的数据块，同内容只存一份
+    - index.json 记录 (车辆, 面, 路径) -> 版本列表（新版本在后），内存中常驻便于快速查询
+    - 每次读写只向 index.log 追加一行，累计到 index_compact_lines 行时才整体重写 index.json，
+      批量操作时不会每个目标都重写整个索引
+    - 连续读到相同内容时只更新最近一次出现时间，不新增版本
+    """
+
+    def __init__(self, root_dir=None):
+        self.root_dir = root_dir or get_cache_dir('snapshots')
+        self.objects_dir = os.path.join(self.root_dir, 'objects')
+        self.index_path = os.path.join(self.root_dir, 'index.json')
+        self.log_path = os.path.join(self.root_dir, 'index.log')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.compression = SNAPSHOT_CONFIG.get('compression', 'lzma')
+        self.max_versions = SNAPSHOT_CONFIG.get('max_versions', 500)
+        self.compact_lines = SNAPSHOT_CONFIG.get('index_compact_lines', 1000)
+        self._lock = threading.Lock()
+        self.index = self._load_index()
+        self._log_lines = self._replay_log()
+
+    # ========= 索引 =========
+    def _load_index(self):
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.warning(f"加载快照索引失败，重新建立: {e}")
+        return {}
+
+    def _save_index(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _apply_version(self, key, version):
+        """与最新版本内容相同则替换（更新出现时间/操作），否则追加；重复应用结果不变"""
+        versions = self.index.setdefault(key, [])
+        if versions and versions[-1]['sha256'] == version['sha256']:
+            versions[-1] = version
+        else:
+            versions.append(version)
+            del versions[:-self.max_versions]
+
+    def _replay_log(self):
+        """启动时把上次未合并的追加记录应用到索引，返回已应用行数"""
+        count = 0
+        try:
+            if os.path.exists(self.log_path):
+                with open(self.log_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # 最后一行可能因中途退出而不完整
+                            continue
+                        self._apply_version(entry['key'], entry['version'])
+                        count += 1
+        except Exception as e:
+            logger.warning(f"回放快照索引日志失败: {e}")
+        return count
+
+    def _log_version(self, key, version):
+        """追加一行版本记录，行数达到阈值时合并进 index.json 并清空日志（调用方持有锁）"""
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'key': key, 'version': version}, ensure_ascii=False) + "\n")
+        self._log_lines += 1
+        if self._log_lines >= self.compact_lines:
+            self._save_index()
+            os.remove(self.log_path)
+            self._log_lines = 0
+
+    @staticmethod
+    def _key(vehicle, side, path):
+        return f"{vehicle}|{side}|{path}"
+
+    # ========= 数据块 =========
+    def _blob_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def has_blob(self, digest):
+        return os.path.exists(self._blob_path(digest))
+
+    def put_blob(self, data, digest=None):
+        """保存数据块（已存在则跳过），返回sha256；调用方已算好的digest可直接传入"""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            marker, encode, _ = _CODECS.get(self.compression, _CODECS['zlib'])
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(marker + encode(data))
+            os.replace(tmp_path, blob_path)
+        return digest
+
+    def get_blob(self, digest):
+        """按sha256读取数据块，不存在返回None"""
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            return None
+        with open(blob_path, 'rb') as f:
+            raw = f.read()
+        return _DECODERS[raw[:1]](raw[1:])
+
+    # ========= 版本 =========
+    def _append_version(self, vehicle, side, path, digest, size, action):
+        now = time.time()
+        key = self._key(vehicle, side, path)
+        with self._lock:
+            versions = self.index.get(key)
+            if versions and versions[-1]['sha256'] == digest:
+                version = dict(versions[-1], last_seen=now)
+                if action == 'write':
+                    version['action'] = 'write'
+            else:
+                version = {
+                    'sha256': digest,
+                    'size': size,
+                    'action': action,
+                    'timestamp': now,
+                    'last_seen': now,
+                }
+            self._apply_version(key, version)
+            self._log_version(key, version)
+
+    def record(self, vehicle, side, path, data, action, digest=None):
+        """记录一次读/写（action: 'read' / 'write'），返回sha256"""
+        try:
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            digest = self.put_blob(data, digest)
+            self._append_version(vehicle, side, path, digest, len(data), action)
+            return digest
+        except Exception as e:
+            logger.warning(f"记录快照失败: {e}")
+            return None
+
+    def record_digest(self, vehicle, side, path, digest, size, action):
+        """内容已在库中时（如远端复制），只按sha256追加版本记录；数据块不存在返回False"""
+        try:
+            if not self.has_blob(digest):
+                return False
+            self._append_version(vehicle, side, path, digest, size, action)
+            return True
+        except Exception as e:
+            logger.warning(f"记录快照失败: {e}")
+            return False
+
+    def list_versions(self, vehicle, side, path):
+        """列出版本（最新在前）"""
+        with self._lock:
+            return list(reversed(self.index.get(self._key(vehicle, side, path), [])))
+
+    def latest(self, vehicle, side, path, actions=None):
+        """最近一个版本的记录（actions 不为空时只看这些操作产生的版本），没有则返回None"""
+        with self._lock:
+            for version in reversed(self.index.get(self._key(vehicle, side, path), [])):
+                if actions is None or version['action'] in actions:
+                    return dict(version)
+            return None
+
+    def get_version(self, vehicle, side, path, digest=None):
+        """读取指定版本内容（digest为空取最新），不存在返回None"""
+        if digest is None:
+            record = self.latest(vehicle, side, path)
+            if not record:
+                return None
+            digest = record['sha256']
+        return self.get_blob(digest)
+
+    def list_keys(self):
+        """返回所有 (车辆, 面, 路径)"""
+        with self._lock:
+            return [tuple(key.split('|', 2)) for key in self.index.keys()]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store():
+    """进程内共享的快照库"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SnapshotStore()
+        return _store
@@ -1,15 +1,39 @@
 import paramiko
-import json
-import os
-import sys
 import logging
 import time
-from tkinter import messagebox, simpledialog
+import socket
+import threading
+import functools
+import contextlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import simpledialog
+from transfer_manager import TransferManager, CAS_CONFLICT, CONFLICT_MESSAGE, NO_CHANGE_MESSAGE
+import conf_transaction
+import output_framing
+from conf_document import ConfDocument
+from bulk_transfer import BulkTransfer
+from remote_search import RemoteSearch
+from conf_manifest import ConfSync
+from offline_journal import get_write_journal, JOURNAL_CONFLICT, JOURNAL_FLUSHED
+import path_discovery
+from path_discovery import get_path_discovery_cache
+from snapshot_store import get_snapshot_store
+from timeout_tuner import get_timeout_tuner
+from transport_profiles import (
+    get_transport_profile_store,
+    TransportCalibrator,
+    get_transport_profile,
+    apply_transport_profile,
+)
 from data_path import (
     SSH_CONFIG,
     FILE_PATHS,
     SIDE_CONFIG,
     MOUNT_CONFIG,
+    TRANSFER_CONFIG,
+    TRANSPORT_CONFIG,
+    SNAPSHOT_CONFIG,
     get_full_file_path,
     get_full_adas_file_path,
 )
@@ -18,9 +42,53 @@ from data_path import (
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 远端文件不存在时的错误信息前缀
+FILE_NOT_FOUND = "文件不存在"
+
+# 会话状态的不可变快照，供后台线程/界面读取，不受连接切换过程影响
+SessionSnapshot = namedtuple('SessionSnapshot', [
+    'connected',
+    'side_connected',
+    'direct_mode',
+    'host',
+    'car_name',
+    'side',
+    'side_ip',
+    'side_username',
+    'working_directory',
+])
+
+
+def _locked(method):
+    """修改会话状态的方法：持有会话锁执行，结束后发布新的状态快照"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._publish_snapshot()
+    return wrapper
+
+
+def _write_serialized(method):
+    """写入类方法：同一会话内串行执行，避免挂载/上传/替换交错"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class SSHManager:
-    def __init__(self):
+    def __init__(self, channel_budget=None, interactive=True):
+        # 非交互会话（批量/后台线程使用）认证失败时直接返回错误，不弹出密码输入框
+        self.interactive = interactive
+        self._lock = threading.RLock()  # 会话锁：连接/断开/切换工作目录互斥
+        self._write_lock = threading.Lock()  # 写入锁：同一会话的挂载+上传+替换串行执行
+        self._channel_slots = threading.BoundedSemaphore(SSH_CONFIG.get('max_concurrent_channels', 4))
+        # 多会话共享的通道预算（由SessionManager提供），单独使用时不限制
+        self._channel_budget = channel_budget
         self.ssh_client = None
         self.side_ssh_client = None
         self.side_channel = None
@@ -33,6 +101,42 @@ class SSHManager:
         self.current_side_ip = None
         self.current_side_username = None
         self.current_working_directory = FILE_PATHS['default_working_directory']
+        self.transfer_manager = TransferManager(self)
+        self.timeout_tuner = get_timeout_tuner()
+        self.transport_profile_store = get_transport_profile_store()
+        self.selected_transport_profile = None  # 配置中显式指定的传输档位
+        self._staged_transactions = {}  # 两阶段提交中已暂存的事务: 事务ID -> (条目, 文件内容)
+        self._resolved_paths = {}  # 默认路径 -> 实际使用的路径（回退选择结果）
+        self._remote_hashes = {}  # (车辆, 面, 远端路径) -> 最近一次读取/写入时的sha256
+        self._snapshot = None
+        self._publish_snapshot()
+
+    # ========= 会话快照 =========
+    def _publish_snapshot(self):
+        """根据当前状态生成新快照（引用替换是原子的，读者无需加锁）"""
+        self._snapshot = SessionSnapshot(
+            connected=self.connected,
+            side_connected=self.side_connected,
+            direct_mode=self.direct_mode,
+            host=self.current_host,
+            car_name=self.current_car_name,
+            side=self.current_side,
+            side_ip=self.current_side_ip,
+            side_username=self.current_side_username,
+            working_directory=self.current_working_directory,
+        )
+
+    def get_session_snapshot(self):
+        """获取当前会话状态的不可变快照"""
+        return self._snapshot
+
+    def _channel_slot(self):
+        """占用一个命令通道：同时受本会话上限和多会话共享预算约束"""
+        stack = contextlib.ExitStack()
+        if self._channel_budget is not None:
+            stack.enter_context(self._channel_budget)
+        stack.enter_context(self._channel_slots)
+        return stack
 
     # ========= 基础工具 =========
     def _new_ssh_client(self):
@@ -41,15 +145,17 @@ class SSHManager:
         client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         return client
 
-    def _connect_with_password(self, client, host, port, username, password, sock=None):
-        """统一的SSH连接封装，便于直连/隧道复用"""
+    def _connect_with_password(self, client, host, port, username, password, sock=None, profile=None):
+        """统一的SSH连接封装，便于直连/隧道复用；超时按主机历史RTT自适应，并应用传输档位"""
+        host_key = self.timeout_tuner.host_key(host, port, via=self.current_host if sock else None)
+        timeouts = self.timeout_tuner.get_timeouts(host_key)
         connect_kwargs = {
             'hostname': host,
             'port': port,
             'username': username,
-            'timeout': SSH_CONFIG.get('timeout', 10),
-            'auth_timeout': SSH_CONFIG.get('auth_timeout', 15),
-            'banner_timeout': SSH_CONFIG.get('banner_timeout', 15),
+            'timeout': timeouts['timeout'],
+            'auth_timeout': timeouts['auth_timeout'],
+            'banner_timeout': timeouts['banner_timeout'],
             'allow_agent': False,
             'look_for_keys': False,
         }
@@ -57,51 +163,143 @@ class SSHManager:
             connect_kwargs['password'] = password
         if sock:
             connect_kwargs['sock'] = sock
+        if profile:
+            connect_kwargs['compress'] = profile['compress']
 
-        client.connect(**connect_kwargs)
+        logger.info(f"连接 {host_key} 使用超时: {timeouts}")
+        start = time.monotonic()
+        try:
+            client.connect(**connect_kwargs)
+        except paramiko.AuthenticationException:
+            # 认证失败说明链路可达，不影响超时统计
+            raise
+        except Exception as e:
+            self.timeout_tuner.record_failure(host_key, self._is_timeout_error(e))
+            raise
+        handshake = time.monotonic() - start
+
+        self.timeout_tuner.record_success(host_key, handshake, self._measure_rtt(client))
+        if profile:
+            apply_transport_profile(client.get_transport(), profile)
         return client
 
-    # ========= 远端文件工具 =========
-    def _remote_file_exists(self, file_path):
-        """检查远端文件是否存在"""
+    # ========= 传输档位 =========
+    @_locked
+    def select_transport_profile(self, profile_name):
+        """显式指定传输档位（如车型配置中的 transport_profile），None 表示自动"""
+        if profile_name and not get_transport_profile(profile_name):
+            logger.warning(f"未知传输档位，忽略: {profile_name}")
+            profile_name = None
+        self.selected_transport_profile = profile_name
+
+    def _resolve_transport_profile(self, car_name, tunnel):
+        """档位选择顺序：显式指定 > 该车校准结果 > 连接方式默认"""
+        name = (
+            self.selected_transport_profile
+            or self.transport_profile_store.get_profile_name(car_name)
+            or TRANSPORT_CONFIG['default_tunnel_profile' if tunnel else 'default_direct_profile']
+        )
+        profile = get_transport_profile(name)
+        logger.info(f"车辆 {car_name} 使用传输档位: {name}")
+        return profile
+
+    def calibrate_transport_profile(self):
+        """在当前A/B面上自动校准并保存该车最佳传输档位（只比较窗口/包长，压缩设置保持不变）"""
+        return TransportCalibrator(self).calibrate()
+
+    def _measure_rtt(self, client):
+        """利用keepalive全局请求测量一次往返时延（服务端会立即回复）"""
         try:
-            cmd = f"test -f '{file_path}' && echo OK || echo NO"
-            success, result = self.execute_side_command_persistent(cmd)
-            if success and "OK" in result:
-                return True
-            return False
-        except Exception:
-            return False
+            transport = client.get_transport()
+            start = time.monotonic()
+            transport.global_request('keepalive@openssh.com', wait=True)
+            return time.monotonic() - start
+        except Exception as e:
+            logger.warning(f"测量RTT失败: {e}")
+            return None
+
+    @staticmethod
+    def _is_timeout_error(error):
+        """判断连接异常是否为超时类（TCP超时/等待banner超时）"""
+        if isinstance(error, socket.timeout):
+            return True
+        message = str(error).lower()
+        return 'timed out' in message or 'timeout' in message or 'banner' in message
 
-    def _resolve_with_fallback(self, primary_path):
+    def _get_connect_timeout(self, host, port, via=None):
+        """获取指定主机的TCP连接超时（用于隧道通道建立）"""
+        key = self.timeout_tuner.host_key(host, port, via=via)
+        return self.timeout_tuner.get_timeouts(key)['timeout']
+
+    # ========= 远端文件工具 =========
+    def _discover_conf_files(self, rescan=False):
         """
-        读取/写入时的路径选择：
+        当前车辆/面上标定文件的实际位置：先查本地持久缓存，没有或 rescan=True 时扫描一次并保存
+        返回文件路径列表，扫描失败返回None
+        """
+        snapshot = self._snapshot
+        cache = get_path_discovery_cache()
+        if not rescan:
+            files = cache.get(snapshot.car_name, snapshot.side)
+            if files is not None:
+                return files
+        if cache.recently_failed(snapshot.car_name, snapshot.side):
+            # 刚扫描失败过（如车机上 find 不可用），短时间内不再重复扫描
+            return None
+
+        success, result = path_discovery.scan(self)
+        if not success:
+            logger.warning(result)
+            cache.mark_failed(snapshot.car_name, snapshot.side)
+            return None
+        version, files = result
+        cache.put(snapshot.car_name, snapshot.side, version, files)
+        logger.info(f"已扫描标定文件位置（版本 {version}）: {files}")
+        return files
+
+    def _resolve_with_fallback(self, primary_path, rescan=False):
+        """
+        读取/写入时的路径选择（按路径发现缓存，无需逐个探测）：
         - 优先 primary（默认 planning_exec）
-        - 若 primary 不存在且 secondary 存在（control_exec），则使用 secondary
-        - 若两者都存在，仍用 primary
+        - primary 不存在时取其他模块中相对路径相同的文件（control_exec 等）
+        - 都不存在则落回默认路径，后续写入会创建
         """
         try:
-            secondary_path = primary_path.replace("/planning_exec/", "/control_exec/")
-
-            primary_exists = self._remote_file_exists(primary_path)
-            secondary_exists = False
-            if not primary_exists:
-                secondary_exists = self._remote_file_exists(secondary_path)
-
-            if primary_exists:
-                chosen = primary_path
-            elif secondary_exists:
-                chosen = secondary_path
-            else:
-                chosen = primary_path  # 都不存在则落回默认路径，后续写入会创建
+            files = self._discover_conf_files(rescan=rescan)
+            chosen = path_discovery.choose_path(primary_path, files) if files is not None else primary_path
 
             if chosen != primary_path:
                 logger.info(f"文件不存在于默认路径，使用备选路径: {chosen}")
+            self._resolved_paths[primary_path] = chosen
             return chosen
         except Exception as e:
             logger.error(f"路径回退选择失败，使用默认路径: {e}")
             return primary_path
 
+    def _read_conf_file(self, primary_path):
+        """按缓存路径读取标定文件；缓存路径上文件不存在时重新扫描一次再读"""
+        file_path = self._resolve_with_fallback(primary_path)
+        logger.info(f"读取文件路径: {file_path}")
+        read_success, read_result = self._read_remote_file(file_path)
+        if not read_success and read_result.startswith(FILE_NOT_FOUND):
+            rescanned_path = self._resolve_with_fallback(primary_path, rescan=True)
+            if rescanned_path != file_path:
+                logger.info(f"文件位置已变化，重新读取: {rescanned_path}")
+                read_success, read_result = self._read_remote_file(rescanned_path)
+        return read_success, read_result
+
+    def _write_conf_file(self, primary_path, document, force=False):
+        """按缓存路径写入标定文件；写入失败时重新扫描一次，文件位置已变化则写入新位置"""
+        file_path = self._resolve_with_fallback(primary_path)
+        logger.info(f"目标文件路径: {file_path}")
+        write_success, write_result = self._write_if_changed(file_path, document, force)
+        if not write_success:
+            rescanned_path = self._resolve_with_fallback(primary_path, rescan=True)
+            if rescanned_path != file_path:
+                logger.info(f"文件位置已变化，重新写入: {rescanned_path}")
+                write_success, write_result = self._write_if_changed(rescanned_path, document, force)
+        return write_success, write_result
+
     def mount_filesystem(self):
         """挂载文件系统为可写"""
         try:
@@ -123,6 +321,7 @@ class SSHManager:
             logger.error(error_msg)
             return False, error_msg
 
+    @_locked
     def set_working_directory(self, working_directory):
         """设置工作目录"""
         try:
@@ -135,6 +334,16 @@ class SSHManager:
             logger.error(f"设置工作目录失败: {e}")
             self.current_working_directory = FILE_PATHS['default_working_directory']
 
+    def _ask_password(self, prompt):
+        """默认密码失败时请求用户输入；非交互会话不弹窗，直接返回None"""
+        if not self.interactive:
+            logger.warning("非交互会话，不提示输入密码")
+            return None
+        return simpledialog.askstring("密码输入", prompt, show='*')
+
+    def _password_cancelled_message(self):
+        return "用户取消输入密码" if self.interactive else "默认密码认证失败（批量操作不提示输入密码）"
+
     def parse_ssh_command(self, ssh_command):
         """解析SSH命令格式：支持多种格式"""
         try:
@@ -184,6 +393,7 @@ class SSHManager:
         except:
             return False
 
+    @_locked
     def connect_to_vehicle(self, car_name, ssh_command, port=SSH_CONFIG['default_port'], working_directory=None):
         """连接到车辆（跳板机）"""
         try:
@@ -206,8 +416,10 @@ class SSHManager:
             # 优先尝试默认密码，失败后提示用户输入
             default_password = SSH_CONFIG.get('default_password', 'auto')
 
+            profile = self._resolve_transport_profile(car_name, tunnel=True)
+
             def try_once(pwd):
-                self._connect_with_password(self.ssh_client, host, port, username, pwd)
+                self._connect_with_password(self.ssh_client, host, port, username, pwd, profile=profile)
                 if not self._test_connection(self.ssh_client):
                     raise Exception("连接测试失败")
 
@@ -218,13 +430,9 @@ class SSHManager:
             except paramiko.AuthenticationException:
                 logger.warning("默认密码认证失败，请求用户输入密码")
                 try:
-                    password = simpledialog.askstring(
-                        "密码输入",
-                        f"默认密码认证失败\n请输入 {username}@{host} 的密码:",
-                        show='*'
-                    )
+                    password = self._ask_password(f"默认密码认证失败\n请输入 {username}@{host} 的密码:")
                     if not password:
-                        return False, "用户取消输入密码"
+                        return False, self._password_cancelled_message()
 
                     logger.info("第二步: 尝试使用用户输入密码连接")
                     try_once(password)
@@ -254,6 +462,7 @@ class SSHManager:
             logger.error(error_msg)
             return False, error_msg
 
+    @_locked
     def prepare_direct_vehicle(self, car_name, working_directory=None):
         """准备直连车机模式（不经过跳板机）"""
         try:
@@ -269,6 +478,7 @@ class SSHManager:
             logger.error(error_msg)
             return False, error_msg
 
+    @_locked
     def connect_to_side_direct(self, side, ip, username=None, password=None, port=SSH_CONFIG['default_port']):
         """直接连接到A/B面（车机环境，无跳板机）"""
         try:
@@ -286,7 +496,8 @@ class SSHManager:
                 self.side_ssh_client.close()
 
             self.side_ssh_client = self._new_ssh_client()
-            self._connect_with_password(self.side_ssh_client, ip, port, username, password)
+            profile = self._resolve_transport_profile(self.current_car_name, tunnel=False)
+            self._connect_with_password(self.side_ssh_client, ip, port, username, password, profile=profile)
 
             self.current_side = side
             self.current_side_ip = ip
@@ -302,6 +513,7 @@ class SSHManager:
             logger.error(error_msg)
             return False, error_msg
 
+    @_locked
     def connect_headunit_direct(self, car_name, side, ip, username=None, password=None,
                                 port=SSH_CONFIG['default_port'], working_directory=None):
         """
@@ -323,6 +535,7 @@ class SSHManager:
             logger.error(error_msg)
             return False, error_msg
 
+    @_locked
     def connect_to_side_tunnel(self, side, ip, username=None, password=None, port=SSH_CONFIG['default_port']):
         """使用SSH隧道连接到A/B面"""
         try:
@@ -337,12 +550,16 @@ class SSHManager:
 
             # 在跳板机上建立到A/B面的SSH隧道
             transport = self.ssh_client.get_transport()
+            profile = self._resolve_transport_profile(self.current_car_name, tunnel=True)
 
-            # 创建到目标主机的通道
+            # 创建到目标主机的通道（隧道通道同样使用档位的窗口/包长）
             self.side_channel = transport.open_channel(
                 'direct-tcpip',
                 (ip, port),
-                ('', 0)
+                ('', 0),
+                window_size=profile['window_size'],
+                max_packet_size=profile['max_packet_size'],
+                timeout=self._get_connect_timeout(ip, port, via=self.current_host)
             )
 
             # 创建新的SSH客户端用于A/B面连接
@@ -351,23 +568,23 @@ class SSHManager:
             try:
                 # 通过隧道连接A/B面，先尝试默认密码
                 side_password = SIDE_CONFIG.get(f'{side.lower()}_side_password', "Huawei12#$")
-                self._connect_with_password(self.side_ssh_client, ip, port, username, side_password, sock=self.side_channel)
+                self._connect_with_password(self.side_ssh_client, ip, port, username, side_password,
+                                            sock=self.side_channel, profile=profile)
                 logger.info(f"✓ 使用SSH隧道成功连接到{side}面")
 
             except paramiko.AuthenticationException:
                 # 如果默认密码失败，请求用户输入密码
                 logger.warning(f"默认密码连接{side}面失败，请求用户输入密码")
                 try:
-                    user_password = simpledialog.askstring(
-                        "密码输入",
-                        f"默认密码连接{side}面失败\n请输入 {side}面 ({username}@{ip}) 的密码:",
-                        show='*'
+                    user_password = self._ask_password(
+                        f"默认密码连接{side}面失败\n请输入 {side}面 ({username}@{ip}) 的密码:"
                     )
                     if not user_password:
-                        return False, "用户取消输入密码"
+                        return False, self._password_cancelled_message()
 
                     # 使用用户输入的密码重新连接
-                    self._connect_with_password(self.side_ssh_client, ip, port, username, user_password, sock=self.side_channel)
+                    self._connect_with_password(self.side_ssh_client, ip, port, username, user_password,
+                                                sock=self.side_channel, profile=profile)
                     logger.info(f"✓ 使用用户输入密码成功连接到{side}面")
 
                 except Exception as user_connect_error:
@@ -390,12 +607,15 @@ class SSHManager:
     def execute_side_command_persistent(self, command):
         """在持久连接的A/B面上执行命令"""
         try:
-            if not self.side_connected or not self.side_ssh_client:
+            client = self.side_ssh_client
+            if not self._snapshot.side_connected or not client:
                 return False, "A/B面持久连接未建立"
 
-            stdin, stdout, stderr = self.side_ssh_client.exec_command(command)
-            output = stdout.read().decode('utf-8')
-            error = stderr.read().decode('utf-8')
+            # 同一传输上可并发多个命令通道，数量受会话通道上限约束
+            with self._channel_slot():
+                stdin, stdout, stderr = client.exec_command(command)
+                output = stdout.read().decode('utf-8')
+                error = stderr.read().decode('utf-8')
 
             if error and "Permission denied" not in error:
                 logger.warning(f"A/B面命令执行有错误输出: {error}")
@@ -409,108 +629,247 @@ class SSHManager:
             logger.error(error_msg)
             return False, error_msg
 
-    def read_params_file_persistent(self):
-        """使用持久连接读取文件"""
+    def execute_side_command_with_input(self, command, data):
+        """
+        在A/B面上执行命令并将 data(bytes) 写入其stdin，用于单次调用传输批量内容
+        以退出码判断成功与否，返回 (success, 输出或错误信息)
+        """
         try:
-            logger.info("开始读取文件...")
-
-            # 挂载文件系统
-            mount_command = "mount -o rw,remount /opt/usr/app/1/gea"
-            logger.info(f"执行挂载命令: {mount_command}")
-            mount_success, mount_result = self.execute_side_command_persistent(mount_command)
+            client = self.side_ssh_client
+            if not self._snapshot.side_connected or not client:
+                return False, "A/B面持久连接未建立"
 
-            if mount_success:
-                logger.info("文件系统挂载成功")
-            else:
-                logger.warning(f"文件系统挂载失败: {mount_result}")
+            with self._channel_slot():
+                stdin, stdout, stderr = client.exec_command(command)
+                if data:
+                    stdin.write(data)
+                stdin.channel.shutdown_write()
+                output = stdout.read().decode('utf-8')
+                error = stderr.read().decode('utf-8')
+                exit_status = stdout.channel.recv_exit_status()
 
-            # 读取文件内容
-            file_path = get_full_file_path(self.current_working_directory)
-            read_command = f"cat {file_path}"
-            logger.info(f"执行命令: {read_command}")
-            read_success, read_result = self.execute_side_command_persistent(read_command)
+            if exit_status != 0:
+                logger.warning(f"A/B面命令退出码 {exit_status}: {error or output}")
+                return False, (output + error).strip()
 
-            if read_success:
-                # 清理SSH警告信息
-                cleaned_content = self._clean_ssh_warnings(read_result)
-                logger.info(f"成功读取文件，内容长度: {len(cleaned_content)}")
-                return True, cleaned_content
-            else:
-                error_msg = f"读取文件失败: {read_result}"
-                logger.error(error_msg)
-                return False, error_msg
+            logger.info("A/B面带输入命令执行成功")
+            return True, output
 
         except Exception as e:
-            error_msg = f"读取文件失败: {str(e)}"
+            error_msg = f"A/B面命令执行错误: {str(e)}"
             logger.error(error_msg)
             return False, error_msg
 
-    def _clean_ssh_warnings(self, content):
-        """清理SSH警告信息 - 精确识别JSON边界"""
+    @contextlib.contextmanager
+    def side_command_stream(self, command):
+        """
+        打开A/B面命令通道用于流式读写，产出 (stdin, stdout, stderr)
+        通道占用期间计入并发通道上限，退出时关闭通道
+        """
+        client = self.side_ssh_client
+        if not self._snapshot.side_connected or not client:
+            raise IOError("A/B面持久连接未建立")
+
+        with self._channel_slot():
+            stdin, stdout, stderr = client.exec_command(command)
+            try:
+                yield stdin, stdout, stderr
+            finally:
+                stdout.channel.close()
+
+    def read_remote_bytes(self, remote_path):
+        """
+        分帧读取远端文件原始内容：输出包裹在随机BEGIN/END标记和长度头之间，
+        按长度直接切片，不受登录横幅、警告输出影响，返回 (success, bytes 或 错误信息)
+        """
         try:
-            if not content:
-                return content
+            frame_id = output_framing.new_frame_id()
+            command = output_framing.build_framed_cat(remote_path, frame_id)
+            logger.info(f"分帧读取: {remote_path}")
+            with self.side_command_stream(command) as (_, stdout, stderr):
+                output = stdout.read()
+                error = stderr.read().decode('utf-8', errors='replace')
+                exit_status = stdout.channel.recv_exit_status()
+
+            if exit_status != 0:
+                return False, f"读取远端文件失败(退出码 {exit_status}): {error.strip()}"
+            return True, output_framing.extract_frame(output, frame_id)
 
-            logger.info(f"原始内容长度: {len(content)}")
+        except Exception as e:
+            error_msg = f"读取远端文件失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
 
-            # 方法1: 直接定位JSON对象
-            json_start = content.find('{')
-            json_end = content.rfind('}')
+    @_write_serialized
+    def write_from_stream(self, remote_path, chunks, expected_sha256):
+        """
+        将数据块流式写入远端文件：边接收边写入同目录暂存文件，
+        校验sha256与期望值一致后原子替换并sync；chunks 为 bytes 可迭代对象
+        """
+        try:
+            mount_command = MOUNT_CONFIG.get('mount_command', "mount -o remount,rw /opt/usr/app/1/gea")
+            staged_file = conf_transaction.staged_path(remote_path, conf_transaction.new_transaction_id())
+            script = (
+                f"{mount_command} || exit 1\n"
+                f"cat > '{staged_file}' || {{ rm -f '{staged_file}'; exit 2; }}\n"
+                f"[ \"$(sha256sum '{staged_file}' | cut -d' ' -f1)\" = '{expected_sha256}' ] || "
+                f"{{ rm -f '{staged_file}'; echo '{conf_transaction.TX_VERIFY_FAILED}'; exit 3; }}\n"
+                f"chmod 644 '{staged_file}' && mv -f '{staged_file}' '{remote_path}' && sync || "
+                f"{{ rm -f '{staged_file}'; exit 4; }}\n"
+                f"echo '{conf_transaction.TX_COMMITTED}'"
+            )
 
-            if json_start != -1 and json_end != -1 and json_end > json_start:
-                # 提取完整的JSON对象
-                json_content = content[json_start:json_end + 1]
+            with self.side_command_stream(script) as (stdin, stdout, stderr):
+                total = 0
+                for chunk in chunks:
+                    stdin.write(chunk)
+                    total += len(chunk)
+                stdin.channel.shutdown_write()
+                output = stdout.read().decode('utf-8')
+                error = stderr.read().decode('utf-8')
+                exit_status = stdout.channel.recv_exit_status()
+
+            if exit_status == 0 and conf_transaction.TX_COMMITTED in output:
+                self._remember_remote_hash(remote_path, expected_sha256)
+                if SNAPSHOT_CONFIG.get('enabled', True):
+                    # 内容未在本地缓存，只在快照库已有该数据块时记录版本
+                    snapshot = self._snapshot
+                    get_snapshot_store().record_digest(snapshot.car_name, snapshot.side, remote_path,
+                                                       expected_sha256, total, 'write')
+                logger.info(f"✓ 流式写入完成: {remote_path} ({total} 字节)")
+                return True, f"已写入 {remote_path} ({total} 字节)"
+            if conf_transaction.TX_VERIFY_FAILED in output:
+                error_msg = f"目标端校验失败，未修改文件: {remote_path}"
+            else:
+                error_msg = f"流式写入失败(退出码 {exit_status}): {(output + error).strip()}"
+            logger.error(error_msg)
+            return False, error_msg
 
-                # 验证JSON格式
-                try:
-                    parsed_json = json.loads(json_content)
-                    logger.info("成功提取并验证JSON内容")
-                    return json_content
-                except json.JSONDecodeError as e:
-                    logger.warning(f"JSON验证失败: {e}")
-
-            # 方法2: 按行处理，精确识别SSH警告
-            lines = content.split('\n')
-            cleaned_lines = []
-
-            # 精确的SSH警告模式
-            ssh_warnings = [
-                "Warning: Permanently added",
-                "Authorized users only. All activities may be monitored and recorded.",
-                "Last login:",
-                "Welcome to"
-            ]
-
-            for line in lines:
-                line_stripped = line.strip()
-                is_ssh_warning = False
-
-                # 精确匹配SSH警告
-                for warning in ssh_warnings:
-                    if warning in line_stripped:
-                        is_ssh_warning = True
-                        break
-
-                if not is_ssh_warning:
-                    cleaned_lines.append(line)
-
-            cleaned_content = '\n'.join(cleaned_lines).strip()
-
-            # 最终验证
-            if cleaned_content and cleaned_content.endswith('}'):
-                try:
-                    json.loads(cleaned_content)
-                    logger.info("最终清理成功")
-                    return cleaned_content
-                except json.JSONDecodeError:
-                    pass
+        except Exception as e:
+            error_msg = f"流式写入失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
 
-            logger.warning("所有清理方法都失败，返回原始内容")
-            return content
+    def execute_side_commands_parallel(self, commands, max_workers=None):
+        """在同一A/B面会话上并发执行多条命令（每条一个通道），按输入顺序返回 [(success, output)]"""
+        try:
+            if not commands:
+                return []
+            workers = max_workers or SSH_CONFIG.get('max_concurrent_channels', 4)
+            with ThreadPoolExecutor(max_workers=min(workers, len(commands))) as pool:
+                return list(pool.map(self.execute_side_command_persistent, commands))
+        except Exception as e:
+            error_msg = f"A/B面并发命令执行错误: {str(e)}"
+            logger.error(error_msg)
+            return [(False, error_msg)] * len(commands)
+
+    # ========= 本地快照 =========
+    def _record_snapshot(self, file_path, content, action):
+        """将读/写的内容（str / bytes / ConfDocument）记录到本地快照库"""
+        if not SNAPSHOT_CONFIG.get('enabled', True):
+            return None
+        snapshot = self._snapshot
+        document = ConfDocument.coerce(content, file_path)
+        return get_snapshot_store().record(snapshot.car_name, snapshot.side, file_path,
+                                           document.data, action, digest=document.sha256)
+
+    def list_file_history(self, primary_path):
+        """列出文件在本地快照库中的历史版本（最新在前），无需连接"""
+        snapshot = self._snapshot
+        file_path = self._resolved_paths.get(primary_path, primary_path)
+        return get_snapshot_store().list_versions(snapshot.car_name, snapshot.side, file_path)
+
+    def get_file_history_version(self, primary_path, digest=None):
+        """读取历史版本内容（默认最新），返回文本或None"""
+        snapshot = self._snapshot
+        file_path = self._resolved_paths.get(primary_path, primary_path)
+        data = get_snapshot_store().get_version(snapshot.car_name, snapshot.side, file_path, digest)
+        return data.decode('utf-8') if data is not None else None
+
+    # ========= 远端内容哈希 =========
+    def _remote_hash_key(self, file_path):
+        snapshot = self._snapshot
+        return snapshot.car_name, snapshot.side, file_path
+
+    def _remember_remote_hash(self, file_path, digest):
+        """记录远端文件最近一次已知的sha256（读取时取远端计算值，写入成功后取写入内容）"""
+        self._remote_hashes[self._remote_hash_key(file_path)] = digest
+
+    def remember_written_content(self, file_path, content):
+        """本面文件由其他会话写入成功后（如A/B两面写入），更新本会话记录的远端sha256"""
+        self._remember_remote_hash(file_path, ConfDocument.coerce(content, file_path).sha256)
+
+    def get_known_remote_hash(self, file_path):
+        """远端文件最近一次已知的sha256，未读写过返回None"""
+        return self._remote_hashes.get(self._remote_hash_key(file_path))
+
+    def _read_remote_file(self, file_path):
+        """读取远端文件：大文件走分块续传，小文件分帧cat，返回 (success, ConfDocument 或 错误信息)"""
+        size, digest = self.transfer_manager.stat_remote_file(file_path)
+        if size is None:
+            return False, f"{FILE_NOT_FOUND}: {file_path}"
+        # stat 已返回远端sha256，作为后续条件写入的基准，无需额外下载
+        self._remember_remote_hash(file_path, digest)
+
+        if size > TRANSFER_CONFIG.get('resumable_threshold', 256 * 1024):
+            logger.info(f"文件较大({size} 字节)，使用分块续传读取")
+            success, data = self.transfer_manager.download(file_path, size, digest)
+            if not success:
+                return False, data
+            document = ConfDocument(data, file_path, sha256=digest)
+        else:
+            read_success, data = self.read_remote_bytes(file_path)
+            if not read_success:
+                return False, data
+            document = ConfDocument(data, file_path)
+            if document.sha256 != digest:
+                return False, f"读取内容校验失败（文件可能在读取期间被修改），请重试: {file_path}"
+        self._record_snapshot(file_path, document, 'read')
+        return True, document
+
+    def stat_conf_file(self, kind):
+        """一次远端调用获取标定文件的 (路径, 大小, sha256)，不下载内容；kind 为 'params' 或 'adas'"""
+        try:
+            file_path = self.resolve_conf_path(kind)
+            size, digest = self.transfer_manager.stat_remote_file(file_path)
+            if size is None:
+                # 与读取一致：缓存路径上没有文件时重新扫描一次
+                primary_path = (get_full_adas_file_path if kind == 'adas' else get_full_file_path)(
+                    self._snapshot.working_directory)
+                rescanned_path = self._resolve_with_fallback(primary_path, rescan=True)
+                if rescanned_path != file_path:
+                    file_path = rescanned_path
+                    size, digest = self.transfer_manager.stat_remote_file(file_path)
+            if size is None:
+                return False, f"{FILE_NOT_FOUND}: {file_path}"
+            self._remember_remote_hash(file_path, digest)
+            return True, (file_path, size, digest)
+        except Exception as e:
+            error_msg = f"查询标定文件失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
 
+    def read_conf_file_expecting(self, file_path, expected_sha256):
+        """读取标定文件并确认内容仍是 expected_sha256（查询后被修改则失败），返回 (success, ConfDocument 或 错误信息)"""
+        try:
+            success, result = self._read_remote_file(file_path)
+            if success and result.sha256 != expected_sha256:
+                return False, f"文件在查询后被修改: {file_path}"
+            return success, result
         except Exception as e:
-            logger.error(f"清理SSH警告失败: {e}")
-            return content
+            error_msg = f"读取文件失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def adopt_conf_document(self, file_path, document):
+        """
+        远端文件与已取得的内容sha256相同（由其他车辆下载或本地快照已有）时，
+        作为本车的读取结果记录快照和已知哈希，返回本车路径的 ConfDocument
+        """
+        adopted = ConfDocument(document.data, file_path, sha256=document.sha256)
+        self._remember_remote_hash(file_path, adopted.sha256)
+        self._record_snapshot(file_path, adopted, 'read')
+        return adopted
 
     def check_file_exists(self):
         """检查params.json文件是否存在 - 修复路径问题"""
@@ -518,7 +877,7 @@ class SSHManager:
             logger.info("检查文件是否存在...")
 
             # 使用单个命令来检查文件
-            primary_path = get_full_file_path(self.current_working_directory)
+            primary_path = get_full_file_path(self._snapshot.working_directory)
             file_path = self._resolve_with_fallback(primary_path)
             logger.info(f"检查文件路径: {file_path}")
 
@@ -539,7 +898,7 @@ class SSHManager:
             return False, error_msg
 
     def read_params_file_persistent(self):
-        """使用持久连接读取文件 - 修复路径问题"""
+        """使用持久连接读取文件 - 修复路径问题，返回 (success, ConfDocument 或 错误信息)"""
         try:
             logger.info("开始读取文件...")
 
@@ -554,19 +913,12 @@ class SSHManager:
                 logger.warning(f"文件系统挂载失败: {mount_result}")
 
             # 读取文件内容
-            primary_path = get_full_file_path(self.current_working_directory)
-            file_path = self._resolve_with_fallback(primary_path)
-            logger.info(f"读取文件路径: {file_path}")
-
-            read_command = f"cat '{file_path}'"  # 添加引号处理路径
-            logger.info(f"执行命令: {read_command}")
-            read_success, read_result = self.execute_side_command_persistent(read_command)
+            primary_path = get_full_file_path(self._snapshot.working_directory)
+            read_success, read_result = self._read_conf_file(primary_path)
 
             if read_success:
-                # 清理SSH警告信息
-                cleaned_content = self._clean_ssh_warnings(read_result)
-                logger.info(f"成功读取文件，内容长度: {len(cleaned_content)}")
-                return True, cleaned_content
+                logger.info(f"成功读取文件，内容长度: {read_result.size} 字节")
+                return True, read_result
             else:
                 error_msg = f"读取文件失败: {read_result}"
                 logger.error(error_msg)
@@ -578,7 +930,7 @@ class SSHManager:
             return False, error_msg
 
     def read_adas_file_persistent(self):
-        """读取 adas_params.json"""
+        """读取 adas_params.json，返回 (success, ConfDocument 或 错误信息)"""
         try:
             logger.info("开始读取ADAS文件...")
 
@@ -586,16 +938,12 @@ class SSHManager:
             logger.info(f"执行挂载命令: {mount_command}")
             self.execute_side_command_persistent(mount_command)
 
-            primary_path = get_full_adas_file_path(self.current_working_directory)
-            file_path = self._resolve_with_fallback(primary_path)
-            logger.info(f"读取文件路径: {file_path}")
-            read_command = f"cat '{file_path}'"
-            read_success, read_result = self.execute_side_command_persistent(read_command)
+            primary_path = get_full_adas_file_path(self._snapshot.working_directory)
+            read_success, read_result = self._read_conf_file(primary_path)
 
             if read_success:
-                cleaned_content = self._clean_ssh_warnings(read_result)
-                logger.info(f"成功读取ADAS文件，内容长度: {len(cleaned_content)}")
-                return True, cleaned_content
+                logger.info(f"成功读取ADAS文件，内容长度: {read_result.size} 字节")
+                return True, read_result
             else:
                 error_msg = f"读取ADAS文件失败: {read_result}"
                 logger.error(error_msg)
@@ -606,143 +954,355 @@ class SSHManager:
             logger.error(error_msg)
             return False, error_msg
 
-    def write_params_file_persistent(self, content):
-        """使用持久连接写入文件 - 修复路径问题"""
+    def _write_if_changed(self, file_path, document, force=False, expected_sha256=None):
+        """
+        按内容哈希条件写入：
+        - 新内容与已知远端sha256相同则跳过（不挂载、不上传、不sync）
+        - 否则以已知远端sha256为前提写入，远端已被他人修改时拒绝覆盖（force=True 时无条件覆盖）
+        expected_sha256 不为空时以其作为远端基准（如离线队列记录的版本）
+        返回 (success, message)
+        """
+        digest = document.sha256
+        known_hash = expected_sha256 or self.get_known_remote_hash(file_path)
+        if known_hash == digest and not force:
+            logger.info(f"内容与远端一致，跳过写入: {file_path}")
+            return True, NO_CHANGE_MESSAGE
+
+        mount_command = MOUNT_CONFIG.get('mount_command', "mount -o remount,rw /opt/usr/app/1/gea")
+        logger.info(f"执行挂载命令: {mount_command}")
+        mount_success, mount_result = self.execute_side_command_persistent(mount_command)
+        if not mount_success:
+            return False, f"文件系统挂载失败: {mount_result}"
+
+        # 分块续传写入：中断后再次保存会从最后确认的块继续，校验整文件后原子替换
+        expected_hash = None if force else known_hash
+        write_success, write_result = self.transfer_manager.upload(document.data, file_path,
+                                                                   expected_sha256=expected_hash, digest=digest)
+        if not write_success:
+            return False, write_result
+
+        self._remember_remote_hash(file_path, digest)
+        self._record_snapshot(file_path, document, 'write')
+        return True, "文件保存成功"
+
+    @_write_serialized
+    def write_params_file_persistent(self, content, force=False):
+        """使用持久连接写入文件 - 修复路径问题（content 可为 str 或 ConfDocument）"""
         try:
             logger.info("开始保存文件...")
-            logger.info(f"内容长度: {len(content)} 字符")
+            document = ConfDocument.coerce(content)
+            logger.info(f"内容长度: {document.size} 字节")
 
-            # 验证JSON格式
-            try:
-                json.loads(content)
-                logger.info("JSON格式验证通过")
-            except json.JSONDecodeError as e:
-                error_msg = f"JSON格式错误: {str(e)}"
+            # 验证JSON格式（同一文档只解析一次）
+            parse_error = document.validate()
+            if parse_error:
+                error_msg = f"JSON格式错误: {parse_error}"
                 logger.error(error_msg)
                 return False, error_msg
+            logger.info("JSON格式验证通过")
 
-            primary_path = get_full_file_path(self.current_working_directory)
-            file_path = self._resolve_with_fallback(primary_path)
-            logger.info(f"目标文件路径: {file_path}")
+            primary_path = get_full_file_path(self._snapshot.working_directory)
+            write_success, write_result = self._write_conf_file(primary_path, document, force)
 
-            # 挂载文件系统
-            mount_command = MOUNT_CONFIG.get('mount_command', "mount -o remount,rw /opt/usr/app/1/gea")
-            logger.info(f"执行挂载命令: {mount_command}")
-            mount_success, mount_result = self.execute_side_command_persistent(mount_command)
-
-            if not mount_success:
-                error_msg = f"文件系统挂载失败: {mount_result}"
+            if write_success:
+                logger.info(f"✓ {write_result}")
+                return True, write_result
+            else:
+                error_msg = f"文件写入失败: {write_result}"
                 logger.error(error_msg)
                 return False, error_msg
 
-            # 使用base64写入
-            temp_file = f"/tmp/params_temp_{int(time.time())}.json"
-            import base64
-            encoded_content = base64.b64encode(content.encode('utf-8')).decode('ascii')
+        except Exception as e:
+            error_msg = f"写入文件失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    @_write_serialized
+    def write_adas_file_persistent(self, content, force=False):
+        """写入 adas_params.json（content 可为 str 或 ConfDocument）"""
+        try:
+            logger.info("开始保存ADAS文件...")
+            document = ConfDocument.coerce(content)
+            logger.info(f"内容长度: {document.size} 字节")
+
+            parse_error = document.validate()
+            if parse_error:
+                error_msg = f"ADAS JSON格式错误: {parse_error}"
+                logger.error(error_msg)
+                return False, error_msg
+            logger.info("ADAS JSON格式验证通过")
 
-            write_command = f"echo '{encoded_content}' | base64 -d > '{temp_file}' && chmod 644 '{temp_file}' && mv '{temp_file}' '{file_path}' && sync"
-            logger.info(f"执行写入命令")
-            write_success, write_result = self.execute_side_command_persistent(write_command)
+            primary_path = get_full_adas_file_path(self._snapshot.working_directory)
+            write_success, write_result = self._write_conf_file(primary_path, document, force)
 
             if write_success:
-                # 验证写入结果
-                verify_command = f"cat '{file_path}' | wc -c"
-                verify_success, verify_result = self.execute_side_command_persistent(verify_command)
-
-                if verify_success:
-                    try:
-                        file_size = int(verify_result.strip())
-                        if file_size == len(content):
-                            logger.info("✓ 文件写入验证成功")
-                            return True, "文件保存成功"
-                        else:
-                            logger.warning(f"文件大小不匹配: 期望{len(content)}，实际{file_size}")
-                    except:
-                        pass
-
-                return True, "文件保存成功"
+                logger.info(f"✓ ADAS{write_result}")
+                return True, write_result
             else:
                 error_msg = f"文件写入失败: {write_result}"
                 logger.error(error_msg)
                 return False, error_msg
 
         except Exception as e:
-            error_msg = f"写入文件失败: {str(e)}"
+            error_msg = f"写入ADAS文件失败: {str(e)}"
             logger.error(error_msg)
             return False, error_msg
 
-    def write_adas_file_persistent(self, content):
-        """写入 adas_params.json"""
+    @_write_serialized
+    def flush_offline_journal(self):
+        """
+        重连后按保存顺序写回当前车辆/面的离线队列：
+        - 以离线保存时基于的sha256做条件写入，远端已被修改则记为冲突，离线内容作为历史版本保留
+        - 同一文件出现冲突后，其后续离线保存一并记为冲突
+        - 连接类错误时停止并保留剩余记录，下次重连继续
+        返回 (success, [结果说明])
+        """
+        snapshot = self._snapshot
+        journal = get_write_journal()
+        pending = journal.pending(snapshot.car_name, snapshot.side)
+        results = []
+        conflicted_paths = set()
         try:
-            logger.info("开始保存ADAS文件...")
-            logger.info(f"内容长度: {len(content)} 字符")
+            store = get_snapshot_store()
+            for entry in pending:
+                path = entry['path']
+                if path in conflicted_paths:
+                    journal.mark(entry['id'], JOURNAL_CONFLICT, "同一文件之前的离线修改存在冲突")
+                    results.append(f"冲突(跳过): {path}")
+                    continue
+
+                data = store.get_blob(entry['sha256'])
+                if data is None:
+                    journal.mark(entry['id'], JOURNAL_CONFLICT, "离线内容数据丢失")
+                    results.append(f"数据丢失: {path}")
+                    continue
+
+                document = ConfDocument(data, path, sha256=entry['sha256'])
+                force = entry['base_sha256'] is None
+                success, message = self._write_if_changed(path, document, force=force,
+                                                          expected_sha256=entry['base_sha256'])
+                if success:
+                    journal.mark(entry['id'], JOURNAL_FLUSHED)
+                    results.append(f"已写回: {path}")
+                elif CONFLICT_MESSAGE in message:
+                    journal.mark(entry['id'], JOURNAL_CONFLICT, message)
+                    conflicted_paths.add(path)
+                    self._record_snapshot(path, document, 'conflict')
+                    results.append(f"冲突(远端已被修改，离线内容已保留在历史版本): {path}")
+                else:
+                    results.append(f"写回中断(保留在队列，重连后重试): {path}: {message}")
+                    return False, results
 
-            try:
-                json.loads(content)
-                logger.info("ADAS JSON格式验证通过")
-            except json.JSONDecodeError as e:
-                error_msg = f"ADAS JSON格式错误: {str(e)}"
+            if results:
+                logger.info(f"离线队列写回完成: {results}")
+            return not conflicted_paths, results
+
+        except Exception as e:
+            error_msg = f"离线队列写回失败: {str(e)}"
+            logger.error(error_msg)
+            return False, results + [error_msg]
+
+    def has_offline_writes(self):
+        """当前车辆/面是否有未写回的离线保存"""
+        snapshot = self._snapshot
+        return bool(get_write_journal().pending(snapshot.car_name, snapshot.side))
+
+    def _validate_conf_files(self, files):
+        """校验待提交的JSON文件格式（解析结果随文档缓存），返回错误信息或None"""
+        for remote_path, content in files.items():
+            if remote_path.endswith('.json'):
+                parse_error = ConfDocument.coerce(content, remote_path).validate()
+                if parse_error:
+                    return f"JSON格式错误({remote_path}): {parse_error}"
+        return None
+
+    @staticmethod
+    def _describe_transaction_failure(result):
+        if conf_transaction.TX_VERIFY_FAILED in result:
+            return f"暂存文件校验失败，未修改任何文件: {result}"
+        if conf_transaction.TX_ROLLED_BACK in result:
+            return f"替换过程失败，已回滚: {result}"
+        return f"事务提交失败: {result}"
+
+    @_write_serialized
+    def commit_conf_files(self, files):
+        """
+        事务式提交多个配置文件（一次远端调用）：
+        挂载 -> 打包上传到临时目录 -> 逐个校验sha256 -> 同目录原子替换 -> 一次sync
+        任一步骤失败则回滚，保证文件组要么全部更新、要么全部保持原样
+        files: {远端路径: 内容}
+        """
+        try:
+            if not files:
+                return False, "没有需要提交的文件"
+
+            files = {path: ConfDocument.coerce(content, path) for path, content in files.items()}
+            error_msg = self._validate_conf_files(files)
+            if error_msg:
                 logger.error(error_msg)
                 return False, error_msg
 
-            primary_path = get_full_adas_file_path(self.current_working_directory)
-            file_path = self._resolve_with_fallback(primary_path)
-            logger.info(f"目标文件路径: {file_path}")
-
+            tx_id = conf_transaction.new_transaction_id()
+            bundle, entries = conf_transaction.build_bundle(files)
             mount_command = MOUNT_CONFIG.get('mount_command', "mount -o remount,rw /opt/usr/app/1/gea")
-            logger.info(f"执行挂载命令: {mount_command}")
-            mount_success, mount_result = self.execute_side_command_persistent(mount_command)
+            script = conf_transaction.build_commit_script(tx_id, entries, mount_command)
+            logger.info(f"开始事务提交 {tx_id}: {[path for _, path, _ in entries]}")
+
+            success, result = self.execute_side_command_with_input(script, bundle)
+
+            if success and conf_transaction.TX_COMMITTED in result:
+                for _, remote_path, digest in entries:
+                    self._remember_remote_hash(remote_path, digest)
+                for remote_path, content in files.items():
+                    self._record_snapshot(remote_path, content, 'write')
+                logger.info(f"✓ 事务提交成功: {tx_id}")
+                return True, f"已提交 {len(entries)} 个文件"
+            error_msg = self._describe_transaction_failure(result)
+            logger.error(error_msg)
+            return False, error_msg
+
+        except Exception as e:
+            error_msg = f"事务提交失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    @_write_serialized
+    def stage_conf_files(self, files, expected_sha256=None):
+        """
+        两阶段提交·阶段一：挂载并暂存、校验全部文件，不替换目标
+        expected_sha256: {远端路径: 期望sha256}，远端当前内容不一致（已被他人修改）时拒绝暂存
+        返回 (success, 事务ID 或 错误信息)；成功后需调用 apply_staged_conf_files 或 discard_staged_conf_files
+        """
+        try:
+            if not files:
+                return False, "没有需要提交的文件"
 
-            if not mount_success:
-                error_msg = f"文件系统挂载失败: {mount_result}"
+            files = {path: ConfDocument.coerce(content, path) for path, content in files.items()}
+            error_msg = self._validate_conf_files(files)
+            if error_msg:
                 logger.error(error_msg)
                 return False, error_msg
 
-            temp_file = f"/tmp/adas_params_temp_{int(time.time())}.json"
-            import base64
-            encoded_content = base64.b64encode(content.encode('utf-8')).decode('ascii')
+            tx_id = conf_transaction.new_transaction_id()
+            bundle, entries = conf_transaction.build_bundle(files)
+            mount_command = MOUNT_CONFIG.get('mount_command', "mount -o remount,rw /opt/usr/app/1/gea")
+            script = f"{mount_command} || exit 1\n"
+            if expected_sha256:
+                script += conf_transaction.build_precondition_script(expected_sha256) + "\n"
+            script += conf_transaction.build_stage_script(tx_id, entries)
 
-            write_command = (
-                f"echo '{encoded_content}' | base64 -d > '{temp_file}' && "
-                f"chmod 644 '{temp_file}' && mv '{temp_file}' '{file_path}' && sync"
-            )
-            logger.info("执行写入命令")
-            write_success, write_result = self.execute_side_command_persistent(write_command)
+            success, result = self.execute_side_command_with_input(script, bundle)
 
-            if write_success:
-                verify_command = f"cat '{file_path}' | wc -c"
-                verify_success, verify_result = self.execute_side_command_persistent(verify_command)
-                if verify_success:
-                    try:
-                        file_size = int(verify_result.strip())
-                        if file_size == len(content):
-                            logger.info("✓ ADAS文件写入验证成功")
-                            return True, "文件保存成功"
-                        else:
-                            logger.warning(f"ADAS文件大小不匹配: 期望{len(content)}，实际{file_size}")
-                    except:
-                        pass
-                return True, "文件保存成功"
-            else:
-                error_msg = f"文件写入失败: {write_result}"
-                logger.error(error_msg)
+            if CAS_CONFLICT in result:
+                error_msg = f"{CONFLICT_MESSAGE}: {result.replace(CAS_CONFLICT, '').strip()}"
+                logger.warning(f"暂存前提不满足: {error_msg}")
                 return False, error_msg
+            if success and conf_transaction.TX_STAGED in result:
+                self._staged_transactions[tx_id] = (entries, files)
+                logger.info(f"✓ 暂存校验通过: {tx_id}")
+                return True, tx_id
+            error_msg = self._describe_transaction_failure(result)
+            logger.error(error_msg)
+            return False, error_msg
 
         except Exception as e:
-            error_msg = f"写入ADAS文件失败: {str(e)}"
+            error_msg = f"暂存文件失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    @_write_serialized
+    def apply_staged_conf_files(self, tx_id):
+        """两阶段提交·阶段二：将已暂存的文件原子替换到位并sync（失败回滚）"""
+        try:
+            staged = self._staged_transactions.pop(tx_id, None)
+            if not staged:
+                return False, f"未找到已暂存的事务: {tx_id}"
+            entries, files = staged
+
+            script = conf_transaction.build_swap_script(tx_id, entries)
+            success, result = self.execute_side_command_with_input(script, None)
+
+            if success and conf_transaction.TX_COMMITTED in result:
+                for _, remote_path, digest in entries:
+                    self._remember_remote_hash(remote_path, digest)
+                for remote_path, content in files.items():
+                    self._record_snapshot(remote_path, content, 'write')
+                logger.info(f"✓ 暂存事务已生效: {tx_id}")
+                return True, f"已提交 {len(entries)} 个文件"
+            error_msg = self._describe_transaction_failure(result)
+            logger.error(error_msg)
+            return False, error_msg
+
+        except Exception as e:
+            error_msg = f"替换暂存文件失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def discard_staged_conf_files(self, tx_id):
+        """放弃已暂存的事务，目标文件保持不变"""
+        try:
+            staged = self._staged_transactions.pop(tx_id, None)
+            if not staged:
+                return True, "无需清理"
+            entries, _ = staged
+            script = conf_transaction.build_abort_script(tx_id, entries)
+            return self.execute_side_command_with_input(script, None)
+        except Exception as e:
+            error_msg = f"清理暂存文件失败: {str(e)}"
             logger.error(error_msg)
             return False, error_msg
 
+    def download_conf_dirs(self, local_dir, compress=True):
+        """tar流式下载全部标定目录到本地目录，返回 (success, [message])"""
+        return BulkTransfer(self, compress=compress).download_all(local_dir)
+
+    @_write_serialized
+    def upload_conf_dirs(self, local_dir, compress=True):
+        """将本地目录（planning_exec/control_exec子目录）tar流式推送并原子换入，返回 (success, [message])"""
+        return BulkTransfer(self, compress=compress).upload_all(local_dir)
+
+    def get_conf_manifest(self):
+        """一次远端调用获取全部标定文件的 (大小, 修改时间, sha256) 清单，返回 (success, 清单 或 错误信息)"""
+        return ConfSync(self).fetch_manifest()
+
+    def sync_conf_dirs(self, local_dir):
+        """按清单增量同步标定目录到本地（只下载有变化的文件），返回 (success, 摘要)"""
+        return ConfSync(self).sync(local_dir)
+
+    def search_conf_dirs(self, pattern, ignore_case=True):
+        """在车机上grep全部标定目录，逐条产出 (文件路径, 行号, 匹配片段)"""
+        return RemoteSearch(self).search(pattern, ignore_case=ignore_case)
+
+    def resolve_conf_path(self, kind):
+        """解析标定文件远端路径：kind 为 'params' 或 'adas'"""
+        working_directory = self._snapshot.working_directory
+        if kind == 'adas':
+            primary_path = get_full_adas_file_path(working_directory)
+        else:
+            primary_path = get_full_file_path(working_directory)
+        return self._resolve_with_fallback(primary_path)
+
+    def commit_calibration_files(self, params_content=None, adas_content=None):
+        """一起提交 params.json / adas_params.json（只传入需要更新的文件）"""
+        files = {}
+        if params_content is not None:
+            files[self.resolve_conf_path('params')] = params_content
+        if adas_content is not None:
+            files[self.resolve_conf_path('adas')] = adas_content
+        return self.commit_conf_files(files)
+
     def execute_command(self, command):
         """执行SSH命令"""
         try:
             # 真实命令执行
-            if not self.connected:
+            client = self.ssh_client
+            if not self._snapshot.connected or not client:
                 return False, "未连接到SSH服务器"
 
-            stdin, stdout, stderr = self.ssh_client.exec_command(command)
-            output = stdout.read().decode('utf-8')
-            error = stderr.read().decode('utf-8')
+            with self._channel_slot():
+                stdin, stdout, stderr = client.exec_command(command)
+                output = stdout.read().decode('utf-8')
+                error = stderr.read().decode('utf-8')
 
             if error and "Permission denied" not in error:
                 logger.warning(f"命令执行有错误输出: {error}")
@@ -793,6 +1353,7 @@ class SSHManager:
             logger.error(f"调试连接状态失败: {e}")
             return False
 
+    @_locked
     def disconnect(self):
         """断开SSH连接"""
         try:
@@ -817,24 +1378,24 @@ class SSHManager:
 
     def is_connected(self):
         """检查是否已连接到车辆"""
-        return self.connected
+        return self._snapshot.connected
 
     def is_side_connected(self):
         """检查是否已连接到A/B面"""
-        return self.side_connected
+        return self._snapshot.side_connected
 
     def is_direct_mode(self):
         """是否处于车机直连模式"""
-        return self.direct_mode
+        return self._snapshot.direct_mode
 
     def get_current_car_name(self):
         """获取当前连接的车型名称"""
-        return self.current_car_name
+        return self._snapshot.car_name
 
     def get_current_side(self):
         """获取当前连接的面"""
-        return self.current_side
+        return self._snapshot.side
 
     def get_current_working_directory(self):
         """获取当前工作目录"""
-        return self.current_working_directory
\ No newline at end of file
+        return self._snapshot.working_directory
@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import threading
+import time
+from data_path import SSH_CONFIG, ADAPTIVE_TIMEOUT_CONFIG, get_cache_dir
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values, ratio):
+    """简单分位数（最近秩法）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(ratio * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _clamp(value, floor, ceiling):
+    return max(floor, min(ceiling, value))
+
+
+class ConnectionTimeoutTuner:
+    """
+    按主机的自适应连接超时：
+    - 记录每台主机的握手耗时、RTT以及连续超时失败次数，并持久化到缓存目录
+    - 样本充足时按 p90 × 倍数 推算超时，并限制在配置的上下限内
+    - 超时失败不计入样本、也不放宽超时；连续超时达到 reset_after_timeouts 次时清空该主机样本，
+      回到固定默认超时重新统计（链路变慢的主机由此重新学习，离线主机也不会越等越久）
+    """
+
+    def __init__(self, history_path=None):
+        self.config = ADAPTIVE_TIMEOUT_CONFIG
+        self.history_path = history_path or os.path.join(
+            get_cache_dir(), self.config.get('history_file', 'host_latency.json')
+        )
+        self._lock = threading.Lock()
+        self.history = self._load_history()
+
+    def _load_history(self):
+        try:
+            if os.path.exists(self.history_path):
+                with open(self.history_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.warning(f"加载主机延迟历史失败，忽略历史: {e}")
+        return {}
+
+    def _save_history(self):
+        try:
+            tmp_path = self.history_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.history, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.history_path)
+        except Exception as e:
+            logger.warning(f"保存主机延迟历史失败: {e}")
+
+    @staticmethod
+    def host_key(host, port, via=None):
+        """主机标识：经跳板机的连接单独统计"""
+        key = f"{host}:{port}"
+        return f"{via}->{key}" if via else key
+
+    def _entry(self, key):
+        return self.history.setdefault(key, {'handshake': [], 'rtt': [], 'timeout_failures': 0})
+
+    def _append(self, samples, value):
+        samples.append(round(value, 4))
+        del samples[:-self.config.get('history_size', 20)]
+
+    def record_success(self, key, handshake_seconds, rtt_seconds=None):
+        """记录一次成功连接"""
+        with self._lock:
+            entry = self._entry(key)
+            self._append(entry['handshake'], handshake_seconds)
+            if rtt_seconds is not None:
+                self._append(entry['rtt'], rtt_seconds)
+            entry['timeout_failures'] = 0
+            entry['updated_at'] = time.time()
+            self._save_history()
+
+    def record_failure(self, key, timed_out):
+        """
+        记录一次失败连接；超时不作为耗时样本，也不放宽后续超时（离线主机重试不会越等越久）
+        连续超时达到 reset_after_timeouts 次时清空该主机样本，回到固定默认超时重新统计
+        """
+        with self._lock:
+            entry = self._entry(key)
+            if timed_out:
+                entry['timeout_failures'] = entry.get('timeout_failures', 0) + 1
+                if entry['timeout_failures'] >= self.config.get('reset_after_timeouts', 3):
+                    entry['handshake'] = []
+                    entry['rtt'] = []
+                    entry['timeout_failures'] = 0
+            entry['updated_at'] = time.time()
+            self._save_history()
+
+    def get_timeouts(self, key):
+        """返回 {'timeout', 'auth_timeout', 'banner_timeout'}"""
+        defaults = {
+            'timeout': SSH_CONFIG.get('timeout', 10),
+            'auth_timeout': SSH_CONFIG.get('auth_timeout', 15),
+            'banner_timeout': SSH_CONFIG.get('banner_timeout', 15),
+        }
+        if not self.config.get('enabled', True):
+            return defaults
+
+        with self._lock:
+            entry = self.history.get(key)
+            if not entry or len(entry.get('handshake', [])) < self.config.get('min_samples', 3):
+                return defaults
+
+            cfg = self.config
+            handshake = _percentile(entry['handshake'], 0.9)
+            rtt = _percentile(entry.get('rtt', []), 0.9)
+            # 没有RTT样本时用握手耗时的一部分近似（握手约包含数个往返）
+            if rtt is None:
+                rtt = handshake / 4.0
+
+            timeouts = {
+                'timeout': _clamp(rtt * cfg['rtt_multiplier'],
+                                  cfg['timeout_floor'], cfg['timeout_ceiling']),
+                'auth_timeout': _clamp(handshake * cfg['handshake_multiplier'],
+                                       cfg['auth_floor'], cfg['auth_ceiling']),
+                'banner_timeout': _clamp(handshake * cfg['handshake_multiplier'],
+                                         cfg['banner_floor'], cfg['banner_ceiling']),
+            }
+            return {name: round(value, 2) for name, value in timeouts.items()}
+
+
+_tuner = None
+_tuner_lock = threading.Lock()
+
+
+def get_timeout_tuner():
+    """进程内共享的超时调整器（所有会话共用同一份历史和同一把锁，避免并发保存互相覆盖）"""
+    global _tuner
+    with _tuner_lock:
+        if _tuner is None:
+            _tuner = ConnectionTimeoutTuner()
+        return _tuner
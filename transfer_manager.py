@@ -0,0 +1,307 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from data_path import TRANSFER_CONFIG, get_cache_dir
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 条件写入冲突：远端文件自读取后已被修改
+CAS_CONFLICT = 'CAS_CONFLICT'
+CONFLICT_MESSAGE = "远端文件已被修改（与读取时不一致）"
+NO_CHANGE_MESSAGE = "内容未变化，已跳过写入"
+
+
+class TransferStateStore:
+    """本地传输进度记录（transfers.json），进程内所有会话共用一份，保存时先写临时文件再替换"""
+
+    def __init__(self, state_path=None):
+        self.state_path = state_path or os.path.join(
+            get_cache_dir(), TRANSFER_CONFIG.get('state_file', 'transfers.json')
+        )
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    def _load(self):
+        """加载本地传输进度记录"""
+        try:
+            if os.path.exists(self.state_path):
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.warning(f"加载传输进度记录失败，忽略历史进度: {e}")
+        return {}
+
+    def _save(self):
+        """持久化传输进度（先写临时文件再替换，避免半写）"""
+        try:
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            logger.warning(f"保存传输进度失败: {e}")
+
+    def update(self, transfer_id, **fields):
+        with self._lock:
+            entry = self.state.setdefault(transfer_id, {})
+            entry.update(fields)
+            entry['updated_at'] = time.time()
+            self._save()
+
+    def finish(self, transfer_id):
+        with self._lock:
+            if self.state.pop(transfer_id, None) is not None:
+                self._save()
+
+    def pending(self):
+        with self._lock:
+            return dict(self.state)
+
+
+_state_store = None
+_state_store_lock = threading.Lock()
+
+
+def get_transfer_state_store():
+    """进程内共享的传输进度记录"""
+    global _state_store
+    with _state_store_lock:
+        if _state_store is None:
+            _state_store = TransferStateStore()
+        return _state_store
+
+
+class TransferManager:
+    """
+    分块断点续传：
+    - 每次传输按 (车辆, 面, 远端路径, 内容sha256) 生成固定的传输ID
+    - 上传分块追加到远端暂存文件，以远端实际大小作为已确认偏移
+    - 下载分块写入本地暂存文件，以本地文件大小作为已确认偏移
+    - 断线重连后再次发起同一传输，会从最后确认的块继续
+    - 完成前校验整文件sha256，校验通过后才原子替换/返回
+    """
+
+    def __init__(self, ssh_manager, chunk_size=None):
+        self.ssh_manager = ssh_manager
+        self.chunk_size = chunk_size or TRANSFER_CONFIG.get('chunk_size', 48 * 1024)
+        self.remote_tmp_dir = TRANSFER_CONFIG.get('remote_tmp_dir', '/tmp')
+        self.local_part_dir = get_cache_dir('transfers')
+        self.state_store = get_transfer_state_store()
+
+    # ========= 进度记录 =========
+    def _update_state(self, transfer_id, **fields):
+        self.state_store.update(transfer_id, **fields)
+
+    def _finish_state(self, transfer_id):
+        self.state_store.finish(transfer_id)
+
+    def _transfer_id(self, direction, remote_path, digest):
+        """生成传输ID：同一目标、同一内容始终得到同一ID，从而可续传"""
+        key = "|".join([
+            direction,
+            str(self.ssh_manager.get_current_car_name()),
+            str(self.ssh_manager.get_current_side()),
+            remote_path,
+            digest,
+        ])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+    # ========= 远端工具 =========
+    def _exec(self, command):
+        return self.ssh_manager.execute_side_command_persistent(command)
+
+    def _remote_size(self, remote_file):
+        """获取远端文件大小，不存在时返回0"""
+        success, result = self._exec(f"[ -f '{remote_file}' ] && wc -c < '{remote_file}' || echo 0")
+        if not success:
+            raise IOError(f"查询远端文件大小失败: {result}")
+        return int(result.strip().split()[-1])
+
+    def _remote_sha256(self, remote_file):
+        success, result = self._exec(f"sha256sum '{remote_file}'")
+        if not success or not result.strip():
+            raise IOError(f"计算远端文件校验值失败: {result}")
+        return result.strip().split()[0]
+
+    def stat_remote_file(self, remote_file):
+        """一次命令获取远端文件大小和sha256，返回 (size, sha256)，文件不存在返回 (None, None)"""
+        command = (
+            f"if [ -f '{remote_file}' ]; then wc -c < '{remote_file}'; sha256sum '{remote_file}'; "
+            f"else echo MISSING; fi"
+        )
+        success, result = self._exec(command)
+        if not success:
+            raise IOError(f"查询远端文件信息失败: {result}")
+        lines = [line.strip() for line in result.strip().splitlines() if line.strip()]
+        if not lines or lines[-1] == 'MISSING':
+            return None, None
+        return int(lines[-2].split()[-1]), lines[-1].split()[0]
+
+    # ========= 上传 =========
+    def _query_upload_state(self, part_file, remote_path):
+        """一次命令获取已确认偏移和目标文件当前sha256（不存在为None）"""
+        success, result = self._exec(
+            f"[ -f '{part_file}' ] && wc -c < '{part_file}' || echo 0; "
+            f"[ -f '{remote_path}' ] && sha256sum '{remote_path}' || echo MISSING"
+        )
+        if not success:
+            raise IOError(f"查询上传状态失败: {result}")
+        lines = [line.strip() for line in result.strip().splitlines() if line.strip()]
+        current = lines[-1].split()[0]
+        return int(lines[-2].split()[-1]), (None if current == 'MISSING' else current)
+
+    def upload(self, data, remote_path, mode='644', expected_sha256=None, digest=None):
+        """
+        分块续传上传：分块追加到远端暂存文件 -> 整文件sha256校验 -> 同目录临时文件 -> 原子mv -> sync
+        expected_sha256 不为空时为条件写入：目标文件当前sha256不一致则拒绝覆盖
+        digest 为 data 的sha256（调用方已算好时传入，避免重复计算）
+        返回 (success, message)
+        """
+        try:
+            digest = digest or hashlib.sha256(data).hexdigest()
+            transfer_id = self._transfer_id('upload', remote_path, digest)
+            part_file = f"{self.remote_tmp_dir}/car_tinker_{transfer_id}.part"
+            total = len(data)
+
+            offset, current = self._query_upload_state(part_file, remote_path)
+            if expected_sha256 and current != expected_sha256:
+                logger.warning(f"条件写入冲突: {remote_path} 期望{expected_sha256}，实际{current}")
+                return False, f"{CONFLICT_MESSAGE}: {remote_path}"
+            if offset > total:
+                logger.warning(f"远端暂存文件大于目标内容，重新开始传输: {part_file}")
+                self._exec(f"rm -f '{part_file}'")
+                offset = 0
+            if offset:
+                logger.info(f"续传 {remote_path}: 已确认 {offset}/{total} 字节")
+
+            self._update_state(transfer_id, direction='upload', remote_path=remote_path,
+                               part_file=part_file, sha256=digest, size=total, offset=offset)
+
+            while offset < total:
+                chunk = data[offset:offset + self.chunk_size]
+                encoded = base64.b64encode(chunk).decode('ascii')
+                success, result = self._exec(
+                    f"echo '{encoded}' | base64 -d >> '{part_file}' && wc -c < '{part_file}'"
+                )
+                if not success:
+                    return False, f"分块上传中断（已确认 {offset}/{total} 字节，可重试续传）: {result}"
+
+                confirmed = int(result.strip().split()[-1])
+                if confirmed != offset + len(chunk):
+                    # 块写入不完整时以远端实际大小为准，下一轮从该偏移继续
+                    logger.warning(f"分块确认大小不符: 期望{offset + len(chunk)}，实际{confirmed}")
+                    if confirmed > total:
+                        self._exec(f"rm -f '{part_file}'")
+                        confirmed = 0
+                offset = confirmed
+                self._update_state(transfer_id, offset=offset)
+
+            remote_digest = self._remote_sha256(part_file)
+            if remote_digest != digest:
+                self._exec(f"rm -f '{part_file}'")
+                self._finish_state(transfer_id)
+                return False, "整文件校验失败，已清理暂存文件，请重试"
+
+            # 先复制到目标目录内的临时文件，再同文件系统原子替换
+            remote_dir, file_name = remote_path.rsplit('/', 1)
+            staged_file = f"{remote_dir}/.{file_name}.{transfer_id}"
+            finalize_command = (
+                f"cp '{part_file}' '{staged_file}' && chmod {mode} '{staged_file}' && "
+                f"mv -f '{staged_file}' '{remote_path}' && sync && rm -f '{part_file}'"
+            )
+            if expected_sha256:
+                # 替换前再次比对目标文件，缩小并发修改的窗口
+                finalize_command = (
+                    f"if [ \"$(sha256sum '{remote_path}' 2>/dev/null | cut -d' ' -f1)\" != '{expected_sha256}' ]; "
+                    f"then echo '{CAS_CONFLICT}'; else {finalize_command}; fi"
+                )
+            success, result = self._exec(finalize_command)
+            if not success:
+                self._exec(f"rm -f '{staged_file}'")
+                return False, f"替换目标文件失败（暂存文件保留，可重试）: {result}"
+            if CAS_CONFLICT in result:
+                return False, f"{CONFLICT_MESSAGE}: {remote_path}"
+
+            self._finish_state(transfer_id)
+            logger.info(f"✓ 分块上传完成: {remote_path} ({total} 字节)")
+            return True, "文件保存成功"
+
+        except Exception as e:
+            error_msg = f"分块上传失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    # ========= 下载 =========
+    def download(self, remote_path, size=None, digest=None):
+        """
+        分块续传下载：按块 dd|base64 读取并追加到本地暂存文件，完成后校验整文件sha256
+        返回 (success, bytes 或 错误信息)
+        """
+        try:
+            if size is None or digest is None:
+                size, digest = self.stat_remote_file(remote_path)
+                if size is None:
+                    return False, f"文件不存在: {remote_path}"
+
+            transfer_id = self._transfer_id('download', remote_path, digest)
+            part_file = os.path.join(self.local_part_dir, f"{transfer_id}.part")
+
+            # 已确认偏移按块对齐，半块数据丢弃重传
+            offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+            offset -= offset % self.chunk_size
+            if offset > size:
+                offset = 0
+            with open(part_file, 'ab') as f:
+                f.truncate(offset)
+            if offset:
+                logger.info(f"续传下载 {remote_path}: 已确认 {offset}/{size} 字节")
+
+            self._update_state(transfer_id, direction='download', remote_path=remote_path,
+                               part_file=part_file, sha256=digest, size=size, offset=offset)
+
+            with open(part_file, 'ab') as f:
+                while offset < size:
+                    block_index = offset // self.chunk_size
+                    success, result = self._exec(
+                        f"dd if='{remote_path}' bs={self.chunk_size} skip={block_index} count=1 2>/dev/null | base64"
+                    )
+                    if not success:
+                        return False, f"分块下载中断（已确认 {offset}/{size} 字节，可重试续传）: {result}"
+
+                    chunk = base64.b64decode(''.join(result.split()))
+                    expected = min(self.chunk_size, size - offset)
+                    if len(chunk) != expected:
+                        return False, f"分块数据长度不符: 期望{expected}，实际{len(chunk)}"
+
+                    f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    offset += len(chunk)
+                    self._update_state(transfer_id, offset=offset)
+
+            with open(part_file, 'rb') as f:
+                data = f.read()
+
+            os.remove(part_file)
+            self._finish_state(transfer_id)
+
+            if hashlib.sha256(data).hexdigest() != digest:
+                return False, "整文件校验失败（远端文件可能在下载期间被修改），请重试"
+
+            logger.info(f"✓ 分块下载完成: {remote_path} ({size} 字节)")
+            return True, data
+
+        except Exception as e:
+            error_msg = f"分块下载失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def pending_transfers(self):
+        """获取未完成的传输记录"""
+        return self.state_store.pending()
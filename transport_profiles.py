@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import threading
+import time
+from data_path import TRANSPORT_PROFILES, TRANSPORT_CONFIG, get_cache_dir
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def get_transport_profile(name):
+    """按名称获取传输档位，未知名称返回None"""
+    profile = TRANSPORT_PROFILES.get(name)
+    return dict(profile, name=name) if profile else None
+
+
+def apply_transport_profile(transport, profile):
+    """
+    将档位应用到已建立的paramiko Transport：
+    - 窗口/包长：设置为实例默认值，之后新开的通道（exec_command/隧道）生效
+    - 重协商阈值：设置到packetizer实例
+    压缩需在握手时协商，由连接参数 compress 控制
+    """
+    try:
+        if not transport or not profile:
+            return False
+        transport.default_window_size = profile['window_size']
+        transport.default_max_packet_size = profile['max_packet_size']
+        packetizer = getattr(transport, 'packetizer', None)
+        if packetizer is not None:
+            packetizer.REKEY_BYTES = profile['rekey_bytes']
+            packetizer.REKEY_PACKETS = profile['rekey_packets']
+        logger.info(f"已应用传输档位: {profile.get('name')}")
+        return True
+    except Exception as e:
+        logger.warning(f"应用传输档位失败: {e}")
+        return False
+
+
+class TransportProfileStore:
+    """每辆车的最佳传输档位记录（自动校准结果），持久化到缓存目录"""
+
+    def __init__(self, store_path=None):
+        self.store_path = store_path or os.path.join(
+            get_cache_dir(), TRANSPORT_CONFIG.get('profile_store_file', 'transport_profiles.json')
+        )
+        self._lock = threading.Lock()
+        self.records = self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.store_path):
+                with open(self.store_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.warning(f"加载传输档位记录失败: {e}")
+        return {}
+
+    def _save(self):
+        try:
+            tmp_path = self.store_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.records, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.store_path)
+        except Exception as e:
+            logger.warning(f"保存传输档位记录失败: {e}")
+
+    def get_profile_name(self, car_name):
+        with self._lock:
+            record = self.records.get(car_name)
+            return record.get('profile') if record else None
+
+    def set_profile(self, car_name, profile_name, results=None):
+        with self._lock:
+            self.records[car_name] = {
+                'profile': profile_name,
+                'results': results or {},
+                'calibrated_at': time.time(),
+            }
+            self._save()
+
+
+_profile_store = None
+_profile_store_lock = threading.Lock()
+
+
+def get_transport_profile_store():
+    """进程内共享的传输档位记录（所有会话共用，避免并发保存互相覆盖）"""
+    global _profile_store
+    with _profile_store_lock:
+        if _profile_store is None:
+            _profile_store = TransportProfileStore()
+        return _profile_store
+
+
+class TransportCalibrator:
+    """
+    自动校准：在当前A/B面连接上，按各档位的窗口/包长各做几次测试传输，
+    取吞吐中位数最高的档位保存为该车的最佳档位
+    压缩在握手时已协商，测试通道无法测出其效果，因此只在与当前连接压缩设置相同的档位之间比较
+    """
+
+    def __init__(self, ssh_manager, rounds=None, test_bytes=None):
+        self.ssh_manager = ssh_manager
+        self.rounds = rounds or TRANSPORT_CONFIG.get('calibration_rounds', 3)
+        self.test_bytes = test_bytes or TRANSPORT_CONFIG.get('calibration_bytes', 1024 * 1024)
+
+    def _measure_once(self, transport, profile):
+        """使用指定窗口/包长开通道，读取测试数据并计时，返回吞吐（字节/秒）"""
+        channel = transport.open_session(
+            window_size=profile['window_size'],
+            max_packet_size=profile['max_packet_size'],
+        )
+        try:
+            start = time.monotonic()
+            channel.exec_command(f"head -c {self.test_bytes} /dev/urandom")
+            received = 0
+            while True:
+                data = channel.recv(256 * 1024)
+                if not data:
+                    break
+                received += len(data)
+            elapsed = max(time.monotonic() - start, 1e-6)
+        finally:
+            channel.close()
+        if received < self.test_bytes:
+            raise IOError(f"测试数据不完整: {received}/{self.test_bytes}")
+        return received / elapsed
+
+    def calibrate(self, profile_names=None):
+        """
+        返回 (success, {'best': 名称, 'results': {名称: 吞吐中位数}} 或 错误信息)
+        """
+        try:
+            if not self.ssh_manager.is_side_connected():
+                return False, "A/B面持久连接未建立"
+
+            transport = self.ssh_manager.side_ssh_client.get_transport()
+            compressed = getattr(transport, 'local_compression', 'none') != 'none'
+            candidates = [name for name in profile_names or TRANSPORT_PROFILES.keys()
+                          if TRANSPORT_PROFILES[name]['compress'] == compressed]
+            if not candidates:
+                return False, "没有与当前连接压缩设置一致的档位可供校准"
+            results = {}
+            for name in candidates:
+                profile = get_transport_profile(name)
+                samples = []
+                for _ in range(self.rounds):
+                    try:
+                        samples.append(self._measure_once(transport, profile))
+                    except Exception as e:
+                        logger.warning(f"档位 {name} 测试传输失败: {e}")
+                if samples:
+                    samples.sort()
+                    results[name] = round(samples[len(samples) // 2], 1)
+                    logger.info(f"档位 {name} 吞吐中位数: {results[name] / 1024:.1f} KB/s")
+
+            if not results:
+                return False, "所有档位测试传输均失败"
+
+            best = max(results, key=results.get)
+            car_name = self.ssh_manager.get_current_car_name()
+            self.ssh_manager.transport_profile_store.set_profile(car_name, best, results)
+            apply_transport_profile(transport, get_transport_profile(best))
+            logger.info(f"✓ 车辆 {car_name} 最佳传输档位: {best}")
+            return True, {'best': best, 'results': results}
+
+        except Exception as e:
+            error_msg = f"传输档位校准失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
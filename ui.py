@@ -1,16 +1,28 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import json
 import os
 import sys
+import time
+import queue
+import threading
 import logging
 from side_selector import SideSelector
+from ssh_manager import SSHManager
+from dual_side_writer import DualSideWriter
+from side_consistency import SideConsistencyChecker, CONSISTENT, INCONSISTENT
+from replicator import FileReplicator
+from offline_journal import OfflineSession
+from fleet_window import FleetWindow
+from fleet_query import get_fleet_query_index
+from reachability import ReachabilityScanner, summarize as summarize_reachability
 from data_path import (
     FILE_PATHS,
     get_icon_path,
     get_config_path,
     create_default_config,
     get_full_adas_file_path,
+    REACHABILITY_CONFIG,
 )
 
 # 配置日志
@@ -19,18 +31,42 @@ logger = logging.getLogger(__name__)
 
 
 class TerminalManagerUI:
-    def __init__(self, root, ssh_manager, file_editor_class):
+    def __init__(self, root, session_manager, file_editor_class):
         self.root = root
-        self.ssh_manager = ssh_manager
+        self.session_manager = session_manager
+        self._idle_manager = SSHManager()  # 未选中任何会话时的占位（始终未连接）
         self.file_editor_class = file_editor_class
         self.terminals = {}
         self.force_direct_var = tk.BooleanVar(value=False)  # 全局强制车机直连开关
         self.car_env_mode = False  # 是否车载直连环境
+        self.reachability_scanner = ReachabilityScanner()
+        self.reachability = {}  # 车型 -> (状态, 延迟文本, 是否全部可达)
+        self.tree_items = {}  # 车型 -> 列表项ID
+        self._last_reachability_scan = 0.0
 
         self.prompt_env_mode()
         self.load_config()
         self.create_widgets()
 
+    @property
+    def ssh_manager(self):
+        """当前操作的会话（与车型列表选中项对应）"""
+        return self.session_manager.get_active() or self._idle_manager
+
+    def _activate_session(self, car_name, create=False):
+        """切换到指定车型的会话，create=True 时不存在则创建；返回是否成功"""
+        handle = self.session_manager.make_handle(car_name)
+        if create:
+            success, result = self.session_manager.open_session(handle)
+            if not success:
+                messagebox.showerror("错误", result)
+                return False
+        elif not self.session_manager.get_session(handle):
+            self.session_manager.set_active(None)
+            return False
+        self.session_manager.set_active(handle)
+        return True
+
     def prompt_env_mode(self):
         """启动前选择环境：车载直连 / 远程跳板"""
         try:
@@ -164,6 +200,9 @@ class TerminalManagerUI:
                                              relief=tk.SUNKEN, anchor=tk.W, bg="white")
             connection_info_label.pack(fill=tk.X, side=tk.BOTTOM)
 
+            # 工具菜单（需连接A/B面的扩展操作）
+            self.create_tools_menu()
+
             # 主内容框架
             main_frame = tk.Frame(self.root)
             main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -184,19 +223,25 @@ class TerminalManagerUI:
 
             # 车型列表
             self.tree = ttk.Treeview(list_frame,
-                                     columns=("ssh_command", "a_side", "b_side", "working_directory"),
+                                     columns=("status", "latency", "ssh_command", "a_side", "b_side",
+                                              "working_directory"),
                                      show="tree headings", height=20)
             self.tree.heading("#0", text="车型名称")
+            self.tree.heading("status", text="状态")
+            self.tree.heading("latency", text="延迟")
             self.tree.heading("ssh_command", text="SSH命令")
             self.tree.heading("a_side", text="A面地址")
             self.tree.heading("b_side", text="B面地址")
             self.tree.heading("working_directory", text="工作目录")
 
             self.tree.column("#0", width=180)
+            self.tree.column("status", width=80)
+            self.tree.column("latency", width=110)
             self.tree.column("ssh_command", width=200)
             self.tree.column("a_side", width=100)
             self.tree.column("b_side", width=100)
             self.tree.column("working_directory", width=200)
+            self.tree.tag_configure("offline", foreground="gray")
 
             # 滚动条
             scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
@@ -207,6 +252,7 @@ class TerminalManagerUI:
 
             # 绑定事件
             self.tree.bind("<Double-1>", self.on_item_double_click)
+            self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
 
             # 右侧操作框架
             action_frame = tk.LabelFrame(main_frame, text="操作面板", padx=10, pady=10, width=200)
@@ -220,6 +266,7 @@ class TerminalManagerUI:
                 variable=self.force_direct_var,
                 onvalue=True,
                 offvalue=False,
+                command=lambda: self.start_reachability_scan(force=True),
             )
             force_direct_cb.pack(pady=(0, 5), anchor=tk.W)
 
@@ -264,6 +311,12 @@ class TerminalManagerUI:
                                               state=tk.DISABLED)
             self.edit_adas_button.pack(pady=5, fill=tk.X)
 
+            # A/B一致性检查按钮（对列表中选中的车型，自动连接两面）
+            consistency_button = tk.Button(action_frame, text="A/B一致性检查",
+                                           command=self.check_side_consistency,
+                                           bg="lightcyan", width=15, height=2)
+            consistency_button.pack(pady=5, fill=tk.X)
+
             # 断开连接按钮
             self.disconnect_button = tk.Button(action_frame, text="断开连接",
                                                command=self.disconnect,
@@ -294,12 +347,47 @@ class TerminalManagerUI:
             self.refresh_list()
             self.update_connection_info()
 
+            # 后台检测各车型在线状态，结果由界面线程定时取出
+            self.start_reachability_scan()
+            self.root.after(REACHABILITY_CONFIG.get('poll_interval_ms', 200), self.poll_reachability)
+
             logger.info("UI界面创建成功")
 
         except Exception as e:
             logger.error(f"创建UI界面失败: {e}")
             messagebox.showerror("UI错误", f"创建用户界面失败:\n{str(e)}")
 
+    def create_tools_menu(self):
+        """创建菜单栏中的工具菜单"""
+        try:
+            menubar = tk.Menu(self.root)
+            self.tools_menu = tk.Menu(menubar, tearoff=0)
+            menubar.add_cascade(label="工具", menu=self.tools_menu)
+
+            # 需连接A/B面才可用的工具
+            side_tools = [
+                ("传输校准", self.calibrate_transport),
+                ("复制到其他面/车辆", self.open_replicate_dialog),
+                ("下载conf目录", self.bulk_download),
+                ("上传conf目录", self.bulk_upload),
+                ("增量同步conf目录", self.incremental_sync),
+                ("搜索参数", self.open_search_dialog),
+            ]
+            self.side_tool_labels = []
+            for label, command in side_tools:
+                self.tools_menu.add_command(label=label, command=command, state=tk.DISABLED)
+                self.side_tool_labels.append(label)
+
+            # 无需连接的工具
+            self.tools_menu.add_separator()
+            self.tools_menu.add_command(label="离线编辑", command=self.open_offline_editor)
+            self.tools_menu.add_command(label="批量操作", command=self.open_fleet_window)
+            self.tools_menu.add_command(label="车队参数查询", command=self.open_fleet_query_dialog)
+
+            self.root.config(menu=menubar)
+        except Exception as e:
+            logger.error(f"创建工具菜单失败: {e}")
+
     def filter_terminals(self, event=None):
         """过滤车型列表"""
         try:
@@ -321,6 +409,7 @@ class TerminalManagerUI:
         """刷新车型列表"""
         try:
             self.tree.delete(*self.tree.get_children())
+            self.tree_items = {}
 
             for name, config in self.terminals.items():
                 try:
@@ -338,8 +427,12 @@ class TerminalManagerUI:
                             filter_text in b_side.lower() or
                             filter_text in working_directory.lower()):
 
+                        status, latency, online = self.reachability.get(name, ("检测中", "", True))
                         item = self.tree.insert("", "end", text=name,
-                                                values=(ssh_command, a_side, b_side, working_directory))
+                                                values=(status, latency, ssh_command, a_side, b_side,
+                                                        working_directory),
+                                                tags=() if online else ("offline",))
+                        self.tree_items[name] = item
                         # 车载环境只有一个项，默认选中
                         if self.car_env_mode:
                             self.tree.selection_set(item)
@@ -351,6 +444,41 @@ class TerminalManagerUI:
         except Exception as e:
             logger.error(f"刷新车型列表失败: {e}")
 
+    def start_reachability_scan(self, force=False):
+        """启动一轮后台可达性扫描（force=True 时忽略缓存）"""
+        try:
+            if self.reachability_scanner.start(self.terminals, self.force_direct_var.get(), force=force):
+                self._last_reachability_scan = time.monotonic()
+                for name, item in self.tree_items.items():
+                    if name not in self.reachability or force:
+                        self.tree.set(item, "status", "检测中")
+        except Exception as e:
+            logger.error(f"启动可达性扫描失败: {e}")
+
+    def poll_reachability(self):
+        """取出后台扫描结果并更新列表（界面线程执行），按配置间隔自动重新扫描"""
+        try:
+            while True:
+                try:
+                    name, roles = self.reachability_scanner.results.get_nowait()
+                except queue.Empty:
+                    break
+                self.reachability[name] = summarize_reachability(roles)
+                item = self.tree_items.get(name)
+                if item and self.tree.exists(item):
+                    status, latency, online = self.reachability[name]
+                    self.tree.set(item, "status", status)
+                    self.tree.set(item, "latency", latency)
+                    self.tree.item(item, tags=() if online else ("offline",))
+
+            interval = REACHABILITY_CONFIG.get('rescan_interval', 120)
+            if interval and time.monotonic() - self._last_reachability_scan > interval:
+                self.start_reachability_scan()
+        except Exception as e:
+            logger.error(f"更新在线状态失败: {e}")
+        finally:
+            self.root.after(REACHABILITY_CONFIG.get('poll_interval_ms', 200), self.poll_reachability)
+
     def on_item_double_click(self, event):
         """双击连接"""
         try:
@@ -388,8 +516,13 @@ class TerminalManagerUI:
             if not car_name:
                 return
 
+            # 每辆车独立会话，连接新车辆不会断开其他车辆
+            if not self._activate_session(car_name, create=True):
+                return
+
             connection_type = config.get('connection_type', 'tunnel')
             working_directory = config.get('working_directory')
+            self.ssh_manager.select_transport_profile(config.get('transport_profile'))
 
             # 如果全局开启“车机直连”或配置为 direct，则直接 SSH root@车机
             if self.force_direct_var.get() or connection_type == 'direct':
@@ -407,16 +540,11 @@ class TerminalManagerUI:
                 )
                 if success:
                     self.status_var.set(f"已直连到 {car_name} - {default_side}面")
-                    self.connect_vehicle_button.config(state=tk.DISABLED)
-                    self.select_side_button.config(state=tk.NORMAL)  # 允许切换到另一面
-                    self.check_file_button.config(state=tk.NORMAL)
-                    self.mount_button.config(state=tk.NORMAL)
-                    self.edit_button.config(state=tk.NORMAL)
-                    self.edit_adas_button.config(state=tk.NORMAL)
-                    self.disconnect_button.config(state=tk.NORMAL)
+                    self.update_button_states()
                     self.update_connection_info()
                     messagebox.showinfo("成功", message)
                     logger.info(f"直连完成: {car_name}, {default_side}面")
+                    self.flush_offline_writes()
                 else:
                     self.status_var.set("直连失败")
                     messagebox.showerror("错误", message)
@@ -434,9 +562,7 @@ class TerminalManagerUI:
 
             if success:
                 self.status_var.set(f"已连接到车辆 {car_name}")
-                self.connect_vehicle_button.config(state=tk.DISABLED)
-                self.select_side_button.config(state=tk.NORMAL)
-                self.disconnect_button.config(state=tk.NORMAL)
+                self.update_button_states()
                 self.update_connection_info()
                 messagebox.showinfo("成功", message)
                 logger.info(f"成功连接到车辆: {car_name}")
@@ -464,6 +590,8 @@ class TerminalManagerUI:
             selected_side = selector.get_selected_side()
 
             if selected_side:
+                if not self._activate_session(car_name, create=True):
+                    return
                 self.status_var.set(f"正在连接{selected_side}面...")
                 self.root.update()
 
@@ -474,6 +602,7 @@ class TerminalManagerUI:
 
                 connection_type = config.get('connection_type', 'tunnel')
                 port = config.get('port', 22)
+                self.ssh_manager.select_transport_profile(config.get('transport_profile'))
 
                 # 车载环境：确保直连模式已准备
                 if self.car_env_mode or self.force_direct_var.get() or connection_type == 'direct':
@@ -491,13 +620,11 @@ class TerminalManagerUI:
 
                 if success:
                     self.status_var.set(f"已连接到{selected_side}面")
-                    self.check_file_button.config(state=tk.NORMAL)
-                    self.mount_button.config(state=tk.NORMAL)
-                    self.edit_button.config(state=tk.NORMAL)
-                    self.edit_adas_button.config(state=tk.NORMAL)
+                    self.update_button_states()
                     self.update_connection_info()
                     messagebox.showinfo("成功", message)
                     logger.info(f"成功连接到{selected_side}面: {car_name}")
+                    self.flush_offline_writes()
                 else:
                     self.status_var.set(f"{selected_side}面连接失败")
                     messagebox.showerror("错误", message)
@@ -539,6 +666,48 @@ class TerminalManagerUI:
             logger.error(f"挂载文件系统操作失败: {e}")
             messagebox.showerror("错误", f"挂载文件系统失败:\n{str(e)}")
 
+    def calibrate_transport(self):
+        """自动校准传输档位（窗口/包长），保存该车最佳档位"""
+        try:
+            if not self.ssh_manager.is_side_connected():
+                messagebox.showerror("错误", "未连接到A/B面")
+                return
+
+            self.status_var.set("正在校准传输档位...")
+            # 多次测试传输耗时较长，放到后台线程执行，界面线程轮询结果
+            session = self.ssh_manager
+            results = queue.Queue(maxsize=1)
+            threading.Thread(target=lambda: results.put(session.calibrate_transport_profile()),
+                             daemon=True).start()
+            self.root.after(200, self.poll_calibration, results)
+
+        except Exception as e:
+            logger.error(f"传输校准操作失败: {e}")
+            messagebox.showerror("错误", f"传输校准失败:\n{str(e)}")
+
+    def poll_calibration(self, results):
+        """取后台校准结果并显示（界面线程执行）"""
+        try:
+            try:
+                success, result = results.get_nowait()
+            except queue.Empty:
+                self.root.after(200, self.poll_calibration, results)
+                return
+
+            if success:
+                lines = [f"{name}: {speed / 1024:.1f} KB/s" for name, speed in result['results'].items()]
+                self.status_var.set(f"传输校准完成，最佳档位: {result['best']}")
+                messagebox.showinfo("传输校准", f"最佳档位: {result['best']}\n\n" + "\n".join(lines))
+                logger.info(f"传输校准完成: {result}")
+            else:
+                self.status_var.set("传输校准失败")
+                messagebox.showerror("错误", result)
+                logger.error(f"传输校准失败: {result}")
+
+        except Exception as e:
+            logger.error(f"传输校准操作失败: {e}")
+            messagebox.showerror("错误", f"传输校准失败:\n{str(e)}")
+
     def open_file_editor(self):
         """打开文件编辑器"""
         try:
@@ -546,7 +715,13 @@ class TerminalManagerUI:
                 messagebox.showerror("错误", "未连接到A/B面")
                 return
 
-            editor = self.file_editor_class(self.root, self.ssh_manager)
+            # 编辑器绑定打开时的会话：之后在车型列表切换到其他车辆，A/B两面保存仍写入本车
+            session = self.ssh_manager
+            editor = self.file_editor_class(
+                self.root,
+                session,
+                dual_write_func=lambda content, force=False: self.write_both_sides(session, 'params', content, force)
+            )
             # 设置文件编辑器窗口图标
             self.set_window_icon(editor.window)
             logger.info("文件编辑器已打开")
@@ -562,12 +737,14 @@ class TerminalManagerUI:
                 messagebox.showerror("错误", "未连接到A/B面")
                 return
 
+            session = self.ssh_manager
             editor = self.file_editor_class(
                 self.root,
-                self.ssh_manager,
+                session,
                 file_path_resolver=get_full_adas_file_path,
-                read_func=self.ssh_manager.read_adas_file_persistent,
-                write_func=self.ssh_manager.write_adas_file_persistent,
+                read_func=session.read_adas_file_persistent,
+                write_func=session.write_adas_file_persistent,
+                dual_write_func=lambda content, force=False: self.write_both_sides(session, 'adas', content, force),
                 window_title="编辑 adas_params.json",
                 file_label="adas_params.json"
             )
@@ -578,6 +755,545 @@ class TerminalManagerUI:
             logger.error(f"打开ADAS文件编辑器失败: {e}")
             messagebox.showerror("错误", f"打开ADAS文件编辑器失败:\n{str(e)}")
 
+    def open_offline_editor(self):
+        """车辆不可达时，基于本地缓存编辑选中车型某一面的文件，保存进入写回队列"""
+        try:
+            car_name, config = self.get_selected_car()
+            if not car_name:
+                return
+
+            dialog = tk.Toplevel(self.root)
+            dialog.title("离线编辑")
+            dialog.geometry("300x200")
+            dialog.resizable(False, False)
+            dialog.transient(self.root)
+            dialog.grab_set()
+            self.set_window_icon(dialog)
+
+            tk.Label(dialog, text=f"车型: {car_name}", font=("Arial", 11, "bold")).pack(pady=10)
+            side_var = tk.StringVar(value=config.get('preferred_side', 'A'))
+            side_frame = tk.Frame(dialog)
+            side_frame.pack(pady=5)
+            tk.Radiobutton(side_frame, text="A面", variable=side_var, value="A").pack(side=tk.LEFT, padx=10)
+            tk.Radiobutton(side_frame, text="B面", variable=side_var, value="B").pack(side=tk.LEFT, padx=10)
+            kind_var = tk.StringVar(value="params")
+            kind_frame = tk.Frame(dialog)
+            kind_frame.pack(pady=5)
+            tk.Radiobutton(kind_frame, text="params.json", variable=kind_var, value="params").pack(side=tk.LEFT)
+            tk.Radiobutton(kind_frame, text="adas_params.json", variable=kind_var, value="adas").pack(side=tk.LEFT)
+
+            def confirm():
+                session = OfflineSession(car_name, side_var.get(), config.get('working_directory'))
+                kind = kind_var.get()
+                dialog.destroy()
+                if kind == 'adas':
+                    editor = self.file_editor_class(
+                        self.root, session,
+                        file_path_resolver=get_full_adas_file_path,
+                        read_func=session.read_adas_file_persistent,
+                        write_func=session.write_adas_file_persistent,
+                        window_title=f"编辑 adas_params.json - {car_name} {session.side}面",
+                        file_label="adas_params.json",
+                        offline=True
+                    )
+                else:
+                    editor = self.file_editor_class(
+                        self.root, session,
+                        window_title=f"编辑 params.json - {car_name} {session.side}面",
+                        offline=True
+                    )
+                self.set_window_icon(editor.window)
+                logger.info(f"离线编辑器已打开: {car_name} {session.side}面 {kind}")
+
+            tk.Button(dialog, text="打开", width=10, command=confirm).pack(pady=10)
+
+        except Exception as e:
+            logger.error(f"打开离线编辑失败: {e}")
+            messagebox.showerror("错误", f"打开离线编辑失败:\n{str(e)}")
+
+    def open_fleet_window(self):
+        """打开车队批量操作窗口（使用独立会话，不影响当前连接）"""
+        try:
+            FleetWindow(self.root, self.terminals, force_direct=self.force_direct_var.get())
+            logger.info("批量操作窗口已打开")
+        except Exception as e:
+            logger.error(f"打开批量操作窗口失败: {e}")
+            messagebox.showerror("错误", f"打开批量操作窗口失败:\n{str(e)}")
+
+    def open_fleet_query_dialog(self):
+        """按本地快照查询全部车辆的参数（不访问网络）"""
+        try:
+            dialog = tk.Toplevel(self.root)
+            dialog.title("车队参数查询（本地快照）")
+            dialog.geometry("860x460")
+            dialog.transient(self.root)
+            self.set_window_icon(dialog)
+
+            input_frame = tk.Frame(dialog)
+            input_frame.pack(fill=tk.X, padx=10, pady=8)
+            tk.Label(input_frame, text="条件:").pack(side=tk.LEFT)
+            query_var = tk.StringVar()
+            entry = tk.Entry(input_frame, textvariable=query_var, width=50)
+            entry.pack(side=tk.LEFT, padx=5)
+            kind_names = {"全部": None, "params": 'params', "adas": 'adas'}
+            kind_var = tk.StringVar(value="全部")
+            ttk.Combobox(input_frame, textvariable=kind_var, values=list(kind_names.keys()),
+                         state="readonly", width=8).pack(side=tk.LEFT, padx=5)
+
+            tk.Label(dialog, text="示例: aeb.ttc_threshold < 1.5 and lateral.*.kp != 0.8 ；"
+                                  "运算符 == != < <= > >= ~(包含) exists missing",
+                     anchor=tk.W, fg="gray").pack(fill=tk.X, padx=10)
+
+            columns = ("car", "side", "kind", "matches")
+            result_tree = ttk.Treeview(dialog, columns=columns, show="headings")
+            for column, text, width in (("car", "车型", 160), ("side", "面", 40),
+                                        ("kind", "文件", 70), ("matches", "匹配的键和值", 540)):
+                result_tree.heading(column, text=text)
+                result_tree.column(column, width=width)
+            scrollbar = ttk.Scrollbar(dialog, orient=tk.VERTICAL, command=result_tree.yview)
+            result_tree.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 10))
+            result_tree.pack(fill=tk.BOTH, expand=True, padx=(10, 0))
+
+            info_var = tk.StringVar(value="数据来自各车最近一次读取/写入的快照，输入条件后回车查询")
+            tk.Label(dialog, textvariable=info_var, anchor=tk.W).pack(fill=tk.X, padx=10, pady=5)
+
+            def run_query(event=None):
+                text = query_var.get().strip()
+                if not text:
+                    return
+                result_tree.delete(*result_tree.get_children())
+                try:
+                    index = get_fleet_query_index()
+                    start = time.monotonic()
+                    hits = index.query(text, kind=kind_names[kind_var.get()])
+                    elapsed = (time.monotonic() - start) * 1000
+                    for hit in hits:
+                        matches = ", ".join(f"{key}={'<缺失>' if value is None else value}"
+                                            for key, value in hit.matches)
+                        result_tree.insert("", "end", values=(hit.vehicle, hit.side, hit.kind, matches))
+                    files, keys = index.stats()
+                    info_var.set(f"命中 {len(hits)} 个文件（索引 {files} 个文件、{keys} 个键），耗时 {elapsed:.1f} ms")
+                except ValueError as e:
+                    info_var.set(f"条件格式错误: {e}")
+                except Exception as e:
+                    logger.error(f"参数查询失败: {e}")
+                    info_var.set(f"查询失败: {e}")
+
+            entry.bind("<Return>", run_query)
+            tk.Button(input_frame, text="查询", width=8, command=run_query).pack(side=tk.LEFT, padx=5)
+            entry.focus_set()
+
+        except Exception as e:
+            logger.error(f"打开参数查询窗口失败: {e}")
+            messagebox.showerror("错误", f"打开参数查询窗口失败:\n{str(e)}")
+
+    def flush_offline_writes(self):
+        """连接到某一面后，写回该面在离线期间保存的修改"""
+        try:
+            if not self.ssh_manager.has_offline_writes():
+                return
+
+            self.status_var.set("正在写回离线修改...")
+            self.root.update()
+            success, results = self.ssh_manager.flush_offline_journal()
+
+            self.status_var.set("离线修改已写回" if success else "离线修改写回未全部完成")
+            if success:
+                messagebox.showinfo("离线修改", "\n".join(results))
+            else:
+                messagebox.showwarning("离线修改", "\n".join(results))
+
+        except Exception as e:
+            logger.error(f"写回离线修改失败: {e}")
+            messagebox.showerror("错误", f"写回离线修改失败:\n{str(e)}")
+
+    def open_both_side_sessions(self, car_name, config):
+        """打开该车A/B两面的独立会话，返回 (success, {'A': 会话, 'B': 会话} 或 错误信息)"""
+        sessions = {}
+        for side in ("A", "B"):
+            self.status_var.set(f"正在连接 {car_name} {side}面...")
+            self.root.update()
+            success, result = self.session_manager.connect_side_session(
+                car_name, config, side, force_direct=self.force_direct_var.get()
+            )
+            if not success:
+                return False, f"{side}面连接失败: {result}"
+            sessions[side] = result
+        return True, sessions
+
+    def close_both_side_sessions(self, car_name):
+        """关闭 open_both_side_sessions 打开的临时会话（车型名#A/#B），释放会话数预算"""
+        for side in ("A", "B"):
+            self.session_manager.close_session(self.session_manager.make_handle(car_name, side))
+        self.update_connection_info()
+
+    def write_both_sides(self, editor_session, kind, content, force=False):
+        """
+        将内容同时写入编辑器会话所在车型的A/B两面，返回 (success, 报告文本)
+        编辑器所在面以其已知的远端sha256为前提（远端已被修改时拒绝，force=True 时无条件覆盖），
+        写入成功后同步更新编辑器会话记录的远端sha256
+        """
+        car_name = None
+        try:
+            car_name = editor_session.get_current_car_name()
+            config = self.terminals.get(car_name)
+            if not config:
+                return False, "找不到车型配置"
+
+            success, sessions = self.open_both_side_sessions(car_name, config)
+            if not success:
+                self.status_var.set("A/B两面写入失败")
+                return False, sessions
+
+            current_side = editor_session.get_current_side()
+            file_path = editor_session.resolve_conf_path(kind)
+            known_hash = None if force else editor_session.get_known_remote_hash(file_path)
+            expected = {current_side: {kind: known_hash}} if known_hash else None
+
+            self.status_var.set(f"正在同时写入 {car_name} A/B两面...")
+            self.root.update()
+            success, report = DualSideWriter(sessions).write({kind: content}, expected)
+            if success:
+                editor_session.remember_written_content(file_path, content)
+
+            lines = []
+            for side, item in report.items():
+                stage = f"{item['stage']:.2f}s" if item['stage'] is not None else "-"
+                apply = f"{item['apply']:.2f}s" if item['apply'] is not None else "-"
+                lines.append(f"{side}面: 暂存 {stage} / 生效 {apply} - {item['message']}")
+            summary = ("A/B两面写入成功" if success else "A/B两面写入失败") + "\n\n" + "\n".join(lines)
+
+            self.status_var.set("A/B两面写入成功" if success else "A/B两面写入失败")
+            self.update_connection_info()
+            return success, summary
+
+        except Exception as e:
+            logger.error(f"A/B两面写入失败: {e}")
+            return False, f"A/B两面写入失败: {str(e)}"
+        finally:
+            if car_name:
+                self.close_both_side_sessions(car_name)
+
+    def check_side_consistency(self):
+        """并行检查选中车型A/B两面标定文件是否一致，结果和各阶段耗时显示在报告窗口"""
+        car_name = None
+        try:
+            car_name, config = self.get_selected_car()
+            if not car_name:
+                return
+
+            start = time.monotonic()
+            success, sessions = self.open_both_side_sessions(car_name, config)
+            if not success:
+                self.status_var.set("A/B一致性检查失败")
+                messagebox.showerror("错误", sessions)
+                return
+            connect_elapsed = time.monotonic() - start
+
+            self.status_var.set(f"正在检查 {car_name} A/B两面一致性...")
+            self.root.update()
+            all_same, report = SideConsistencyChecker(sessions).check()
+            total_elapsed = time.monotonic() - start
+
+            self.status_var.set(f"{car_name} A/B两面" + ("一致" if all_same else "不一致或检查失败")
+                                + f"（{total_elapsed:.2f}s）")
+            self.update_connection_info()
+            self.show_consistency_report(car_name, report, connect_elapsed, total_elapsed)
+
+        except Exception as e:
+            logger.error(f"A/B一致性检查失败: {e}")
+            messagebox.showerror("错误", f"A/B一致性检查失败:\n{str(e)}")
+        finally:
+            if car_name:
+                self.close_both_side_sessions(car_name)
+
+    def show_consistency_report(self, car_name, report, connect_elapsed, total_elapsed):
+        """一致性检查报告：每个文件的结论与耗时，不一致的键逐行列出"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"A/B一致性检查 - {car_name}")
+        dialog.geometry("820x460")
+        dialog.transient(self.root)
+        self.set_window_icon(dialog)
+
+        labels = {CONSISTENT: "一致", INCONSISTENT: "不一致"}
+        lines = [f"总耗时 {total_elapsed:.2f}s（连接 {connect_elapsed:.2f}s）"]
+        for kind, item in report.items():
+            timings = item['timings']
+            parts = []
+            for stage, name in (('hash', "哈希"), ('read', "下载")):
+                if stage in timings:
+                    parts.append(name + " " + " / ".join(f"{side} {seconds:.2f}s"
+                                                         for side, seconds in timings[stage].items()))
+            if 'diff' in timings:
+                parts.append(f"对比 {timings['diff']:.3f}s")
+            lines.append(f"{kind}: {labels.get(item['status'], '检查失败')} - {item['message']}"
+                         f"（{'，'.join(parts)}）")
+        tk.Label(dialog, text="\n".join(lines), justify=tk.LEFT, anchor=tk.W).pack(fill=tk.X, padx=10, pady=8)
+
+        columns = ("kind", "key", "a_value", "b_value")
+        result_tree = ttk.Treeview(dialog, columns=columns, show="headings")
+        for column, text, width in (("kind", "文件", 70), ("key", "键路径", 330),
+                                    ("a_value", "A面", 190), ("b_value", "B面", 190)):
+            result_tree.heading(column, text=text)
+            result_tree.column(column, width=width)
+        scrollbar = ttk.Scrollbar(dialog, orient=tk.VERTICAL, command=result_tree.yview)
+        result_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 10), pady=(0, 10))
+        result_tree.pack(fill=tk.BOTH, expand=True, padx=(10, 0), pady=(0, 10))
+        for kind, item in report.items():
+            for key, a_value, b_value in item['diff']:
+                result_tree.insert("", "end", values=(kind, key,
+                                                      "<缺失>" if a_value is None else a_value,
+                                                      "<缺失>" if b_value is None else b_value))
+
+    def open_replicate_dialog(self):
+        """选择复制目标（车型 + 面），将当前面的标定文件直接复制过去"""
+        try:
+            if not self.ssh_manager.is_side_connected():
+                messagebox.showerror("错误", "未连接到A/B面")
+                return
+
+            source_car = self.ssh_manager.get_current_car_name()
+            source_side = self.ssh_manager.get_current_side()
+
+            dialog = tk.Toplevel(self.root)
+            dialog.title("复制标定文件")
+            dialog.geometry("360x240")
+            dialog.resizable(False, False)
+            dialog.transient(self.root)
+            dialog.grab_set()
+            self.set_window_icon(dialog)
+
+            tk.Label(dialog, text=f"源: {source_car} - {source_side}面",
+                     font=("Arial", 11, "bold")).pack(pady=10)
+
+            target_frame = tk.Frame(dialog)
+            target_frame.pack(pady=5)
+            tk.Label(target_frame, text="目标车型:").pack(side=tk.LEFT)
+            car_var = tk.StringVar(value=source_car)
+            ttk.Combobox(target_frame, textvariable=car_var, values=list(self.terminals.keys()),
+                         state="readonly", width=22).pack(side=tk.LEFT, padx=5)
+
+            side_var = tk.StringVar(value="B" if source_side == "A" else "A")
+            side_frame = tk.Frame(dialog)
+            side_frame.pack(pady=5)
+            tk.Radiobutton(side_frame, text="A面", variable=side_var, value="A").pack(side=tk.LEFT, padx=10)
+            tk.Radiobutton(side_frame, text="B面", variable=side_var, value="B").pack(side=tk.LEFT, padx=10)
+
+            params_var = tk.BooleanVar(value=True)
+            adas_var = tk.BooleanVar(value=True)
+            tk.Checkbutton(dialog, text="params.json", variable=params_var).pack(anchor=tk.W, padx=60)
+            tk.Checkbutton(dialog, text="adas_params.json", variable=adas_var).pack(anchor=tk.W, padx=60)
+
+            def confirm():
+                kinds = [kind for kind, var in (("params", params_var), ("adas", adas_var)) if var.get()]
+                target = (car_var.get(), side_var.get())
+                dialog.destroy()
+                if kinds:
+                    self.replicate_files(target[0], target[1], kinds)
+
+            tk.Button(dialog, text="开始复制", width=10, command=confirm).pack(pady=10)
+            self.root.wait_window(dialog)
+
+        except Exception as e:
+            logger.error(f"打开复制对话框失败: {e}")
+            messagebox.showerror("错误", f"打开复制对话框失败:\n{str(e)}")
+
+    def replicate_files(self, target_car, target_side, kinds):
+        """将当前面的标定文件流式复制到目标车型的指定面"""
+        try:
+            source = self.ssh_manager
+            if (target_car, target_side) == (source.get_current_car_name(), source.get_current_side()):
+                messagebox.showwarning("警告", "源和目标相同")
+                return
+
+            config = self.terminals.get(target_car)
+            if not config:
+                messagebox.showerror("错误", "找不到目标车型配置")
+                return
+
+            self.status_var.set(f"正在连接 {target_car} {target_side}面...")
+            self.root.update()
+            success, target = self.session_manager.connect_side_session(
+                target_car, config, target_side, force_direct=self.force_direct_var.get()
+            )
+            if not success:
+                self.status_var.set("复制失败")
+                messagebox.showerror("错误", f"目标连接失败: {target}")
+                return
+
+            replicator = FileReplicator(source, target)
+            results = []
+            all_ok = True
+            for kind in kinds:
+                self.status_var.set(f"正在复制 {kind} ...")
+                self.root.update()
+                success, message = replicator.replicate(
+                    source.resolve_conf_path(kind), target.resolve_conf_path(kind)
+                )
+                all_ok = all_ok and success
+                results.append(message)
+
+            self.status_var.set("复制完成" if all_ok else "复制失败")
+            self.update_connection_info()
+            if all_ok:
+                messagebox.showinfo("成功", "\n".join(results))
+            else:
+                messagebox.showerror("错误", "\n".join(results))
+
+        except Exception as e:
+            logger.error(f"复制标定文件失败: {e}")
+            messagebox.showerror("错误", f"复制标定文件失败:\n{str(e)}")
+        finally:
+            # 目标面会话只为本次复制打开，用完关闭以释放会话数预算
+            self.session_manager.close_session(self.session_manager.make_handle(target_car, target_side))
+            self.update_connection_info()
+
+    def bulk_download(self):
+        """将远端标定目录整体下载到本地目录"""
+        try:
+            if not self.ssh_manager.is_side_connected():
+                messagebox.showerror("错误", "未连接到A/B面")
+                return
+
+            local_dir = filedialog.askdirectory(title="选择保存目录")
+            if not local_dir:
+                return
+
+            self.status_var.set("正在下载conf目录...")
+            self.root.update()
+            success, messages = self.ssh_manager.download_conf_dirs(local_dir)
+
+            self.status_var.set("conf目录下载完成" if success else "conf目录下载失败")
+            if success:
+                messagebox.showinfo("成功", f"已下载到 {local_dir}\n\n" + "\n".join(messages))
+            else:
+                messagebox.showerror("错误", "\n".join(messages))
+
+        except Exception as e:
+            logger.error(f"下载conf目录失败: {e}")
+            messagebox.showerror("错误", f"下载conf目录失败:\n{str(e)}")
+
+    def incremental_sync(self):
+        """按远端清单增量同步标定目录到本地（只下载有变化的文件）"""
+        try:
+            if not self.ssh_manager.is_side_connected():
+                messagebox.showerror("错误", "未连接到A/B面")
+                return
+
+            local_dir = filedialog.askdirectory(title="选择同步到的本地目录")
+            if not local_dir:
+                return
+
+            self.status_var.set("正在比对远端清单...")
+            self.root.update()
+            success, summary = self.ssh_manager.sync_conf_dirs(local_dir)
+
+            self.status_var.set("增量同步完成" if success else "增量同步失败")
+            if success:
+                messagebox.showinfo("成功", summary)
+            else:
+                messagebox.showerror("错误", summary)
+
+        except Exception as e:
+            logger.error(f"增量同步失败: {e}")
+            messagebox.showerror("错误", f"增量同步失败:\n{str(e)}")
+
+    def bulk_upload(self):
+        """将本地目录整体推送到远端标定目录（原子换入）"""
+        try:
+            if not self.ssh_manager.is_side_connected():
+                messagebox.showerror("错误", "未连接到A/B面")
+                return
+
+            local_dir = filedialog.askdirectory(title="选择要上传的目录（包含planning_exec/control_exec）")
+            if not local_dir:
+                return
+            if not messagebox.askyesno("确认", "将用本地目录整体替换远端conf目录，是否继续？"):
+                return
+
+            self.status_var.set("正在上传conf目录...")
+            self.root.update()
+            success, messages = self.ssh_manager.upload_conf_dirs(local_dir)
+
+            self.status_var.set("conf目录上传完成" if success else "conf目录上传失败")
+            if success:
+                messagebox.showinfo("成功", "\n".join(messages))
+            else:
+                messagebox.showerror("错误", "\n".join(messages))
+
+        except Exception as e:
+            logger.error(f"上传conf目录失败: {e}")
+            messagebox.showerror("错误", f"上传conf目录失败:\n{str(e)}")
+
+    def open_search_dialog(self):
+        """在车机上搜索标定目录中的参数，结果边收边显示"""
+        try:
+            if not self.ssh_manager.is_side_connected():
+                messagebox.showerror("错误", "未连接到A/B面")
+                return
+
+            dialog = tk.Toplevel(self.root)
+            dialog.title(f"搜索参数 - {self.ssh_manager.get_current_car_name()} {self.ssh_manager.get_current_side()}面")
+            dialog.geometry("760x420")
+            dialog.transient(self.root)
+            self.set_window_icon(dialog)
+
+            input_frame = tk.Frame(dialog)
+            input_frame.pack(fill=tk.X, padx=10, pady=8)
+            tk.Label(input_frame, text="关键字:").pack(side=tk.LEFT)
+            pattern_var = tk.StringVar()
+            entry = tk.Entry(input_frame, textvariable=pattern_var, width=40)
+            entry.pack(side=tk.LEFT, padx=5)
+            ignore_case_var = tk.BooleanVar(value=True)
+            tk.Checkbutton(input_frame, text="忽略大小写", variable=ignore_case_var).pack(side=tk.LEFT, padx=5)
+
+            columns = ("file", "line", "snippet")
+            result_tree = ttk.Treeview(dialog, columns=columns, show="headings")
+            result_tree.heading("file", text="文件")
+            result_tree.heading("line", text="行号")
+            result_tree.heading("snippet", text="内容")
+            result_tree.column("file", width=280)
+            result_tree.column("line", width=50, anchor=tk.CENTER)
+            result_tree.column("snippet", width=400)
+            scrollbar = ttk.Scrollbar(dialog, orient=tk.VERTICAL, command=result_tree.yview)
+            result_tree.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 10))
+            result_tree.pack(fill=tk.BOTH, expand=True, padx=(10, 0))
+
+            info_var = tk.StringVar(value="输入关键字后回车搜索")
+            tk.Label(dialog, textvariable=info_var, anchor=tk.W).pack(fill=tk.X, padx=10, pady=5)
+
+            def run_search(event=None):
+                pattern = pattern_var.get().strip()
+                if not pattern:
+                    return
+                result_tree.delete(*result_tree.get_children())
+                info_var.set("正在搜索...")
+                dialog.update()
+                count = 0
+                try:
+                    for file_path, line_no, snippet in self.ssh_manager.search_conf_dirs(
+                            pattern, ignore_case=ignore_case_var.get()):
+                        result_tree.insert("", "end", values=(file_path, line_no, snippet))
+                        count += 1
+                        if count % 50 == 0:
+                            info_var.set(f"已找到 {count} 处...")
+                            dialog.update()
+                    info_var.set(f"共找到 {count} 处匹配")
+                except Exception as e:
+                    logger.error(f"远端搜索失败: {e}")
+                    info_var.set(f"搜索失败: {e}")
+
+            entry.bind("<Return>", run_search)
+            tk.Button(input_frame, text="搜索", width=8, command=run_search).pack(side=tk.LEFT, padx=5)
+            entry.focus_set()
+
+        except Exception as e:
+            logger.error(f"打开搜索窗口失败: {e}")
+            messagebox.showerror("错误", f"打开搜索窗口失败:\n{str(e)}")
+
     def show_working_directory(self):
         """显示当前工作目录"""
         try:
@@ -591,26 +1307,57 @@ class TerminalManagerUI:
             messagebox.showerror("错误", f"显示工作目录失败:\n{str(e)}")
 
     def disconnect(self):
-        """断开连接"""
-        try:
-            self.ssh_manager.disconnect()
-            self.status_var.set("已断开连接")
-            self.connect_vehicle_button.config(state=tk.NORMAL)
-            self.select_side_button.config(state=tk.DISABLED)
-            self.check_file_button.config(state=tk.DISABLED)
-            self.mount_button.config(state=tk.DISABLED)
-            self.edit_button.config(state=tk.DISABLED)
-            self.edit_adas_button.config(state=tk.DISABLED)
-            self.disconnect_button.config(state=tk.DISABLED)
+        """断开当前会话（其他车辆的会话保持连接）"""
+        try:
+            handle = self.session_manager.active_handle
+            if handle:
+                self.session_manager.close_session(handle)
+            self.status_var.set(f"已断开连接: {handle}" if handle else "已断开连接")
+            self.update_button_states()
             self.update_connection_info()
-            logger.info("已断开连接")
+            logger.info(f"已断开连接: {handle}")
 
         except Exception as e:
             logger.error(f"断开连接失败: {e}")
             messagebox.showerror("错误", f"断开连接失败:\n{str(e)}")
 
+    def on_tree_select(self, event=None):
+        """切换选中车型时，同步切换到该车的会话"""
+        try:
+            selected = self.tree.selection()
+            if not selected:
+                return
+            car_name = self.tree.item(selected[0], "text")
+            self._activate_session(car_name)
+            self.update_button_states()
+            self.update_connection_info()
+        except Exception as e:
+            logger.error(f"切换会话失败: {e}")
+
+    def update_button_states(self):
+        """根据当前会话状态更新按钮可用性"""
+        try:
+            snapshot = self.ssh_manager.get_session_snapshot()
+            side_state = tk.NORMAL if snapshot.side_connected else tk.DISABLED
+
+            if self.car_env_mode:
+                self.connect_vehicle_button.config(state=tk.DISABLED)
+                self.select_side_button.config(state=tk.NORMAL)
+            else:
+                self.connect_vehicle_button.config(state=tk.DISABLED if snapshot.connected else tk.NORMAL)
+                self.select_side_button.config(state=tk.NORMAL if snapshot.connected else tk.DISABLED)
+            self.check_file_button.config(state=side_state)
+            self.mount_button.config(state=side_state)
+            self.edit_button.config(state=side_state)
+            self.edit_adas_button.config(state=side_state)
+            for label in self.side_tool_labels:
+                self.tools_menu.entryconfig(label, state=side_state)
+            self.disconnect_button.config(state=tk.NORMAL if snapshot.connected else tk.DISABLED)
+        except Exception as e:
+            logger.error(f"更新按钮状态失败: {e}")
+
     def update_connection_info(self):
-        """更新连接信息显示"""
+        """更新连接信息显示（当前会话 + 其他已打开会话）"""
         try:
             if self.ssh_manager.is_connected():
                 car_name = self.ssh_manager.get_current_car_name()
@@ -625,7 +1372,15 @@ class TerminalManagerUI:
             else:
                 info = "未连接"
 
+            others = [
+                f"{handle}({snapshot.side}面)" if snapshot.side else handle
+                for handle, snapshot in self.session_manager.list_sessions()
+                if snapshot.connected and handle != self.session_manager.active_handle
+            ]
+            if others:
+                info += f"\n其他会话: {', '.join(others)}"
+
             self.connection_info_var.set(info)
         except Exception as e:
             logger.error(f"更新连接信息失败: {e}")
-            self.connection_info_var.set("连接信息获取失败")
\ No newline at end of file
+            self.connection_info_var.set("连接信息获取失败")